@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Run with async AI views (many in-flight LLM calls per process):
+    AI_ASYNC_VIEWS=True gunicorn SmartLearn_v2.asgi:application -k uvicorn.workers.UvicornWorker
 """
 
 import os
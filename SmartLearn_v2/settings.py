@@ -49,7 +49,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # ✅ Added for static files
+    'demo_app.static_files.AsyncWhiteNoiseMiddleware',  # ✅ WhiteNoise static files (async capable for ASGI)
+    'demo_app.bulkhead.BulkheadMiddleware',  # per endpoint class concurrency limits (AI_BULKHEADS)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -156,4 +157,307 @@ if not DEBUG:
     CSRF_COOKIE_SECURE = True
     SECURE_BROWSER_XSS_FILTER = True
     SECURE_CONTENT_TYPE_NOSNIFF = True
-    X_FRAME_OPTIONS = 'DENY'
\ No newline at end of file
+    X_FRAME_OPTIONS = 'DENY'
+
+# ============================================
+# AI Provider (see demo_app/ai_providers.py)
+# ============================================
+# 'gemini' = real Google Gemini, 'fake' = offline deterministic backend for load testing
+AI_PROVIDER = os.environ.get('AI_PROVIDER', 'gemini')
+
+# Fake provider behaviour - override any key with a JSON blob in AI_FAKE_PROVIDER, e.g.
+# AI_FAKE_PROVIDER='{"latency": {"distribution": "lognormal", "mean": 2.0, "stddev": 1.0}, "error_rates": {"429": 0.05}}'
+AI_FAKE_PROVIDER = {
+    'seed': 42,
+    'keys': 3,
+    'latency': {'distribution': 'fixed', 'mean': 0.0, 'stddev': 0.0, 'min': 0.0, 'max': 30.0},
+    'error_rates': {'429': 0.0, '401': 0.0, 'timeout': 0.0},
+    'malformed_json_rate': 0.0,
+    'responses': [],
+}
+if os.environ.get('AI_FAKE_PROVIDER'):
+    import json
+    AI_FAKE_PROVIDER.update(json.loads(os.environ['AI_FAKE_PROVIDER']))
+
+# ============================================
+# AI Rate Limits (see demo_app/rate_limiter.py)
+# ============================================
+# Default per-key limits (Gemini free tier). Override per key with
+# SMARTLEARN_API_KEY_RPM / SMARTLEARN_API_KEY_2_TPM etc.
+AI_RATE_LIMITS = {
+    'rpm': int(os.environ.get('AI_DEFAULT_RPM', 10)),
+    'tpm': int(os.environ.get('AI_DEFAULT_TPM', 250000)),
+    'rpd': int(os.environ.get('AI_DEFAULT_RPD', 250)),  # daily quota (SMARTLEARN_API_KEY_<n>_RPD per key)
+}
+
+# API key pool (see demo_app/key_pool.py): 429s cool a key down instead of
+# sleeping inside the request; max_wait is the longest a call waits for capacity
+AI_KEY_POOL = {
+    'cooldown_seconds': 60,
+    'max_cooldown_seconds': 600,
+    'failure_threshold': 3,
+    'max_wait': 5,
+}
+
+# Model discovery runs on first use and is cached on disk (see demo_app/model_discovery.py)
+AI_MODEL_CACHE = {
+    'path': os.environ.get('AI_MODEL_CACHE_PATH'),  # default: demo_app/ai_cache/meta/models.json
+    'ttl_hours': 24,
+}
+
+# ⚡ Serve the AI endpoints with async views (demo_app/views_async.py).
+# Turn on when running under ASGI (see SmartLearn_v2/asgi.py).
+AI_ASYNC_VIEWS = os.environ.get('AI_ASYNC_VIEWS', 'False') == 'True'
+
+# Identical concurrent generations share one AI call (see demo_app/single_flight.py).
+# Workers on the same host coordinate through lock files in lock_dir.
+AI_SINGLE_FLIGHT = {
+    'enabled': True,
+    'lock_dir': os.environ.get('AI_SINGLE_FLIGHT_LOCK_DIR'),  # default: demo_app/ai_cache/locks/
+    'wait_timeout': 180,
+}
+
+# Background job mode for /ai/search-all/?mode=job (see demo_app/job_queue.py).
+# Run the workers with: python manage.py run_ai_workers
+AI_JOBS = {
+    'workers': int(os.environ.get('AI_JOB_WORKERS', 4)),
+    'poll_interval': 1.0,         # idle worker queue check (seconds)
+    'long_poll_seconds': 20,      # max ?wait= on the status endpoint (async views only)
+    'poll_after_seconds': 2,      # Retry-After while a job is queued/running
+    'partial_interval': 1.0,      # how often streamed partial text is saved
+    'stale_after_seconds': 300,   # running job with no heartbeat -> requeued
+    'max_attempts': 2,
+}
+
+# Run BATCH 1 (explanation+story) and BATCH 2 (flashcards/MCQs/keywords) concurrently
+# (see demo_app/batch_api.py). Without `content`, BATCH 2 starts once
+# batch2_after_chars of explanation have streamed in.
+AI_PARALLEL_BATCHES = {
+    'enabled': os.environ.get('AI_PARALLEL_BATCHES', 'True') == 'True',
+    'max_workers': 8,
+    'batch2_after_chars': 1000,
+}
+
+# AI response cache (see demo_app/cache.py)
+# backend: 'sqlite' (single WAL file, default), 'file' (one JSON file per key) or
+# 'django' (the CACHES[django_alias] backend below - shared by every worker/instance)
+AI_CACHE = {
+    'backend': os.environ.get('AI_CACHE_BACKEND', 'sqlite'),
+    'django_alias': 'ai',
+    'path': os.environ.get('AI_CACHE_PATH'),  # default: demo_app/ai_cache/ai_cache.sqlite3 (or the ai_cache/ dir)
+    'compress_level': 6,
+    # In-process LRU tier in front of the store (0 disables it)
+    'memory_max_bytes': int(os.environ.get('AI_CACHE_MEMORY_MB', 32)) * 1024 * 1024,
+    'memory_ttl_seconds': 300,  # how long a worker trusts its in-memory copy
+    # Stale-while-revalidate: after its TTL an entry is served stale for stale_hours
+    # more while one background refresh (refresh_workers threads) regenerates it
+    'stale_hours': 72,
+    'refresh_workers': 2,
+}
+
+# Negative caching (see demo_app/cache.py): failed generations are remembered for a
+# short, error-class-specific TTL instead of being retried on every click. A partial
+# all-in-one result is served for that TTL, then only its missing parts are regenerated.
+AI_NEGATIVE_CACHE = {
+    'enabled': os.environ.get('AI_NEGATIVE_CACHE', 'True') == 'True',
+    'ttl_seconds': {
+        'rate_limit': 30,   # capped by the "Retry in Ns" hint
+        'timeout': 60,
+        'error': 120,
+        'config': 60,
+        'auth': 300,
+        'empty': 300,
+        'parse': 900,
+        'deadline': 0,      # request deadline ran out - partial results are cached as stale instead
+    },
+}
+
+# Django cache used by AI_CACHE['backend'] = 'django'.
+# AI_DJANGO_CACHE: 'db' (shared via the database - run `manage.py createcachetable`),
+# 'file' (shared by workers on one host) or 'locmem' (per process).
+_AI_DJANGO_CACHES = {
+    'db': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'ai_cache'},
+    'file': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+             'LOCATION': os.path.join(BASE_DIR, 'demo_app', 'ai_cache', 'django')},
+    'locmem': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'ai-cache'},
+}
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'ai': dict(_AI_DJANGO_CACHES[os.environ.get('AI_DJANGO_CACHE', 'db')],
+               TIMEOUT=72 * 3600, OPTIONS={'MAX_ENTRIES': 100000}),
+}
+
+# Topic normalization + near-duplicate index (see demo_app/topic_index.py).
+# Cache keys use exact normalized topics; with fuzzy on, a new topic also reuses a
+# known topic's key when their character-trigram Jaccard similarity is >= threshold
+AI_TOPIC_INDEX = {
+    'enabled': os.environ.get('AI_TOPIC_INDEX', 'True') == 'True',
+    'fuzzy': os.environ.get('AI_TOPIC_FUZZY', 'False') == 'True',
+    'threshold': 0.92,
+    'max_topics': int(os.environ.get('AI_TOPIC_INDEX_MAX', 50000)),  # topics.tsv stops growing here
+    'bands': 12,  # LSH: bands * rows MinHash permutations
+    'rows': 5,
+    'path': os.environ.get('AI_TOPIC_INDEX_PATH'),  # default: demo_app/ai_cache/meta/topics.tsv
+}
+
+# Off-peak cache warming: python manage.py warm_ai_cache (see demo_app/cache_warming.py)
+AI_CACHE_WARMING = {
+    'top': int(os.environ.get('AI_WARM_TOP', 50)),  # most searched topics to keep warm
+    'days': 7,                   # popularity window
+    'workers': 2,                # topics generated concurrently
+    'min_fresh_hours': 0,        # also refresh entries going stale within this many hours
+    'reserve_per_key': 1,        # requests/minute per key left for live traffic
+    'max_wait': 120,             # stop when no key capacity frees up for this long
+    'checkpoint_path': None,     # default: demo_app/ai_cache/meta/warm_checkpoint.json
+}
+
+# AI cache metrics (see demo_app/cache_metrics.py): every worker snapshots its
+# counters to demo_app/ai_cache/meta/metrics/ so /ai/status/cache/ (staff) and
+# `python manage.py ai_cache_stats` report the whole host
+AI_CACHE_METRICS = {
+    'path': os.environ.get('AI_CACHE_METRICS_PATH'),  # default: demo_app/ai_cache/meta/metrics/
+    'flush_seconds': 10,     # how often a worker writes its snapshot
+    'max_keys': 2000,        # per-key stats tracked per worker (the coldest half is dropped when full)
+    'top_keys': 200,         # hottest/largest keys kept in each snapshot
+    'max_age_hours': 24,     # snapshots of workers gone longer than this are discarded
+}
+
+# Response cache for /ai/ and /story/ (see demo_app/response_cache.py): answers are
+# keyed on normalized inputs + model + prompt version and sent with ETag/Cache-Control
+AI_RESPONSE_CACHE = {
+    'enabled': os.environ.get('AI_RESPONSE_CACHE', 'true').lower() == 'true',
+    'ttl_hours': 72,                 # server-side cache lifetime
+    'max_age': 300,                  # browsers reuse an answer this long, then revalidate (304)
+    'stale_while_revalidate': 3600,  # ...and may show it while revalidating
+}
+
+# Daily quota ledger (see demo_app/quota.py): calls and tokens per key/model/day
+# in the QuotaUsage table, shared by every worker and node
+AI_QUOTA = {
+    'timezone': 'America/Los_Angeles',  # the provider's daily quota reset (midnight Pacific for Gemini)
+    'flush_seconds': 2,                 # how often a worker writes its buffered counts
+    'read_cache_seconds': 2,            # how long a worker reuses the totals it read
+}
+
+# Admission control (see demo_app/admission.py): without key capacity a request is
+# answered from its class's degradation ladder instead of waiting on the keys
+AI_ADMISSION = {
+    'enabled': os.environ.get('AI_ADMISSION', 'true').lower() == 'true',
+    'max_wait': 5,                    # admit when a key frees up within this many seconds
+    'near_duplicate_threshold': 0.5,  # looser than AI_TOPIC_INDEX['threshold'], only used when degraded
+    'near_duplicate_scan_limit': 500, # known topics sharing a word checked per lookup (bounds its cost)
+    'retry_after_no_keys': 300,       # Retry-After when every key is invalid
+    'classes': {                      # steps tried in order, then 503 + Retry-After
+        'search': ['stale', 'near_duplicate', 'queue'],  # /ai/search-all/
+        'explain': ['stale', 'near_duplicate'],          # /ai/, /ai/stream/, /story/
+        'materials': ['fallback'],                       # flashcards / MCQs / keywords
+    },
+}
+
+# ============================================
+# Bulkheads - concurrency limits per endpoint class
+# ============================================
+# Slots are shared by every worker on the host. Keep AI pools' max_concurrent + max_queue
+# below the server's total threads (gunicorn.conf.py: workers x threads) so DB-only
+# endpoints always find a free thread; AI requests past the queue get a fast 503.
+AI_BULKHEADS = {
+    'enabled': os.environ.get('AI_BULKHEADS', 'true').lower() == 'true',
+    'scope': 'host',   # 'host' (flock slots, all workers) or 'process'
+    'retry_after': 2,  # Retry-After on rejection
+    'pools': {
+        'ai_generation': {
+            'max_concurrent': int(os.environ.get('AI_BULKHEAD_GENERATION', 4)),
+            'max_queue': 2,
+            'queue_timeout': 2.0,
+        },
+        'ai_quick': {
+            'max_concurrent': int(os.environ.get('AI_BULKHEAD_QUICK', 4)),
+            'max_queue': 2,
+            'queue_timeout': 1.0,
+        },
+        'db': {'max_concurrent': None},  # unlimited
+    },
+    # Async views (AI_ASYNC_VIEWS under ASGI) hold no thread while the LLM answers - only
+    # memory and a provider connection - so they get their own, much larger pools
+    'async_pools': {
+        'ai_generation': {
+            'max_concurrent': int(os.environ.get('AI_BULKHEAD_ASYNC_GENERATION', 64)),
+            'max_queue': 32,
+            'queue_timeout': 2.0,
+        },
+        'ai_quick': {
+            'max_concurrent': int(os.environ.get('AI_BULKHEAD_ASYNC_QUICK', 64)),
+            'max_queue': 32,
+            'queue_timeout': 1.0,
+        },
+    },
+    'routes': [  # first matching path prefix wins
+        ('/ai/search-all/', 'ai_generation'),
+        ('/ai/generate-', 'ai_generation'),
+        ('/ai/extract-keywords/', 'ai_generation'),
+        ('/ai/jobs/', 'db'),       # job status long-polls only read the database
+        ('/ai/status/', 'db'),
+        ('/ai/', 'ai_quick'),      # /ai/ and /ai/stream/
+        ('/story/', 'ai_quick'),
+        ('/', 'db'),
+    ],
+}
+
+# ============================================
+# Request deadlines (see demo_app/deadline.py)
+# ============================================
+# Seconds each endpoint's AI work may take: network timeouts, key waits, retries
+# and backoff sleeps all fit inside it; finished parts are cached when it runs out.
+AI_DEADLINES = {
+    'enabled': os.environ.get('AI_DEADLINES', 'true').lower() == 'true',
+    'call_timeout': int(os.environ.get('AI_CALL_TIMEOUT', 60)),  # per provider call, also without a deadline
+    'min_attempt_seconds': 2,  # don't start a call or retry with less time left
+    'endpoints': {
+        'search_all': int(os.environ.get('AI_DEADLINE_SEARCH_ALL', 45)),
+        'search_all_stream': 90,
+        'ai': 25,
+        'ai_stream': 60,
+        'story': 25,
+        'materials': 25,  # flashcards / MCQs / keywords
+    },
+}
+
+# ============================================
+# Model routing per task (see demo_app/model_router.py)
+# ============================================
+# Candidates are matched against the discovered models; missing ones are skipped
+# and a task with no candidate left uses the default model (find_working_model).
+AI_MODEL_ROUTING = {
+    'enabled': os.environ.get('AI_MODEL_ROUTING', 'true').lower() == 'true',
+    'ewma_alpha': 0.2,          # weight of the newest sample in latency / error-rate EWMAs
+    'latency_tolerance': 0.2,   # 'fastest': models within 20% of the fastest tie - the cheapest wins
+    'failure_threshold': 3,     # consecutive failures before a model is routed around
+    'min_samples': 5,           # calls before the error rate alone can degrade a model
+    'max_error_rate': 0.5,
+    'cooldown_seconds': 60,
+    'tasks': {
+        # Long-form text - quality first, the rest are fallbacks
+        'explanation': {'strategy': 'ordered', 'models': ['gemini-2.5-flash', 'gemini-2.0-flash', 'gemini-1.5-flash', 'gemini-pro']},
+        'story': {'strategy': 'ordered', 'models': ['gemini-2.5-flash', 'gemini-2.0-flash', 'gemini-1.5-flash', 'gemini-pro']},
+        # Short structured JSON - fastest adequate model
+        'flashcards': {'strategy': 'fastest', 'models': ['gemini-2.5-flash-lite', 'gemini-2.0-flash', 'gemini-2.5-flash', 'gemini-1.5-flash']},
+        'mcqs': {'strategy': 'fastest', 'models': ['gemini-2.5-flash-lite', 'gemini-2.0-flash', 'gemini-2.5-flash', 'gemini-1.5-flash']},
+        'keywords': {'strategy': 'fastest', 'models': ['gemini-2.5-flash-lite', 'gemini-2.0-flash-lite', 'gemini-2.0-flash', 'gemini-2.5-flash', 'gemini-1.5-flash']},
+        'materials': {'strategy': 'fastest', 'models': ['gemini-2.5-flash-lite', 'gemini-2.0-flash', 'gemini-2.5-flash', 'gemini-1.5-flash']},  # BATCH 2
+    },
+    # Configured name -> other discovered names it may be served as (tried in order after an exact match)
+    'aliases': {
+        'gemini-2.0-flash': ['gemini-2.0-flash-001'],
+        'gemini-2.0-flash-lite': ['gemini-2.0-flash-lite-001'],
+        'gemini-1.5-flash': ['gemini-1.5-flash-latest', 'gemini-1.5-flash-002', 'gemini-1.5-flash-001'],
+        'gemini-pro': ['gemini-1.0-pro', 'gemini-1.0-pro-latest'],
+    },
+    'costs': {  # USD per 1M tokens: [input, output] - only reported and used to break latency ties
+        'gemini-2.5-pro': [1.25, 10.0],
+        'gemini-2.5-flash-lite': [0.10, 0.40],
+        'gemini-2.5-flash': [0.30, 2.50],
+        'gemini-2.0-flash-lite': [0.075, 0.30],
+        'gemini-2.0-flash': [0.10, 0.40],
+        'gemini-1.5-flash': [0.075, 0.30],
+    },
+}
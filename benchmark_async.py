@@ -0,0 +1,84 @@
+"""
+Benchmark: concurrent request capacity of sync vs async AI views
+Uses the offline fake provider (no quota burned) with a fixed LLM latency.
+
+- sync:  N requests to views.get_ai_response on a pool of W threads
+         (stands in for W sync gunicorn workers - one request each)
+- async: N requests to views_async.get_ai_response on ONE event loop
+         (one ASGI process)
+
+Run: python benchmark_async.py [requests] [latency_seconds] [sync_workers]
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+LATENCY = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+SYNC_WORKERS = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'SmartLearn_v2.settings')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+os.environ['AI_PROVIDER'] = 'fake'
+os.environ['AI_FAKE_PROVIDER'] = json.dumps({'latency': {'distribution': 'fixed', 'mean': LATENCY}, 'keys': 10})
+# Rate limits are not what is being measured here
+os.environ['AI_DEFAULT_RPM'] = '1000000'
+os.environ['AI_DEFAULT_TPM'] = '1000000000'
+# Both runs ask the same prompts - a response-cache hit would skip the LLM call being measured
+os.environ['AI_RESPONSE_CACHE'] = 'false'
+
+import django
+django.setup()
+
+import builtins
+from django.test import RequestFactory, AsyncRequestFactory
+from demo_app import views, views_async
+
+# The AI layer prints every call - keep the benchmark output readable
+_print = builtins.print
+builtins.print = lambda *args, **kwargs: None
+
+
+def run_sync():
+    factory = RequestFactory()
+    requests = [factory.get('/ai/', {'prompt': f'topic {i}'}) for i in range(REQUESTS)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=SYNC_WORKERS) as pool:
+        statuses = list(pool.map(lambda r: views.get_ai_response(r).status_code, requests))
+    return time.perf_counter() - start, statuses
+
+
+async def run_async():
+    factory = AsyncRequestFactory()
+    requests = [factory.get('/ai/', {'prompt': f'topic {i}'}) for i in range(REQUESTS)]
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(views_async.get_ai_response(r) for r in requests))
+    return time.perf_counter() - start, [r.status_code for r in responses]
+
+
+def report(label, elapsed, statuses, in_flight):
+    ok = sum(1 for s in statuses if s == 200)
+    _print(f"{label:<28} {elapsed:8.2f}s  {REQUESTS / elapsed:8.1f} req/s  "
+           f"in-flight: {in_flight:<5} ok: {ok}/{REQUESTS}")
+
+
+if __name__ == '__main__':
+    _print("=" * 70)
+    _print(f"⚡ SYNC vs ASYNC: {REQUESTS} requests, {LATENCY}s LLM latency")
+    _print("=" * 70)
+
+    # Warm up model discovery so neither side pays for it
+    views.get_ai_response(RequestFactory().get('/ai/', {'prompt': 'warmup'}))
+
+    elapsed, statuses = run_sync()
+    report(f"sync ({SYNC_WORKERS} workers)", elapsed, statuses, SYNC_WORKERS)
+
+    elapsed, statuses = asyncio.run(run_async())
+    report("async (1 process)", elapsed, statuses, REQUESTS)
+
+    _print("-" * 70)
+    _print(f"Ideal sync time: {REQUESTS / SYNC_WORKERS * LATENCY:.1f}s  |  ideal async time: {LATENCY:.1f}s")
@@ -0,0 +1,161 @@
+"""
+Load test: do cheap endpoints stay fast while AI requests saturate the server?
+Simulates one threaded gunicorn worker - a FIFO pool of W threads handling
+requests through the full middleware stack (django.test.Client) - and the
+offline fake provider with a fixed LLM latency.
+
+A burst of slow /ai/search-all/ requests arrives, then a steady trickle of
+/auth/check-auth/ and /history/get/ requests from a logged-in user.
+The run is repeated with AI_BULKHEADS disabled and enabled; with bulkheads
+the AI requests past the pool's limit get a fast 503, so they never hold
+every thread and the cheap requests are served at once.
+
+With AI_ASYNC_VIEWS=True the same load goes through the ASGI handler instead
+(django.test.AsyncClient on one event loop - one uvicorn worker) to the async
+views. Those hold no thread while the LLM answers, so the AI requests must
+all be served: once with AI_BULKHEADS['async_pools'] and once with the
+thread-sized pools applied to them, which rejects most of the burst.
+
+Run: python benchmark_bulkhead.py [ai_requests] [latency_seconds] [threads]
+     AI_ASYNC_VIEWS=True python benchmark_bulkhead.py [ai_requests] [latency_seconds]
+"""
+
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+AI_REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+LATENCY = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+THREADS = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+CHEAP_REQUESTS = 40
+CHEAP_INTERVAL = 0.05
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'SmartLearn_v2.settings')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_FILE}'
+os.environ['AI_PROVIDER'] = 'fake'
+os.environ['AI_FAKE_PROVIDER'] = json.dumps({'latency': {'distribution': 'fixed', 'mean': LATENCY}, 'keys': 10})
+# Measure the bulkheads alone - no rate limits, admission control or response cache
+os.environ['AI_DEFAULT_RPM'] = '1000000'
+os.environ['AI_DEFAULT_TPM'] = '1000000000'
+os.environ['AI_ADMISSION'] = 'false'
+os.environ['AI_RESPONSE_CACHE'] = 'false'
+
+import django
+django.setup()
+
+import builtins
+import logging
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+
+# The AI layer prints every call - keep the benchmark output readable
+_print = builtins.print
+builtins.print = lambda *args, **kwargs: None
+logging.getLogger('django.request').setLevel(logging.CRITICAL)  # every 503 is logged as an error
+
+
+def login_cookie():
+    call_command('migrate', verbosity=0)
+    user = User.objects.create_user('bench', password='bench-password')
+    client = Client()
+    client.force_login(user)
+    return client.cookies
+
+
+def bulkheads(enabled, async_pools=None):
+    # AI may hold at most 3/4 of the threads, as settings.py does for the default gunicorn.conf.py
+    generation = {'max_concurrent': max(1, THREADS // 2), 'max_queue': max(1, THREADS // 4), 'queue_timeout': 2.0}
+    pools = dict(settings.AI_BULKHEADS['pools'], ai_generation=generation)
+    config = dict(settings.AI_BULKHEADS, enabled=enabled, scope='process', pools=pools)
+    if async_pools is not None:
+        config['async_pools'] = pools if async_pools == 'sync' else settings.AI_BULKHEADS['async_pools']
+    return override_settings(AI_BULKHEADS=config)
+
+
+def report(label, ai, cheap, elapsed):
+    latencies = sorted(seconds * 1000 for _, seconds in cheap)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    ai_ok = sum(1 for status, _ in ai if status == 200)
+    ai_503 = sum(1 for status, _ in ai if status == 503)
+    cheap_ok = sum(1 for status, _ in cheap if status == 200)
+    _print(f"{label:<18} cheap p50 {statistics.median(latencies):8.1f}ms  p95 {p95:8.1f}ms  "
+           f"ok {cheap_ok}/{CHEAP_REQUESTS}  |  AI ok {ai_ok}  503 {ai_503}  |  {elapsed:5.1f}s")
+
+
+def run(label, enabled, cookies):
+    with bulkheads(enabled), ThreadPoolExecutor(max_workers=THREADS) as pool:
+        def get(submitted, path, params=None):
+            # Latency counts from submission - including the wait for a free thread
+            client = Client()
+            client.cookies = cookies
+            status = client.get(path, params or {}).status_code
+            return status, time.perf_counter() - submitted
+
+        start = time.perf_counter()
+        # Random topics - every AI request is a cache miss
+        ai = [pool.submit(get, time.perf_counter(), '/ai/search-all/',
+                          {'topic': uuid.uuid4().hex, 'include_story': 'false'})
+              for _ in range(AI_REQUESTS)]
+        cheap = []
+        for i in range(CHEAP_REQUESTS):
+            time.sleep(CHEAP_INTERVAL)
+            cheap.append(pool.submit(get, time.perf_counter(), '/auth/check-auth/' if i % 2 else '/history/get/'))
+        ai = [f.result() for f in ai]
+        cheap = [f.result() for f in cheap]
+        elapsed = time.perf_counter() - start
+    report(label, ai, cheap, elapsed)
+
+
+async def arun(label, enabled, cookies, async_pools=None):
+    """run() through the ASGI handler: every request is a task on this event loop"""
+    async def get(path, params=None):
+        submitted = time.perf_counter()
+        client = AsyncClient()
+        client.cookies = cookies
+        response = await client.get(path, params or {})
+        return response.status_code, time.perf_counter() - submitted
+
+    async def trickle():
+        cheap = []
+        for i in range(CHEAP_REQUESTS):
+            await asyncio.sleep(CHEAP_INTERVAL)
+            cheap.append(asyncio.ensure_future(get('/auth/check-auth/' if i % 2 else '/history/get/')))
+        return await asyncio.gather(*cheap)
+
+    with bulkheads(enabled, async_pools):
+        start = time.perf_counter()
+        ai = asyncio.gather(*(get('/ai/search-all/', {'topic': uuid.uuid4().hex, 'include_story': 'false'})
+                              for _ in range(AI_REQUESTS)))
+        ai, cheap = await asyncio.gather(ai, trickle())
+        elapsed = time.perf_counter() - start
+    report(label, ai, cheap, elapsed)
+
+
+if __name__ == '__main__':
+    _print("=" * 90)
+    where = "one ASGI event loop" if settings.AI_ASYNC_VIEWS else f"{THREADS} threads"
+    _print(f"🚧 BULKHEADS: {AI_REQUESTS} search-all requests ({LATENCY}s LLM latency) "
+           f"+ {CHEAP_REQUESTS} auth/history requests on {where}")
+    _print("=" * 90)
+
+    cookies = login_cookie()
+    # Warm up model discovery so neither run pays for it
+    Client().get('/ai/', {'prompt': 'warmup'})
+
+    if settings.AI_ASYNC_VIEWS:
+        asyncio.run(arun("no bulkheads", False, cookies))
+        asyncio.run(arun("thread-sized pools", True, cookies, async_pools='sync'))
+        asyncio.run(arun("async pools", True, cookies, async_pools='async'))
+    else:
+        run("no bulkheads", False, cookies)
+        run("bulkheads", True, cookies)
@@ -0,0 +1,98 @@
+"""
+Benchmark: one-JSON-file-per-key cache vs the SQLite/WAL cache store
+Both stores run in a temporary directory with realistic all-in-one payloads.
+
+- write:  N entries (save_to_cache equivalent)
+- read:   N random hits (load_from_cache equivalent)
+- miss:   N random misses
+- stats:  cache_stats() with N entries present
+- disk:   total bytes on disk
+
+Run: python benchmark_cache_store.py [entries]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ENTRIES = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+READS = min(ENTRIES, 20000)
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'SmartLearn_v2.settings')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import django
+django.setup()
+
+from demo_app.cache import FileCacheStore, SQLiteCacheStore
+
+
+def payload(i):
+    """Roughly the shape and size of a generate_all_content result"""
+    topic = f"topic number {i}"
+    return {
+        'topic': topic,
+        'search': f"{topic} is explained here in detail with key concepts and examples. " * 25,
+        'story': f"Once upon a time someone learned about {topic}. " * 15,
+        'flashcards': [{'q': f"What is {topic} fact {n}?", 'a': f"Answer {n} about {topic}"} for n in range(5)],
+        'mcqs': [{'q': f"Question {n} on {topic}?", 'opts': ['A', 'B', 'C', 'D'], 'ans': n % 4} for n in range(5)],
+        'keywords': [{'k': f"{topic} term {n}", 'd': f"Definition {n}"} for n in range(5)],
+        'errors': [],
+    }
+
+
+def disk_bytes(path):
+    return sum(f.stat().st_size for f in Path(path).rglob('*') if f.is_file())
+
+
+def run(label, store, directory):
+    keys = [f"topic number {i}" for i in range(ENTRIES)]
+    row = {}
+
+    start = time.perf_counter()
+    for i, key in enumerate(keys):
+        store.set(key, payload(i), 72 * 3600)
+    row['write'] = (time.perf_counter() - start) / ENTRIES * 1e6
+
+    sample = random.sample(keys, READS)
+    start = time.perf_counter()
+    for key in sample:
+        assert store.get(key) is not None
+    row['read'] = (time.perf_counter() - start) / READS * 1e6
+
+    start = time.perf_counter()
+    for i in range(READS):
+        store.get(f"missing {i}")
+    row['miss'] = (time.perf_counter() - start) / READS * 1e6
+
+    start = time.perf_counter()
+    stats = store.stats()
+    row['stats'] = (time.perf_counter() - start) * 1e3
+    assert stats['count'] == ENTRIES, stats
+
+    row['disk'] = disk_bytes(directory) / 1024 / 1024
+    print(f"{label:<8} {row['write']:10.1f} {row['read']:10.1f} {row['miss']:10.1f} "
+          f"{row['stats']:12.2f} {row['disk']:10.1f}")
+    return row
+
+
+if __name__ == '__main__':
+    random.seed(0)
+    print("=" * 66)
+    print(f"💾 CACHE STORE BENCHMARK ({ENTRIES} entries, {READS} reads)")
+    print("=" * 66)
+    print(f"{'store':<8} {'write µs':>10} {'hit µs':>10} {'miss µs':>10} {'stats ms':>12} {'disk MB':>10}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file_dir = Path(tmp) / 'files'
+        file_row = run('file', FileCacheStore(file_dir), file_dir)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_row = run('sqlite', SQLiteCacheStore(Path(tmp) / 'cache.sqlite3', purge_every=0), tmp)
+
+    print("-" * 66)
+    for metric in ('write', 'read', 'stats', 'disk'):
+        print(f"{metric:<6} sqlite is {file_row[metric] / sqlite_row[metric]:8.1f}x better")
@@ -0,0 +1,91 @@
+"""
+Micro-benchmark: per-call client overhead of the Gemini provider (no network)
+The gRPC transport is replaced with a stub that returns a canned response,
+so the numbers are pure client-side setup + request/response handling.
+
+- before:     GenerativeModel + GenerationConfig built on every call (old call_ai_with_retry)
+- per-key:    same, plus a fresh service client (gRPC channel) per call
+- registry:   ClientRegistry - model/config/channel built once and reused
+
+Run: python benchmark_client_overhead.py [calls]
+"""
+
+import os
+import sys
+import time
+
+CALLS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'SmartLearn_v2.settings')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import django
+django.setup()
+
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+from demo_app.ai_providers import GeminiProvider
+
+MODEL = 'gemini-2.5-flash'
+API_KEY = 'AIza-benchmark-key-0000000000000000000'
+PROMPT = "Explain 'photosynthesis' in detail."
+
+CANNED = glm.GenerateContentResponse(candidates=[glm.Candidate(
+    content=glm.Content(parts=[glm.Part(text='Photosynthesis ' * 200)], role='model'),
+    finish_reason=glm.Candidate.FinishReason.STOP,
+)])
+
+
+def stub_generate_content(self, request, **kwargs):
+    return CANNED
+
+
+# No network: every service client answers from memory
+glm.GenerativeServiceClient.generate_content = stub_generate_content
+
+
+def before():
+    model = genai.GenerativeModel(MODEL)
+    model._client = SHARED_CLIENT
+    model.generate_content(
+        PROMPT,
+        generation_config=genai.types.GenerationConfig(max_output_tokens=2000, temperature=0.7),
+    ).text
+
+
+def per_key_client():
+    model = genai.GenerativeModel(MODEL)
+    model._client = glm.GenerativeServiceClient(client_options={'api_key': API_KEY})
+    model.generate_content(
+        PROMPT,
+        generation_config=genai.types.GenerationConfig(max_output_tokens=2000, temperature=0.7),
+    ).text
+
+
+def registry():
+    PROVIDER.generate(PROMPT, MODEL, api_key=API_KEY, max_tokens=2000, temperature=0.7)
+
+
+def measure(label, fn, calls):
+    fn()  # warm up imports / first build
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    per_call = (time.perf_counter() - start) / calls * 1e6
+    print(f"{label:<34} {per_call:10.1f} µs/call")
+    return per_call
+
+
+if __name__ == '__main__':
+    SHARED_CLIENT = glm.GenerativeServiceClient(client_options={'api_key': API_KEY})
+    PROVIDER = GeminiProvider()
+
+    print("=" * 60)
+    print(f"🔬 PER-CALL CLIENT OVERHEAD ({CALLS} calls, network stubbed)")
+    print("=" * 60)
+    t_before = measure("before (model+config per call)", before, CALLS)
+    t_channel = measure("fresh channel per call", per_key_client, max(CALLS // 10, 50))
+    t_after = measure("after (ClientRegistry)", registry, CALLS)
+    print("-" * 60)
+    print(f"Saved per call: {t_before - t_after:.1f} µs vs before, {t_channel - t_after:.1f} µs vs fresh channel")
+    print(f"Registry: {PROVIDER.registry.stats()}")
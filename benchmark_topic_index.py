@@ -0,0 +1,119 @@
+"""
+Benchmark: near-duplicate topic lookup (MinHash/LSH) at scale
+Builds a TopicIndex over N synthetic cached topics, then measures lookups for
+- exact:   an already-known topic
+- variant: a known topic with a typo / plural / question phrasing
+- miss:    an unrelated new topic
+and how many variant queries resolve to their original (the cache-hit gain).
+
+Run: python benchmark_topic_index.py [topics]
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+TOPICS = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+QUERIES = 2000
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'SmartLearn_v2.settings')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import django
+django.setup()
+
+from demo_app.topic_index import SharedTopicIndex, normalize_topic
+
+SYLLABLES = ['pho', 'to', 'syn', 'the', 'sis', 'mi', 'to', 'chon', 'dri', 'qua', 'ntum', 'ther', 'mo', 'dy',
+             'na', 'mic', 'gen', 'e', 'tic', 'cal', 'cu', 'lus', 'vec', 'tor', 'al', 'ge', 'bra', 'neu', 'ron',
+             'plan', 'et', 'ar', 'y', 'cli', 'mate', 'ro', 'man', 'em', 'pire', 'cir', 'cuit', 'lo', 'gic', 'ka']
+CONNECTORS = ['', '', '', 'law', 'theory', 'equation', 'cycle', 'structure', 'history', 'model']
+
+
+def word(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def make_topic(rng):
+    words = [word(rng) for _ in range(rng.randint(1, 3))]
+    return ' '.join(words + [rng.choice(CONNECTORS)]).strip()
+
+
+def variant(rng, topic):
+    kind = rng.randrange(4)
+    if kind == 0:
+        return f"What is {topic}?"
+    if kind == 1:
+        return topic.title() + ' process'
+    if kind == 2:  # typo: drop one letter from a long word
+        words = topic.split()
+        i = max(range(len(words)), key=lambda w: len(words[w]))
+        j = rng.randrange(1, len(words[i]) - 1)
+        words[i] = words[i][:j] + words[i][j + 1:]
+        return ' '.join(words)
+    return topic + 's'
+
+
+def timed(index, queries):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(index.lookup('', normalize_topic(query))[0])
+        latencies.append((time.perf_counter() - start) * 1e6)
+    latencies.sort()
+    return results, statistics.median(latencies), latencies[int(len(latencies) * 0.99)]
+
+
+if __name__ == '__main__':
+    rng = random.Random(7)
+    topics = list({normalize_topic(make_topic(rng)) for _ in range(int(TOPICS * 1.2))})[:TOPICS]
+
+    print("=" * 66)
+    print(f"🔗 TOPIC INDEX BENCHMARK ({len(topics)} topics, {QUERIES} queries each)")
+    print("=" * 66)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        shared = SharedTopicIndex(Path(tmp) / 'topics.tsv', max_topics=len(topics), threshold=0.8)
+        start = time.perf_counter()
+        canonical_of = {}
+        for topic in topics:
+            canonical_of[topic] = shared.canonical('', topic)
+            if canonical_of[topic] == topic:
+                shared.register('', topic)
+        build = time.perf_counter() - start
+        print(f"build:  {build:6.1f}s ({build / len(topics) * 1e6:.0f} µs/topic, incl. near-dup check + append)")
+
+        # A fresh worker loading the shared file (band hashes are stored, not recomputed)
+        loaded = SharedTopicIndex(Path(tmp) / 'topics.tsv', max_topics=len(topics), threshold=0.8)
+        start = time.perf_counter()
+        loaded._sync()
+        print(f"load:   {time.perf_counter() - start:6.1f}s ({len(loaded.index)} topics from topics.tsv)")
+    index = loaded.index
+
+    sample_topics = rng.sample(topics, QUERIES)
+    exact_q = sample_topics
+    sample = [canonical_of[t] for t in sample_topics]  # what each query should resolve to
+    variant_q = [variant(rng, t) for t in sample_topics]
+    known = set(topics)
+    miss_q = [q for q in (make_topic(random.Random(-i)) for i in range(1, QUERIES * 3))
+              if normalize_topic(q) not in known][:QUERIES]
+
+    print(f"{'query':<10} {'p50 µs':>10} {'p99 µs':>10} {'resolved':>10}")
+    for label, queries, expected in [('exact', exact_q, sample), ('variant', variant_q, sample), ('miss', miss_q, None)]:
+        results, p50, p99 = timed(index, queries)
+        if expected is None:
+            resolved = sum(1 for r in results if r is not None)
+            note = f"{resolved / len(results):>9.1%} (false matches)"
+        else:
+            resolved = sum(1 for r, e in zip(results, expected) if r == e)
+            note = f"{resolved / len(results):>9.1%}"
+        print(f"{label:<10} {p50:10.1f} {p99:10.1f} {note}")
+
+    plain = sum(1 for q, t in zip(variant_q, sample_topics) if q.lower().strip() == t)
+    print("-" * 66)
+    print(f"variant hit ratio: {plain / QUERIES:.1%} with lower()+strip() keys -> "
+          f"{sum(1 for r, e in zip(timed(index, variant_q)[0], sample) if r == e) / QUERIES:.1%} with the index")
@@ -0,0 +1,232 @@
+"""
+Admission control - decide BEFORE an AI generation starts whether the keys can take it
+A cache miss used to go straight to call_ai_with_retry, which then waited for a
+key and finally returned an "Error: ..." string. Now every user-facing
+generation asks admit() first; it looks at the key pool's live capacity
+(RPM/TPM buckets, cooldowns, invalid keys) and today's quota ledger.
+
+When the answer is no, each request class walks its degradation ladder
+(settings.AI_ADMISSION['classes']) and the first step that works wins:
+
+- stale:          an expired cache entry that is still in the store
+- near_duplicate: the cached entry of a similar known topic (looser than the
+                  cache-key threshold) - labelled with related_topic, since it
+                  answers a different question than the one asked
+- fallback:       built locally from the request's content (see local_fallback.py)
+- queue:          a GenerationJob; the client polls (202 + job id)
+- ...otherwise:   an immediate 503 with Retry-After
+
+Background work (warming, job workers) is not admission-controlled - it
+waits for capacity instead.
+"""
+
+import json
+import math
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from threading import Lock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+
+from .cache import artifact_key, get_store
+from .quota import quota_day, quota_zone
+from .topic_index import get_topic_index, normalize_topic
+
+DEFAULT_CLASSES = {
+    'search': ['stale', 'near_duplicate', 'queue'],     # /ai/search-all/
+    'explain': ['stale', 'near_duplicate'],             # /ai/, /ai/stream/, /story/
+    'materials': ['fallback'],                          # flashcards / MCQs / keywords endpoints
+}
+
+
+def _config():
+    return getattr(settings, 'AI_ADMISSION', {})
+
+
+def allows(request_class, step):
+    """Whether `step` is on request_class's degradation ladder"""
+    classes = _config().get('classes', DEFAULT_CLASSES)
+    return step in classes.get(request_class, ())
+
+
+class Overloaded(Exception):
+    """No capacity for a generation and no degraded answer - reject or queue"""
+
+    def __init__(self, retry_after, reason):
+        super().__init__(f"AI capacity exhausted ({reason}) - retry in {retry_after}s")
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class Admission:
+    def __init__(self, admitted, retry_after=0, reason=''):
+        self.admitted = admitted
+        self.retry_after = retry_after
+        self.reason = reason
+
+    def __bool__(self):
+        return self.admitted
+
+    def reject(self):
+        raise Overloaded(self.retry_after, self.reason)
+
+
+_stats = Counter()
+_stats_lock = Lock()
+
+
+def count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+# ============================================
+# Capacity
+# ============================================
+
+def _seconds_to_quota_reset():
+    zone = quota_zone()
+    midnight = datetime.combine(quota_day() + timedelta(days=1), datetime.min.time(), tzinfo=zone)
+    return max(1.0, (midnight - datetime.now(zone)).total_seconds())
+
+
+def capacity(tokens=2000):
+    """
+    (calls that could start now, seconds until the next one could).
+    Keys with today's quota used up count as unusable until the quota resets.
+    """
+    from .Smart_api import key_pool, get_key_quota_remaining
+    spent = {index for index, left in enumerate(get_key_quota_remaining()) if left <= 0}
+    available, wait = key_pool.capacity(tokens, exclude=spent)
+    if wait == math.inf and spent - key_pool.invalid_indexes():
+        wait = _seconds_to_quota_reset()  # only the daily quota is in the way
+    return available, wait
+
+
+def admit(request_class, calls=1, tokens=2000):
+    """Admission for a generation needing `calls` AI calls"""
+    if not _config().get('enabled', True) or request_class is None:
+        return Admission(True)
+    available, wait = capacity(tokens)
+    # A short wait is fine - the key pool's acquire() absorbs it
+    if available >= calls or wait <= _config().get('max_wait', 5):
+        count('admitted')
+        return Admission(True)
+    if wait == math.inf:
+        reason, retry_after = 'no usable API keys', _config().get('retry_after_no_keys', 300)
+    elif wait > 3600:
+        reason, retry_after = 'daily quota exhausted', wait
+    else:
+        reason, retry_after = 'rate limited', wait
+    count('rejected')
+    print(f"🚦 Not admitted ({request_class}): {reason}, capacity back in {retry_after:.0f}s")
+    return Admission(False, int(retry_after) + 1, reason)
+
+
+async def aadmit(request_class, calls=1, tokens=2000):
+    """admit() for async callers (the quota ledger reads the database)"""
+    return await sync_to_async(admit)(request_class, calls, tokens)
+
+
+# ============================================
+# Degraded answers from the cache
+# ============================================
+
+def _any_age(cache_key):
+    """(data, fresh) even past the hard TTL, as long as the store still has it - (None, False) if not"""
+    try:
+        entry = get_store().get_entry(cache_key)
+    except Exception as e:
+        print(f"❌ Cache load error: {e}")
+        return None, False
+    if entry is None:
+        return None, False
+    return entry[0], time.time() < entry[2]
+
+
+def similar_topics(topic, namespace=''):
+    """Known topics close to `topic` under the looser admission threshold"""
+    index = get_topic_index()
+    if index is None:
+        return []
+    normalized = normalize_topic(topic) or topic.lower().strip()
+    return index.similar(namespace, normalized, _config().get('near_duplicate_threshold', 0.5),
+                         scan_limit=_config().get('near_duplicate_scan_limit', 500))[:3]
+
+
+def degraded(request_class, topic, key_for, namespace=''):
+    """
+    (data, 'cached' | 'stale' | 'near_duplicate', related_topic) from cache entries
+    the caller's normal lookup didn't serve, or (None, None, None). key_for(topic)
+    builds the cache key ('cached': a fresh entry under a key the caller doesn't own,
+    e.g. the explanation artifact answering /ai/). related_topic is the known topic
+    whose entry was served for 'near_duplicate', else None.
+    """
+    if allows(request_class, 'stale'):
+        data, fresh = _any_age(key_for(topic))
+        if data:
+            how = 'cached' if fresh else 'stale'
+            count(how)
+            print(f"🚦 Serving a{' cached' if fresh else 'n expired'} entry for: {topic}")
+            return data, how, None
+    if allows(request_class, 'near_duplicate'):
+        for similar in similar_topics(topic, namespace):
+            data, _ = _any_age(key_for(similar))
+            if data:
+                count('near_duplicate')
+                print(f"🚦 Serving related topic '{similar}' for: {topic}")
+                return data, 'near_duplicate', similar
+    return None, None, None
+
+
+def degraded_fields(how, related, admission):
+    """Fields added to a degraded answer so clients can tell it apart from a generated one"""
+    fields = {'degraded': how, 'retry_after': admission.retry_after}
+    if related:
+        fields['related_topic'] = related
+    return fields
+
+
+# ============================================
+# Responses
+# ============================================
+
+def overloaded_response(retry_after, reason):
+    """Fast 503 + Retry-After"""
+    count('503')
+    response = JsonResponse({
+        'error': 'The AI service is at capacity - please try again shortly',
+        'reason': reason,
+        'retry_after': retry_after,
+    }, status=503)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def degraded_text_response(field, artifact, topic, admission):
+    """{field: the topic's cached explanation/story artifact} served degraded, else a 503"""
+    text, how, related = degraded('explain', topic, lambda t: artifact_key(artifact, t))
+    if isinstance(text, str) and text:
+        return JsonResponse({field: text, **degraded_fields(how, related, admission)})
+    return overloaded_response(admission.retry_after, admission.reason)
+
+
+def materials_fallback(field, topic, content, overloaded):
+    """Local flashcards/MCQs/keywords from the request content, else a 503"""
+    from .local_fallback import build
+    if allows('materials', 'fallback'):
+        items = build(field, topic, content)
+        if items:
+            count('fallback')
+            print(f"🚦 Local {field} fallback for: {topic} ({len(items)} items)")
+            return JsonResponse({'success': True, field: json.dumps(items),
+                                 'fallback': True, 'retry_after': overloaded.retry_after})
+    return overloaded_response(overloaded.retry_after, overloaded.reason)
@@ -0,0 +1,590 @@
+"""
+AI Provider Layer - Pluggable LLM backends behind call_ai_with_retry
+Providers:
+- gemini: Google Gemini through google.generativeai (production)
+- fake:   Offline deterministic backend for load testing / benchmarks
+
+Select with settings.AI_PROVIDER (env: AI_PROVIDER)
+Fake provider behaviour is configured with settings.AI_FAKE_PROVIDER
+"""
+
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+import hashlib
+import weakref
+
+from django.conf import settings
+
+from .rate_limiter import estimate_tokens
+
+
+# ============================================
+# Provider Errors
+# ============================================
+# Messages mirror what Gemini returns; call_ai_with_retry tells them apart
+# with error_kind() below.
+
+class ProviderError(Exception):
+    """Base error raised by AI providers"""
+
+
+class RateLimitError(ProviderError):
+    """429 - quota / rate limit exceeded"""
+
+
+class InvalidKeyError(ProviderError):
+    """401 - API key rejected"""
+
+
+class ProviderTimeoutError(ProviderError):
+    """504 - request took too long"""
+
+
+try:
+    from google.api_core import exceptions as google_exceptions
+except ImportError:  # only the fake provider is usable without google-generativeai
+    google_exceptions = None
+
+_STATUS_CODE = re.compile(r'\b(401|429)\b')
+
+
+def error_kind(e):
+    """
+    'rate_limit', 'invalid_key' or 'error' for an exception a provider raised.
+    Goes by exception type / status code - not by words in the message
+    ("generate" or "moderate" contain "rate").
+    """
+    if isinstance(e, RateLimitError):
+        return 'rate_limit'
+    if isinstance(e, InvalidKeyError):
+        return 'invalid_key'
+    if google_exceptions is not None:
+        if isinstance(e, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+            return 'rate_limit'
+        if isinstance(e, google_exceptions.Unauthenticated):
+            return 'invalid_key'
+    code = getattr(e, 'code', None)
+    if code in (401, 429):
+        return 'rate_limit' if code == 429 else 'invalid_key'
+    text = str(e).lower()
+    # Gemini rejects a bad key with 400 INVALID_ARGUMENT, identified only by its reason
+    if 'api_key_invalid' in text or 'api key not valid' in text:
+        return 'invalid_key'
+    status = _STATUS_CODE.search(text)
+    if status:
+        return 'rate_limit' if status.group(1) == '429' else 'invalid_key'
+    return 'error'
+
+
+# ============================================
+# Base Provider
+# ============================================
+
+class BaseProvider:
+    """Interface every AI backend implements"""
+
+    name = 'base'
+
+    def list_models(self, api_key=None):
+        """Return model names that support text generation"""
+        raise NotImplementedError
+
+    def generate(self, prompt, model, api_key=None, max_tokens=2000, temperature=0.7, usage=None, timeout=None):
+        """
+        Return generated text for prompt (empty string if nothing came back).
+        When `usage` is a dict it is filled with prompt_tokens / output_tokens.
+        `timeout` (seconds) bounds the whole call, streams included.
+        """
+        raise NotImplementedError
+
+    async def agenerate(self, prompt, model, api_key=None, max_tokens=2000, temperature=0.7, usage=None, timeout=None):
+        """Async generate - backends without native async run in a thread"""
+        return await asyncio.to_thread(self.generate, prompt, model, api_key, max_tokens, temperature, usage, timeout)
+
+    def stream(self, prompt, model, api_key=None, max_tokens=2000, temperature=0.7, usage=None, timeout=None):
+        """Yield text chunks as they are generated - default is one chunk at the end"""
+        text = self.generate(prompt, model, api_key, max_tokens, temperature, usage, timeout)
+        if text:
+            yield text
+
+    async def astream(self, prompt, model, api_key=None, max_tokens=2000, temperature=0.7, usage=None, timeout=None):
+        """Async stream - default is one chunk from agenerate()"""
+        text = await self.agenerate(prompt, model, api_key, max_tokens, temperature, usage, timeout)
+        if text:
+            yield text
+
+
+# ============================================
+# Gemini Provider (google.generativeai)
+# ============================================
+
+class ClientRegistry:
+    """
+    Builds Gemini clients once and reuses them on the hot path:
+    - one service client (= one gRPC channel) per API key, shared by every model/config
+    - one GenerativeModel per (model, key, max_tokens, temperature) with its
+      GenerationConfig baked in
+    Async clients/models are kept per event loop (grpc.aio channels are loop-bound).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._services = {}
+        self._models = {}
+        self._async = weakref.WeakKeyDictionary()
+        self.built = 0
+
+    def service(self, kind, api_key):
+        """ModelServiceClient ('model') or GenerativeServiceClient ('generative') for api_key"""
+        client = self._services.get((kind, api_key))
+        if client is None:
+            from google.ai import generativelanguage as glm
+            with self._lock:
+                client = self._services.get((kind, api_key))
+                if client is None:
+                    client_class = glm.ModelServiceClient if kind == 'model' else glm.GenerativeServiceClient
+                    client = client_class(client_options={'api_key': api_key})
+                    self._services[(kind, api_key)] = client
+                    self.built += 1
+        return client
+
+    def _build_model(self, model, max_tokens, temperature):
+        import google.generativeai as genai
+        self.built += 1
+        return genai.GenerativeModel(
+            model,
+            generation_config=genai.types.GenerationConfig(
+                max_output_tokens=max_tokens,
+                temperature=temperature,
+            )
+        )
+
+    def model(self, model, api_key, max_tokens, temperature):
+        """Ready-to-call GenerativeModel for this (model, key, config)"""
+        registry_key = (model, api_key, max_tokens, temperature)
+        generative_model = self._models.get(registry_key)
+        if generative_model is None:
+            service = self.service('generative', api_key)
+            with self._lock:
+                generative_model = self._models.get(registry_key)
+                if generative_model is None:
+                    generative_model = self._build_model(model, max_tokens, temperature)
+                    generative_model._client = service
+                    self._models[registry_key] = generative_model
+        return generative_model
+
+    def async_model(self, model, api_key, max_tokens, temperature):
+        """Async counterpart of model() for the running event loop"""
+        loop = asyncio.get_running_loop()
+        registry_key = (model, api_key, max_tokens, temperature)
+        with self._lock:
+            per_loop = self._async.setdefault(loop, {'services': {}, 'models': {}})
+            generative_model = per_loop['models'].get(registry_key)
+            if generative_model is None:
+                service = per_loop['services'].get(api_key)
+                if service is None:
+                    from google.ai import generativelanguage as glm
+                    service = glm.GenerativeServiceAsyncClient(client_options={'api_key': api_key})
+                    per_loop['services'][api_key] = service
+                    self.built += 1
+                generative_model = self._build_model(model, max_tokens, temperature)
+                generative_model._async_client = service
+                per_loop['models'][registry_key] = generative_model
+        return generative_model
+
+    def stats(self):
+        with self._lock:
+            return {
+                'service_clients': len(self._services),
+                'models': len(self._models),
+                'event_loops': len(self._async),
+                'objects_built': self.built,
+            }
+
+
+def _read_usage(response, usage):
+    """Copy Gemini's usage_metadata token counts into the caller's usage dict"""
+    metadata = getattr(response, 'usage_metadata', None)
+    if usage is None or metadata is None:
+        return
+    usage['prompt_tokens'] = getattr(metadata, 'prompt_token_count', 0) or 0
+    usage['output_tokens'] = getattr(metadata, 'candidates_token_count', 0) or 0
+
+
+def _request_options(timeout):
+    """gRPC deadline for one call (None = the client library's default)"""
+    return {'timeout': timeout} if timeout else None
+
+
+class GeminiProvider(BaseProvider):
+    """
+    Real Gemini backend.
+    Credentials are passed per call: each key gets its own service client
+    (and gRPC channel) instead of going through the global genai.configure().
+    Clients and models come from a ClientRegistry, so nothing is rebuilt per call.
+    """
+
+    name = 'gemini'
+
+    def __init__(self):
+        self.registry = ClientRegistry()
+
+    def list_models(self, api_key=None):
+        import google.generativeai as genai
+        available_models = []
+        for model in genai.list_models(client=self.registry.service('model', api_key)):
+            if 'generateContent' in model.supported_generation_methods:
+                available_models.append(model.name.replace('models/', ''))
+        return available_models
+
+    def generate(self, prompt, model, api_key=None, max_tokens=2000, temperature=0.7, usage=None, timeout=None):
+        generative_model = self.registry.model(model, api_key, max_tokens, temperature)
+        response = generative_model.generate_content(prompt, request_options=_request_options(timeout))
+        _read_usage(response, usage)
+        if not response:
+            return ''
+        return response.text or ''
+
+    async def agenerate(self, prompt, model, api_key=None, max_tokens=2000, temperature=0.7, usage=None, timeout=None):
+        generative_model = self.registry.async_model(model, api_key, max_tokens, temperature)
+        response = await generative_model.generate_content_async(prompt, request_options=_request_options(timeout))
+        _read_usage(response, usage)
+        if not response:
+            return ''
+        return response.text or ''
+
+    def stream(self, prompt, model, api_key=None, max_tokens=2000, temperature=0.7, usage=None, timeout=None):
+        generative_model = self.registry.model(model, api_key, max_tokens, temperature)
+        for chunk in generative_model.generate_content(prompt, stream=True, request_options=_request_options(timeout)):
+            # The last chunk carries the totals
+            _read_usage(chunk, usage)
+            # Chunks without text (e.g. safety/finish metadata) raise on .text
+            try:
+                text = chunk.text
+            except ValueError:
+                continue
+            if text:
+                yield text
+
+    async def astream(self, prompt, model, api_key=None, max_tokens=2000, temperature=0.7, usage=None, timeout=None):
+        generative_model = self.registry.async_model(model, api_key, max_tokens, temperature)
+        response = await generative_model.generate_content_async(prompt, stream=True, request_options=_request_options(timeout))
+        async for chunk in response:
+            _read_usage(chunk, usage)
+            try:
+                text = chunk.text
+            except ValueError:
+                continue
+            if text:
+                yield text
+
+
+# ============================================
+# Fake Provider (offline, deterministic)
+# ============================================
+
+DEFAULT_FAKE_CONFIG = {
+    'seed': 42,
+    'models': ['gemini-2.5-flash', 'gemini-1.5-flash', 'gemini-pro'],
+    'keys': 3,
+    # distribution: fixed | uniform | normal | lognormal
+    'latency': {'distribution': 'fixed', 'mean': 0.0, 'stddev': 0.0, 'min': 0.0, 'max': 30.0},
+    # Probability per call of raising each error class
+    'error_rates': {'429': 0.0, '401': 0.0, 'timeout': 0.0},
+    # Probability per call of returning broken JSON for JSON prompts
+    'malformed_json_rate': 0.0,
+    # Optional canned outputs: [{'match': 'substring', 'text': 'template with {topic}'}]
+    'responses': [],
+    # Streaming: characters per chunk, share of the latency spent before the first chunk
+    'chunk_chars': 120,
+    'first_chunk_fraction': 0.2,
+    # Per-model behaviour for routing tests: {model: {'latency_factor': 0.3, 'error_rate': 0.5}}
+    # (error_rate raises a 500 on that model on top of error_rates)
+    'model_profiles': {},
+}
+
+
+def _words(topic, count, seed):
+    """Deterministic filler text about topic"""
+    vocab = [
+        'concept', 'process', 'energy', 'system', 'example', 'structure', 'function',
+        'principle', 'model', 'theory', 'application', 'result', 'cause', 'effect',
+        'pattern', 'method', 'stage', 'element', 'property', 'relationship',
+    ]
+    rng = random.Random(seed)
+    sentences = []
+    total = 0
+    while total < count:
+        length = rng.randint(8, 16)
+        words = [rng.choice(vocab) for _ in range(length)]
+        words.insert(rng.randint(0, length - 1), topic)
+        sentences.append(' '.join(words).capitalize() + '.')
+        total += length + 1
+    return ' '.join(sentences)
+
+
+def _timed_out(timeout):
+    return ProviderTimeoutError(f"504 Deadline Exceeded (fake provider, timeout {timeout:.1f}s)")
+
+
+class FakeProvider(BaseProvider):
+    """
+    Offline provider that recognises the prompts SmartLearn sends and
+    returns well-formed (or deliberately malformed) outputs.
+    Latency and errors are drawn from a seeded RNG so runs are repeatable.
+    """
+
+    name = 'fake'
+
+    def __init__(self, config=None):
+        self.config = dict(DEFAULT_FAKE_CONFIG)
+        self.config.update(config or {})
+        self._rng = random.Random(self.config['seed'])
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    # ---------- configuration ----------
+
+    def fake_keys(self):
+        """Placeholder API keys so the key rotation logic has something to rotate"""
+        return [f"fake-{i:02d}-{'0' * 16}{i:04d}" for i in range(1, int(self.config['keys']) + 1)]
+
+    def list_models(self, api_key=None):
+        return list(self.config['models'])
+
+    # ---------- randomness ----------
+
+    def _draw(self, model=None):
+        """Draw (latency, error_kind, malformed) for one call under the lock"""
+        latency_cfg = dict(DEFAULT_FAKE_CONFIG['latency'])
+        latency_cfg.update(self.config.get('latency') or {})
+        error_rates = self.config.get('error_rates') or {}
+
+        with self._lock:
+            self.calls += 1
+            distribution = latency_cfg['distribution']
+            mean = float(latency_cfg['mean'])
+            stddev = float(latency_cfg['stddev'])
+
+            if distribution == 'uniform':
+                latency = self._rng.uniform(float(latency_cfg['min']), float(latency_cfg['max']))
+            elif distribution == 'normal':
+                latency = self._rng.gauss(mean, stddev)
+            elif distribution == 'lognormal':
+                # mean/stddev describe the resulting latency, not the underlying normal
+                if mean > 0 and stddev > 0:
+                    sigma2 = math.log(1 + (stddev / mean) ** 2)
+                    mu = math.log(mean) - sigma2 / 2
+                    latency = self._rng.lognormvariate(mu, math.sqrt(sigma2))
+                else:
+                    latency = mean
+            else:
+                latency = mean
+
+            profile = (self.config.get('model_profiles') or {}).get(model) or {}
+            latency *= float(profile.get('latency_factor', 1.0))
+            latency = min(max(latency, float(latency_cfg['min'])), float(latency_cfg['max']))
+
+            error_kind = None
+            roll = self._rng.random()
+            threshold = 0.0
+            for kind in ('429', '401', 'timeout'):
+                threshold += float(error_rates.get(kind, 0.0))
+                if roll < threshold:
+                    error_kind = kind
+                    break
+            if error_kind is None and profile.get('error_rate') and self._rng.random() < float(profile['error_rate']):
+                error_kind = '500'
+
+            malformed = self._rng.random() < float(self.config.get('malformed_json_rate', 0.0))
+
+        return latency, error_kind, malformed
+
+    # ---------- generation ----------
+
+    def generate(self, prompt, model, api_key=None, max_tokens=2000, temperature=0.7, usage=None, timeout=None):
+        latency, error_kind, malformed = self._draw(model)
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            raise _timed_out(timeout)
+        if latency > 0:
+            time.sleep(latency)
+        return self._outcome(prompt, error_kind, malformed, usage)
+
+    async def agenerate(self, prompt, model, api_key=None, max_tokens=2000, temperature=0.7, usage=None, timeout=None):
+        latency, error_kind, malformed = self._draw(model)
+        if timeout is not None and latency > timeout:
+            await asyncio.sleep(timeout)
+            raise _timed_out(timeout)
+        if latency > 0:
+            await asyncio.sleep(latency)
+        return self._outcome(prompt, error_kind, malformed, usage)
+
+    def _stream_plan(self, prompt, model, usage, timeout):
+        """[(seconds to wait, chunk or timeout error)] for one streamed reply"""
+        latency, error_kind, malformed = self._draw(model)
+        first_chunk_fraction = float(self.config.get('first_chunk_fraction', 0.2))
+        elapsed = latency * first_chunk_fraction
+        if timeout is not None and elapsed > timeout:
+            return [(timeout, _timed_out(timeout))]
+        plan = []
+        try:
+            text = self._outcome(prompt, error_kind, malformed, usage)
+        except ProviderError as e:
+            return [(elapsed if latency > 0 else 0, e)]
+
+        chunk_chars = max(1, int(self.config.get('chunk_chars', 120)))
+        chunks = [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)]
+        gap = latency * (1 - first_chunk_fraction) / max(1, len(chunks) - 1)
+        for index, chunk in enumerate(chunks):
+            wait = elapsed if index == 0 and latency > 0 else 0
+            if index and gap > 0:
+                # The timeout covers the whole stream, like a gRPC deadline
+                if timeout is not None and elapsed + gap > timeout:
+                    plan.append((max(0.0, timeout - elapsed), _timed_out(timeout)))
+                    return plan
+                wait = gap
+                elapsed += gap
+            plan.append((wait, chunk))
+        return plan
+
+    def stream(self, prompt, model, api_key=None, max_tokens=2000, temperature=0.7, usage=None, timeout=None):
+        for wait, chunk in self._stream_plan(prompt, model, usage, timeout):
+            if wait > 0:
+                time.sleep(wait)
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+    async def astream(self, prompt, model, api_key=None, max_tokens=2000, temperature=0.7, usage=None, timeout=None):
+        for wait, chunk in self._stream_plan(prompt, model, usage, timeout):
+            if wait > 0:
+                await asyncio.sleep(wait)
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+    def _outcome(self, prompt, error_kind, malformed, usage=None):
+        """Raise the drawn error or render the reply (token usage is estimated)"""
+        if error_kind == 'timeout':
+            raise ProviderTimeoutError("504 Deadline Exceeded (fake provider timeout)")
+        if error_kind == '500':
+            raise ProviderError("500 An internal error has occurred. (fake provider)")
+        if error_kind == '429':
+            raise RateLimitError("429 Resource has been exhausted (e.g. check quota). (fake provider)")
+        if error_kind == '401':
+            raise InvalidKeyError("401 API key not valid. Please pass a valid API key. (fake provider)")
+
+        text = self.render(prompt, malformed=malformed)
+        if usage is not None:
+            usage['prompt_tokens'] = estimate_tokens(prompt)
+            usage['output_tokens'] = estimate_tokens(text)
+        return text
+
+    def render(self, prompt, malformed=False):
+        """Build the output text for a prompt without sleeping or failing"""
+        topic = extract_topic(prompt)
+        seed = int(hashlib.md5(prompt.encode()).hexdigest()[:8], 16)
+
+        for canned in self.config.get('responses') or []:
+            if canned.get('match', '') in prompt:
+                return canned.get('text', '').replace('{topic}', topic)
+
+        if '---EXPLANATION---' in prompt:
+            text = (
+                f"---EXPLANATION---\n{_words(topic, 550, seed)}\n\n"
+                f"---STORY---\n{_words(topic, 320, seed + 1)}\n---END---"
+            )
+        elif '"flashcards"' in prompt and '"mcqs"' in prompt:
+            text = json.dumps({
+                'flashcards': self._flashcards(topic, 5),
+                'mcqs': self._mcqs(topic, 5),
+                'keywords': self._keywords(topic, 5),
+            })
+        elif 'flashcards' in prompt:
+            text = json.dumps(self._flashcards(topic, 5))
+        elif 'multiple choice' in prompt:
+            text = json.dumps(self._mcqs(topic, 5))
+        elif 'key terms' in prompt:
+            text = json.dumps(self._keywords(topic, 5))
+        else:
+            return _words(topic, 550, seed)
+
+        if malformed:
+            # Truncate mid-object and add a stray quote, like a cut-off Gemini reply
+            text = text[:max(1, len(text) * 2 // 3)] + '"'
+        return text
+
+    def _flashcards(self, topic, count):
+        types = ['definition', 'keypoints', 'process']
+        return [
+            {'q': f"Question {i} about {topic}?", 'a': f"Short answer {i} about {topic}", 'type': types[i % 3]}
+            for i in range(1, count + 1)
+        ]
+
+    def _mcqs(self, topic, count):
+        return [
+            {
+                'q': f"Question {i} about {topic}?",
+                'opts': [f"Option {c} for {topic}" for c in 'ABCD'],
+                'ans': i % 4,
+                'explanation': f"Option {'ABCD'[i % 4]} is correct for {topic}",
+            }
+            for i in range(1, count + 1)
+        ]
+
+    def _keywords(self, topic, count):
+        return [{'k': f"{topic} term {i}", 'd': f"Definition {i} of a {topic} term"} for i in range(1, count + 1)]
+
+
+TOPIC_PATTERNS = [
+    r"Generate TWO outputs for: (.+)",
+    r"Create educational materials for: (.+)",
+    r"Topic: (.+)",
+    r"Extract \d+ key terms about: (.+)",
+    r"explaining the concept: (.+)",
+    r"Explain '(.+?)'",
+]
+
+
+def extract_topic(prompt):
+    """Best-effort topic extraction from SmartLearn prompts"""
+    for pattern in TOPIC_PATTERNS:
+        match = re.search(pattern, prompt)
+        if match:
+            return match.group(1).strip()
+    return prompt.strip()[:40] or 'topic'
+
+
+# ============================================
+# Provider Selection
+# ============================================
+
+PROVIDERS = {
+    'gemini': GeminiProvider,
+    'fake': FakeProvider,
+}
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider():
+    """Return the process-wide provider selected by settings.AI_PROVIDER"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                name = getattr(settings, 'AI_PROVIDER', 'gemini')
+                if name not in PROVIDERS:
+                    raise ValueError(f"Unknown AI_PROVIDER '{name}' (choose from {', '.join(PROVIDERS)})")
+                if name == 'fake':
+                    _provider = FakeProvider(getattr(settings, 'AI_FAKE_PROVIDER', None))
+                else:
+                    _provider = PROVIDERS[name]()
+    return _provider
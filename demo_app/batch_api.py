@@ -4,53 +4,36 @@ Handles: Search/Explanation, Story, Flashcards, MCQs, Keywords
 Returns everything in one response
 """
 
+import asyncio
 import json
+import threading
 import time
-from .Smart_api import call_ai_with_retry, clean_ai_json
-from .cache import save_to_cache, load_from_cache, get_cache_key, get_content_hash
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 
-def generate_all_content(topic, content=None, include_story=True):
-    """
-    Generate ALL content in optimized batch calls:
-    - Main explanation/search result
-    - Story (optional)
-    - 5 Flashcards
-    - 5 MCQs
-    - 5 Keywords
-    
-    Returns: {'search': '', 'story': '', 'flashcards': [], 'mcqs': [], 'keywords': []}
-    """
-    
-    print(f"\n{'='*60}")
-    print(f"🚀 BATCH GENERATION: {topic}")
-    print(f"{'='*60}\n")
-    
-    # Generate cache key
-    content_hash = get_content_hash(content) if content else ""
-    cache_key = get_cache_key(topic, content_hash)
-    
-    # Check cache
-    cached = load_from_cache(cache_key)
-    if cached:
-        print(f"✨ Using cached results for: {topic}\n")
-        return cached
-    
-    results = {
-        'topic': topic,
-        'search': '',
-        'story': '',
-        'flashcards': [],
-        'mcqs': [],
-        'keywords': [],
-        'errors': []
-    }
-    
-    # ============================================
-    # BATCH 1: Main Explanation & Story (Single Call)
-    # ============================================
-    print("📝 [BATCH 1/2] Generating explanation + story...")
-    
-    batch1_prompt = f"""You are an expert educator. Generate TWO outputs for: {topic}
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .Smart_api import (
+    call_ai_with_retry, acall_ai_with_retry, stream_ai_with_retry, astream_ai_with_retry, clean_ai_json, AIStreamError,
+    clean_flashcards, clean_mcqs, clean_keywords,
+)
+from .cache import (
+    save_to_cache, load_from_cache, aload_from_cache, asave_to_cache,
+    load_or_revalidate, aload_or_revalidate, get_cache_key, get_content_hash, get_store,
+    save_failure, load_failure, aload_failure, asave_failure, classify_failure, failure_ttl,
+    artifact_key, load_artifact, save_artifact, remember_topic,
+)
+from .admission import admit, aadmit, degraded, degraded_fields
+from . import deadline
+from .single_flight import get_single_flight
+
+# ============================================
+# Prompts & Parsing (shared by sync and async paths)
+# ============================================
+
+def batch1_prompt(topic):
+    """BATCH 1 prompt: explanation + story"""
+    return f"""You are an expert educator. Generate TWO outputs for: {topic}
 
 1. EXPLANATION (500-700 words):
    Comprehensive explanation with key concepts, examples, and practical applications. Be detailed and thorough.
@@ -67,40 +50,11 @@ Format your response EXACTLY like this:
 ---END---
 
 Make sure explanations and stories are COMPLETE and DETAILED. Do not truncate or shorten."""
-    
-    batch1_response = call_ai_with_retry(batch1_prompt, max_tokens=3000)
-    
-    if batch1_response and not batch1_response.startswith("Error"):
-        try:
-            # Parse batch 1 response
-            if '---EXPLANATION---' in batch1_response and '---STORY---' in batch1_response:
-                explanation = batch1_response.split('---EXPLANATION---')[1].split('---STORY---')[0].strip()
-                story = batch1_response.split('---STORY---')[1].split('---END---')[0].strip()
-                
-                results['search'] = explanation
-                if include_story:
-                    results['story'] = story
-                
-                print(f"   ✅ Explanation: {len(explanation)} chars")
-                print(f"   ✅ Story: {len(story)} chars")
-        except Exception as e:
-            print(f"   ⚠️ Parse error: {e}")
-            results['errors'].append(f"Batch 1 parse: {str(e)}")
-    else:
-        results['errors'].append(f"Batch 1 failed: {batch1_response}")
-        print(f"   ❌ Batch 1 failed")
-    
-    # Wait between batches
-    time.sleep(2)
-    
-    # ============================================
-    # BATCH 2: Flashcards, MCQs, Keywords (Single Call)
-    # ============================================
-    print("\n📚 [BATCH 2/2] Generating flashcards, MCQs, keywords...")
-    
-    content_for_batch = content[:1000] if content else results['search'][:1000]
-    
-    batch2_prompt = f"""Create educational materials for: {topic}
+
+
+def batch2_prompt(topic, content_for_batch):
+    """BATCH 2 prompt: flashcards + MCQs + keywords as one JSON object"""
+    return f"""Create educational materials for: {topic}
 
 Context: {content_for_batch}
 
@@ -132,24 +86,49 @@ Return ONLY valid JSON (no markdown, no code blocks, no extra text):
 
 Ensure all answers and definitions are COMPLETE. Return ONLY the JSON object, no extra text."""
 
-    batch2_response = call_ai_with_retry(batch2_prompt, max_tokens=3500)
-    
+
+def parse_batch1(batch1_response, results, include_story=True):
+    """Split the BATCH 1 reply into results['search'] / results['story']"""
+    if batch1_response and not batch1_response.startswith("Error"):
+        try:
+            # Parse batch 1 response
+            if '---EXPLANATION---' in batch1_response and '---STORY---' in batch1_response:
+                explanation = batch1_response.split('---EXPLANATION---')[1].split('---STORY---')[0].strip()
+                story = batch1_response.split('---STORY---')[1].split('---END---')[0].strip()
+                
+                results['search'] = explanation
+                if include_story:
+                    results['story'] = story
+                
+                print(f"   ✅ Explanation: {len(explanation)} chars")
+                print(f"   ✅ Story: {len(story)} chars")
+        except Exception as e:
+            print(f"   ⚠️ Parse error: {e}")
+            results['errors'].append(f"Batch 1 parse: {str(e)}")
+    else:
+        results['errors'].append(f"Batch 1 failed: {batch1_response}")
+        print(f"   ❌ Batch 1 failed")
+
+
+def parse_batch2(batch2_response, results):
+    """Parse the BATCH 2 JSON into results['flashcards'/'mcqs'/'keywords']"""
     if batch2_response and not batch2_response.startswith("Error"):
         try:
             # Clean and parse JSON
             cleaned = clean_ai_json(batch2_response)
             data = json.loads(cleaned)
             
+            # Same checks as the standalone endpoints - they answer from these entries too
             if 'flashcards' in data and isinstance(data['flashcards'], list):
-                results['flashcards'] = data['flashcards'][:5]
+                results['flashcards'] = clean_flashcards(data['flashcards'])[:5]
                 print(f"   ✅ Flashcards: {len(results['flashcards'])} generated")
             
             if 'mcqs' in data and isinstance(data['mcqs'], list):
-                results['mcqs'] = data['mcqs'][:5]
+                results['mcqs'] = clean_mcqs(data['mcqs'])[:5]
                 print(f"   ✅ MCQs: {len(results['mcqs'])} generated")
             
             if 'keywords' in data and isinstance(data['keywords'], list):
-                results['keywords'] = data['keywords'][:5]
+                results['keywords'] = clean_keywords(data['keywords'])[:5]
                 print(f"   ✅ Keywords: {len(results['keywords'])} generated")
                 
         except json.JSONDecodeError as e:
@@ -161,11 +140,87 @@ Ensure all answers and definitions are COMPLETE. Return ONLY the JSON object, no
     else:
         results['errors'].append(f"Batch 2 failed: {batch2_response}")
         print(f"   ❌ Batch 2 failed")
+
+
+BATCH1_PARTS = ('search', 'story')
+BATCH2_PARTS = ('flashcards', 'mcqs', 'keywords')
+# results key -> per-artifact cache entry (see cache.artifact_key)
+ARTIFACTS = {'search': 'explanation', 'story': 'story', 'flashcards': 'flashcards', 'mcqs': 'mcqs', 'keywords': 'keywords'}
+
+
+def missing_parts(results, include_story=True):
+    """Artifacts that came back empty"""
+    expected = BATCH1_PARTS + BATCH2_PARTS if include_story else ('search',) + BATCH2_PARTS
+    return [part for part in expected if not results.get(part)]
+
+
+def _artifact_context(part, content, results):
+    """Prompt context a part depends on: BATCH 1 only sees the topic, BATCH 2 the content/explanation"""
+    if part in BATCH1_PARTS:
+        return ''
+    return content or results['search']
+
+
+def load_artifacts(topic, content, include_story, results):
+    """Fill the empty parts of results from their per-artifact cache entries"""
+    for part in BATCH1_PARTS + BATCH2_PARTS:  # BATCH 1 first - the explanation is BATCH 2's context
+        if results[part] or (part == 'story' and not include_story):
+            continue
+        context = _artifact_context(part, content, results)
+        if part in BATCH2_PARTS and not context:
+            continue
+        cached = load_artifact(ARTIFACTS[part], topic, context)
+        if cached:
+            results[part] = cached
+
+
+def save_artifacts(results, content=None, parts=None):
+    """Cache each generated part under its own content-addressed key"""
+    for part in parts if parts is not None else ARTIFACTS:
+        context = _artifact_context(part, content, results)
+        if part in BATCH2_PARTS and not context:
+            continue
+        save_artifact(ARTIFACTS[part], results['topic'], context, results[part])
+
+
+def cache_results(results, cache_key, include_story=True, content=None, generated=None):
+    """
+    Cache complete results for 72h, plus every generated part as its own artifact.
+    A partial result is cached with the failed parts listed in results['missing']:
+    fresh only for the failure's TTL, then served stale while just those parts
+    are regenerated (see _regenerate). Nothing usable at all -> a short
+    negative-cache entry instead.
+    """
+    results.pop('missing', None)
+    results.pop('retry_after', None)
+    save_artifacts(results, content, generated)
+    missing = missing_parts(results, include_story)
+    if not missing:
+        if save_to_cache(cache_key, results, ttl_hours=72):
+            remember_topic(results['topic'], get_content_hash(content) if content else "")
+        return
+    
+    # Parts that failed without an error message (e.g. no ---STORY--- marker) count as parse failures
+    errors = results['errors'] or ['Parse: no content']
+    if len(missing) == len(missing_parts({}, include_story)):
+        failure = save_failure(cache_key, errors[0])
+        if failure:
+            results['retry_after'] = failure['retry_after']
+        return
     
+    ttl = min(failure_ttl(classify_failure(error), error) for error in errors)
+    stale_hours = 72 + getattr(settings, 'AI_CACHE', {}).get('stale_hours', 0)
+    results['missing'] = missing
+    print(f"🧩 Partial result - missing {', '.join(missing)}; retrying those in {ttl}s")
+    save_to_cache(cache_key, results, ttl_hours=ttl / 3600, stale_hours=stale_hours)
+
+
+def finish_batch(results, cache_key, include_story=True, content=None, generated=None):
+    """Cache results (generated = parts made by this call, None for all), print the summary and attach quota info"""
     # ============================================
     # Cache Results
     # ============================================
-    save_to_cache(cache_key, results, ttl_hours=72)
+    cache_results(results, cache_key, include_story, content, generated)
     
     # ============================================
     # Get Quota Info
@@ -186,6 +241,8 @@ Ensure all answers and definitions are COMPLETE. Return ONLY the JSON object, no
     print(f"🔑 Keywords: {len(results['keywords'])} items")
     if results['errors']:
         print(f"⚠️  Errors: {len(results['errors'])}")
+    if results.get('missing'):
+        print(f"🧩 Missing: {', '.join(results['missing'])}")
     
     print(f"\n📊 API QUOTA STATUS:")
     print(f"   Calls Used: {quota['calls_made']}/{quota['quota_limit']}")
@@ -199,22 +256,543 @@ Ensure all answers and definitions are COMPLETE. Return ONLY the JSON object, no
     return results
 
 
-def generate_search_only(topic):
-    """Quick search/explanation only (no story, flashcards, etc)"""
-    print(f"\n🔍 Quick search: {topic}")
+def _new_results(topic):
+    return {
+        'topic': topic,
+        'search': '',
+        'story': '',
+        'flashcards': [],
+        'mcqs': [],
+        'keywords': [],
+        'errors': []
+    }
+
+
+def _degraded_results(request_class, topic, content_hash, admission):
+    """Expired or near-duplicate results when the keys can't take a generation - else Overloaded"""
+    data, how, related = degraded(request_class, topic, lambda t: get_cache_key(t, content_hash), content_hash)
+    if data is None:
+        admission.reject()
+    return dict(data, **degraded_fields(how, related, admission))
+
+
+def _failed_results(topic, failure):
+    """Results for a topic whose generation failed moments ago (no AI call made)"""
+    results = _new_results(topic)
+    results['errors'].append(f"Recent failure ({failure['error_class']}): {failure['error']}")
+    results['retry_after'] = failure['retry_after']
+    return results
+
+
+def generate_all_content(topic, content=None, include_story=True, request_class='search'):
+    """
+    Generate ALL content in optimized batch calls:
+    - Main explanation/search result
+    - Story (optional)
+    - 5 Flashcards
+    - 5 MCQs
+    - 5 Keywords
+    
+    Returns: {'search': '', 'story': '', 'flashcards': [], 'mcqs': [], 'keywords': []}
+    Without key capacity a degraded result is returned or admission.Overloaded
+    raised (request_class=None skips admission control - background work).
+    """
+    
+    print(f"\n{'='*60}")
+    print(f"🚀 BATCH GENERATION: {topic}")
+    print(f"{'='*60}\n")
+    
+    # Generate cache key
+    content_hash = get_content_hash(content) if content else ""
+    cache_key = get_cache_key(topic, content_hash)
     
-    cache_key = get_cache_key(topic, "search_only")
-    cached = load_from_cache(cache_key)
+    # Check cache (stale entries are served while a background refresh runs)
+    cached = load_or_revalidate(cache_key, lambda: _refresh_all(topic, content, include_story, cache_key))
     if cached:
+        print(f"✨ Using cached results for: {topic}\n")
         return cached
     
-    prompt = f"Explain '{topic}' in detail with key concepts, examples, and practical applications."
-    result = call_ai_with_retry(prompt, max_tokens=2000)
+    failure = load_failure(cache_key)
+    if failure:
+        return _failed_results(topic, failure)
     
-    response = {
-        'topic': topic,
-        'search': result if result and not result.startswith("Error") else "Failed to generate explanation"
+    admission = admit(request_class)
+    if not admission:
+        return _degraded_results(request_class, topic, content_hash, admission)
+    
+    return _refresh_all(topic, content, include_story, cache_key)
+
+
+def _refresh_all(topic, content, include_story, cache_key):
+    """Generate + cache; concurrent identical requests/refreshes share one generation"""
+    return get_single_flight().do(
+        cache_key,
+        lambda: _regenerate(topic, content, include_story, cache_key),
+        recheck=lambda: load_from_cache(cache_key),
+    )
+
+
+def _regenerate(topic, content, include_story, cache_key):
+    """
+    Generate only what isn't cached: parts of a partial result or per-artifact
+    entries are reused, and a batch runs only if one of its parts is missing.
+    """
+    results = _new_results(topic)
+    try:
+        entry = get_store().get_entry(cache_key)
+    except Exception as e:
+        print(f"❌ Cache load error: {e}")
+        entry = None
+    if entry and entry[0].get('missing') and time.time() < entry[3]:
+        results.update(entry[0], errors=[])
+    load_artifacts(topic, content, include_story, results)
+    
+    missing = set(missing_parts(results, include_story))
+    if missing.intersection(BATCH1_PARTS) and missing.intersection(BATCH2_PARTS):
+        return _generate_all(topic, content, include_story, cache_key)
+    return _complete(topic, content, include_story, cache_key, results, missing)
+
+
+def _complete(topic, content, include_story, cache_key, results, missing):
+    """Fill the missing parts of results (at most one batch) and cache them"""
+    if not missing:
+        print(f"🧩 Assembled from cached artifacts: {topic}")
+        return finish_batch(results, cache_key, include_story, content, generated=())
+    
+    print(f"🧩 Generating only the missing parts for {topic}: {', '.join(sorted(missing))}")
+    if missing.intersection(BATCH1_PARTS):
+        generated = _new_results(topic)
+        parse_batch1(call_ai_with_retry(batch1_prompt(topic), max_tokens=3000, task='explanation'), generated, include_story)
+        _merge_parts(results, generated, missing, BATCH1_PARTS)
+    
+    if missing.intersection(BATCH2_PARTS):
+        generated = _new_results(topic)
+        content_for_batch = content[:1000] if content else results['search'][:1000]
+        parse_batch2(call_ai_with_retry(batch2_prompt(topic, content_for_batch), max_tokens=3500, task='materials'), generated)
+        _merge_parts(results, generated, missing, BATCH2_PARTS)
+    
+    return finish_batch(results, cache_key, include_story, content, generated=missing)
+
+
+def _merge_parts(results, generated, missing, parts):
+    for part in parts:
+        if part in missing and generated[part]:
+            results[part] = generated[part]
+    results['errors'].extend(generated['errors'])
+
+
+def _generate_all(topic, content, include_story, cache_key):
+    if _parallel_config().get('enabled', True):
+        return _generate_all_parallel(topic, content, include_story, cache_key)
+    
+    results = _new_results(topic)
+    
+    # ============================================
+    # BATCH 1: Main Explanation & Story (Single Call)
+    # ============================================
+    print("📝 [BATCH 1/2] Generating explanation + story...")
+    batch1_response = call_ai_with_retry(batch1_prompt(topic), max_tokens=3000, task='explanation')
+    parse_batch1(batch1_response, results, include_story)
+    
+    # Wait between batches
+    time.sleep(deadline.budget(2))
+    
+    # ============================================
+    # BATCH 2: Flashcards, MCQs, Keywords (Single Call)
+    # ============================================
+    print("\n📚 [BATCH 2/2] Generating flashcards, MCQs, keywords...")
+    content_for_batch = content[:1000] if content else results['search'][:1000]
+    batch2_response = call_ai_with_retry(batch2_prompt(topic, content_for_batch), max_tokens=3500, task='materials')
+    parse_batch2(batch2_response, results)
+    
+    return finish_batch(results, cache_key, include_story, content)
+
+
+async def agenerate_all_content(topic, content=None, include_story=True, request_class='search'):
+    """Async version of generate_all_content (same prompts, parsing and cache)"""
+    
+    print(f"\n{'='*60}")
+    print(f"🚀 ASYNC BATCH GENERATION: {topic}")
+    print(f"{'='*60}\n")
+    
+    content_hash = get_content_hash(content) if content else ""
+    cache_key = get_cache_key(topic, content_hash)
+    
+    cached = await aload_or_revalidate(cache_key, lambda: _refresh_all(topic, content, include_story, cache_key))
+    if cached:
+        print(f"✨ Using cached results for: {topic}\n")
+        return cached
+    
+    failure = await aload_failure(cache_key)
+    if failure:
+        return _failed_results(topic, failure)
+    
+    admission = await aadmit(request_class)
+    if not admission:
+        return await sync_to_async(_degraded_results)(request_class, topic, content_hash, admission)
+    
+    return await get_single_flight().ado(
+        cache_key,
+        lambda: _agenerate_all(topic, content, include_story, cache_key),
+        recheck=lambda: aload_from_cache(cache_key),
+    )
+
+
+async def _agenerate_all(topic, content, include_story, cache_key):
+    results = _new_results(topic)
+    await sync_to_async(load_artifacts)(topic, content, include_story, results)
+    missing = set(missing_parts(results, include_story))
+    if not (missing.intersection(BATCH1_PARTS) and missing.intersection(BATCH2_PARTS)):
+        return await _acomplete(topic, content, include_story, cache_key, results, missing)
+    
+    results = _new_results(topic)
+    parallel = _parallel_config().get('enabled', True)
+    
+    if parallel and content:
+        # BATCH 2 doesn't need BATCH 1's output - run both calls at once
+        print("⚡ [BATCH 1+2] Generating explanation + study materials in parallel...")
+        batch1_response, batch2_response = await asyncio.gather(
+            acall_ai_with_retry(batch1_prompt(topic), max_tokens=3000, task='explanation'),
+            acall_ai_with_retry(batch2_prompt(topic, content[:1000]), max_tokens=3500, task='materials'),
+        )
+        parse_batch1(batch1_response, results, include_story)
+        parse_batch2(batch2_response, results)
+        return await sync_to_async(finish_batch)(results, cache_key, include_story, content)
+    
+    if parallel:
+        batch2 = await _astream_batch1(topic, include_story, results)
+        parse_batch2(await batch2, results)
+        return await sync_to_async(finish_batch)(results, cache_key, include_story, content)
+    
+    print("📝 [BATCH 1/2] Generating explanation + story...")
+    batch1_response = await acall_ai_with_retry(batch1_prompt(topic), max_tokens=3000, task='explanation')
+    parse_batch1(batch1_response, results, include_story)
+    
+    await asyncio.sleep(deadline.budget(2))
+    
+    print("\n📚 [BATCH 2/2] Generating flashcards, MCQs, keywords...")
+    content_for_batch = content[:1000] if content else results['search'][:1000]
+    batch2_response = await acall_ai_with_retry(batch2_prompt(topic, content_for_batch), max_tokens=3500, task='materials')
+    parse_batch2(batch2_response, results)
+    
+    return await sync_to_async(finish_batch)(results, cache_key, include_story, content)
+
+
+async def _acomplete(topic, content, include_story, cache_key, results, missing):
+    """Async version of _complete"""
+    if not missing:
+        print(f"🧩 Assembled from cached artifacts: {topic}")
+        return await sync_to_async(finish_batch)(results, cache_key, include_story, content, ())
+    
+    print(f"🧩 Generating only the missing parts for {topic}: {', '.join(sorted(missing))}")
+    if missing.intersection(BATCH1_PARTS):
+        generated = _new_results(topic)
+        parse_batch1(await acall_ai_with_retry(batch1_prompt(topic), max_tokens=3000, task='explanation'), generated, include_story)
+        _merge_parts(results, generated, missing, BATCH1_PARTS)
+    
+    if missing.intersection(BATCH2_PARTS):
+        generated = _new_results(topic)
+        content_for_batch = content[:1000] if content else results['search'][:1000]
+        parse_batch2(await acall_ai_with_retry(batch2_prompt(topic, content_for_batch), max_tokens=3500, task='materials'), generated)
+        _merge_parts(results, generated, missing, BATCH2_PARTS)
+    
+    return await sync_to_async(finish_batch)(results, cache_key, include_story, content, missing)
+
+
+# ============================================
+# Parallel Batches
+# ============================================
+# BATCH 2 only needs ~1000 chars of context. With `content` it starts right
+# away; otherwise it starts once that much explanation has streamed in, so
+# total latency is roughly max(BATCH 1, BATCH 2) instead of their sum + 2s.
+
+_batch_pool = None
+_batch_pool_lock = threading.Lock()
+
+
+def _parallel_config():
+    return getattr(settings, 'AI_PARALLEL_BATCHES', {})
+
+
+def _batch_executor():
+    """Bounded pool shared by all requests for the BATCH 2 calls"""
+    global _batch_pool
+    if _batch_pool is None:
+        with _batch_pool_lock:
+            if _batch_pool is None:
+                _batch_pool = ThreadPoolExecutor(
+                    max_workers=_parallel_config().get('max_workers', 8),
+                    thread_name_prefix='ai-batch',
+                )
+    return _batch_pool
+
+
+def _start_batch2(topic, content_for_batch):
+    print(f"\n📚 [BATCH 2/2] Generating flashcards, MCQs, keywords...")
+    # The pool thread runs under the request's deadline too
+    return deadline.submit(
+        _batch_executor(), call_ai_with_retry, batch2_prompt(topic, content_for_batch[:1000]),
+        max_tokens=3500, task='materials',
+    )
+
+
+def _batch2_result(batch2):
+    """BATCH 2's reply - or the deadline error if the request's deadline passes first"""
+    left = deadline.remaining()
+    try:
+        # The call itself stops at the deadline; the second is slack for it to return
+        return batch2.result(timeout=None if left is None else left + 1)
+    except FutureTimeout:
+        print("⏱️ Request deadline reached - not waiting for BATCH 2")
+        return deadline.DEADLINE_ERROR
+
+
+def _stream_batch1(topic, content, include_story, results):
+    """
+    Streams BATCH 1 (yields (section, text)) while BATCH 2 runs on the pool.
+    Returns the BATCH 2 future (use with `yield from`).
+    """
+    parallel = _parallel_config().get('enabled', True)
+    threshold = _parallel_config().get('batch2_after_chars', 1000) if parallel else float('inf')
+    batch2 = _start_batch2(topic, content) if content and parallel else None
+    
+    print(f"📝 [BATCH 1/2] Streaming explanation + story: {topic}")
+    splitter = Batch1StreamSplitter()
+    explanation = ''
+    try:
+        for chunk in stream_ai_with_retry(batch1_prompt(topic), max_tokens=3000, task='explanation'):
+            for section, text in splitter.feed(chunk):
+                if section == 'explanation':
+                    explanation += text
+                if section == 'explanation' or include_story:
+                    yield section, text
+            # Enough explanation for BATCH 2's context (or the explanation is over)
+            if batch2 is None and (len(explanation) >= threshold or (parallel and splitter.emitted['story'])):
+                batch2 = _start_batch2(topic, explanation)
+        for section, text in splitter.feed('', final=True):
+            if section == 'explanation' or include_story:
+                yield section, text
+        parse_batch1(splitter.text, results, include_story)
+    except AIStreamError as e:
+        parse_batch1(str(e), results, include_story)
+    
+    if batch2 is None:
+        batch2 = _start_batch2(topic, content or results['search'])
+    return batch2
+
+
+def _astart_batch2(topic, content_for_batch):
+    print(f"\n📚 [BATCH 2/2] Generating flashcards, MCQs, keywords...")
+    # The task copies the current context, so the request's deadline applies
+    return asyncio.ensure_future(acall_ai_with_retry(
+        batch2_prompt(topic, content_for_batch[:1000]), max_tokens=3500, task='materials',
+    ))
+
+
+async def _astream_batch1(topic, include_story, results):
+    """
+    Async version of _stream_batch1 (no content): streams BATCH 1 into results
+    and starts BATCH 2 once batch2_after_chars of explanation are in.
+    Returns the BATCH 2 task.
+    """
+    threshold = _parallel_config().get('batch2_after_chars', 1000)
+    
+    print(f"📝 [BATCH 1/2] Streaming explanation + story: {topic}")
+    splitter = Batch1StreamSplitter()
+    explanation = ''
+    batch2 = None
+    try:
+        async for chunk in astream_ai_with_retry(batch1_prompt(topic), max_tokens=3000, task='explanation'):
+            for section, text in splitter.feed(chunk):
+                if section == 'explanation':
+                    explanation += text
+            if batch2 is None and (len(explanation) >= threshold or splitter.emitted['story']):
+                batch2 = _astart_batch2(topic, explanation)
+        parse_batch1(splitter.text, results, include_story)
+    except AIStreamError as e:
+        parse_batch1(str(e), results, include_story)
+    except BaseException:
+        if batch2 is not None:
+            batch2.cancel()
+        raise
+    
+    if batch2 is None:
+        batch2 = _astart_batch2(topic, results['search'])
+    return batch2
+
+
+def _generate_all_parallel(topic, content, include_story, cache_key):
+    results = _new_results(topic)
+    
+    if content:
+        batch2 = _start_batch2(topic, content)
+        print("📝 [BATCH 1/2] Generating explanation + story...")
+        batch1_response = call_ai_with_retry(batch1_prompt(topic), max_tokens=3000, task='explanation')
+        parse_batch1(batch1_response, results, include_story)
+    else:
+        stream = _stream_batch1(topic, content, include_story, results)
+        while True:
+            try:
+                next(stream)
+            except StopIteration as finished:
+                batch2 = finished.value
+                break
+    
+    parse_batch2(_batch2_result(batch2), results)
+    return finish_batch(results, cache_key, include_story, content)
+
+
+# ============================================
+# Streaming (Server-Sent Events)
+# ============================================
+
+class Batch1StreamSplitter:
+    """
+    Incrementally splits the streamed BATCH 1 reply into explanation / story text.
+    Text that could be the start of a marker is held back until the next chunk.
+    """
+
+    SECTIONS = [('explanation', '---EXPLANATION---', '---STORY---'), ('story', '---STORY---', '---END---')]
+
+    def __init__(self):
+        self.text = ''
+        self.emitted = {'explanation': 0, 'story': 0}
+
+    def feed(self, chunk, final=False):
+        """Add a chunk; returns [(section, new_text), ...] ready to send"""
+        self.text += chunk
+        ready = []
+        for section, start_marker, end_marker in self.SECTIONS:
+            start = self.text.find(start_marker)
+            if start == -1:
+                continue
+            start += len(start_marker)
+            end = self.text.find(end_marker, start)
+            if end == -1:
+                end = len(self.text) if final else max(start, len(self.text) - len(end_marker))
+            if self.emitted[section] == 0:
+                # Skip the whitespace right after the marker
+                while start < end and self.text[start].isspace():
+                    start += 1
+                if start == end:
+                    continue
+                self.emitted[section] = start
+            if end > self.emitted[section]:
+                ready.append((section, self.text[self.emitted[section]:end]))
+                self.emitted[section] = end
+        return ready
+
+
+def stream_all_content(topic, content=None, include_story=True, request_class=None):
+    """
+    Streaming version of generate_all_content (admission-controlled only when
+    a request_class is given - job workers stream without one).
+    Yields (event, payload) tuples:
+    - ('explanation', text) / ('story', text): BATCH 1 text as it arrives
+    - ('materials', {'flashcards', 'mcqs', 'keywords'}): BATCH 2 result
+    - ('done', results): final results (same shape as generate_all_content, cached)
+    """
+    content_hash = get_content_hash(content) if content else ""
+    cache_key = get_cache_key(topic, content_hash)
+    
+    cached = load_or_revalidate(cache_key, lambda: _refresh_all(topic, content, include_story, cache_key))
+    if cached:
+        print(f"✨ Using cached results for: {topic}\n")
+        yield 'done', cached
+        return
+    
+    failure = load_failure(cache_key)
+    if failure:
+        yield 'done', _failed_results(topic, failure)
+        return
+    
+    admission = admit(request_class)
+    if not admission:
+        yield 'done', _degraded_results(request_class, topic, content_hash, admission)
+        return
+    
+    results = _new_results(topic)
+    load_artifacts(topic, content, include_story, results)
+    missing = set(missing_parts(results, include_story))
+    if not (missing.intersection(BATCH1_PARTS) and missing.intersection(BATCH2_PARTS)):
+        # Cached artifacts go out right away; at most one batch fills in the rest
+        for part, event in (('search', 'explanation'), ('story', 'story')):
+            if results[part] and part not in missing:
+                yield event, results[part]
+        results = _complete(topic, content, include_story, cache_key, results, missing)
+        for part, event in (('search', 'explanation'), ('story', 'story')):
+            if results[part] and part in missing:
+                yield event, results[part]
+        yield 'materials', {part: results[part] for part in BATCH2_PARTS}
+        yield 'done', results
+        return
+    
+    results = _new_results(topic)
+    batch2 = yield from _stream_batch1(topic, content, include_story, results)
+    parse_batch2(_batch2_result(batch2), results)
+    yield 'materials', {
+        'flashcards': results['flashcards'],
+        'mcqs': results['mcqs'],
+        'keywords': results['keywords'],
     }
     
-    save_to_cache(cache_key, response, ttl_hours=72)
+    yield 'done', finish_batch(results, cache_key, include_story, content)
+
+
+def generate_search_only(topic):
+    """Quick search/explanation only (no story, flashcards, etc) - cached as its own artifact"""
+    print(f"\n🔍 Quick search: {topic}")
+    
+    cache_key = artifact_key('quick_explanation', topic)
+    cached = load_or_revalidate(cache_key, lambda: _generate_search_only(topic, cache_key))
+    if cached:
+        return {'topic': topic, 'search': cached}
+    
+    failure = load_failure(cache_key)
+    if failure:
+        return _failed_search(topic, failure)
+    
+    return _generate_search_only(topic, cache_key)
+
+
+def _failed_search(topic, failure=None):
+    response = {'topic': topic, 'search': "Failed to generate explanation"}
+    if failure:
+        response['retry_after'] = failure['retry_after']
     return response
+
+
+def search_only_prompt(topic):
+    return f"Explain '{topic}' in detail with key concepts, examples, and practical applications."
+
+
+def _generate_search_only(topic, cache_key):
+    result = call_ai_with_retry(search_only_prompt(topic), max_tokens=2000, task='explanation')
+    
+    if not result or result.startswith("Error"):
+        return _failed_search(topic, save_failure(cache_key, result))
+    
+    save_to_cache(cache_key, result, ttl_hours=72)
+    return {'topic': topic, 'search': result}
+
+
+async def agenerate_search_only(topic):
+    """Async version of generate_search_only"""
+    print(f"\n🔍 Quick search: {topic}")
+    
+    cache_key = artifact_key('quick_explanation', topic)
+    cached = await aload_or_revalidate(cache_key, lambda: _generate_search_only(topic, cache_key))
+    if cached:
+        return {'topic': topic, 'search': cached}
+    
+    failure = await aload_failure(cache_key)
+    if failure:
+        return _failed_search(topic, failure)
+    
+    result = await acall_ai_with_retry(search_only_prompt(topic), max_tokens=2000, task='explanation')
+    
+    if not result or result.startswith("Error"):
+        return _failed_search(topic, await asave_failure(cache_key, result))
+    
+    await asave_to_cache(cache_key, result, ttl_hours=72)
+    return {'topic': topic, 'search': result}
@@ -0,0 +1,346 @@
+"""
+Bulkheads - concurrency limits per endpoint class
+A slow /ai/search-all/ holds its worker thread for the whole LLM call; with
+enough of them every thread is busy and /auth/check-auth/ or /history/get/
+wait behind AI work. BulkheadMiddleware gives each endpoint class
+(settings.AI_BULKHEADS['routes']) its own pool:
+
+- max_concurrent requests run at once
+- up to max_queue more wait, at most queue_timeout seconds
+- anything beyond that gets an immediate 503 + Retry-After
+
+so AI traffic can never take more than (max_concurrent + max_queue) threads
+of any class, and DB-only endpoints always find a free one.
+
+Async views (AI_ASYNC_VIEWS under ASGI) hold no thread while the LLM answers,
+so they are limited by AI_BULKHEADS['async_pools'] instead - separate, much
+larger pools (a pool missing there is unlimited for async views).
+
+Slots are host-wide by default: one flock()ed file per slot under
+ai_cache/meta/bulkheads/, shared by every gunicorn worker on the machine and
+released by the kernel if a worker dies. Without fcntl (Windows) they fall
+back to per-process semaphores. The files are a fixed set per pool
+(<pool>.<i>.lock, <pool>.queue.<i>.lock); slots left over from a larger
+configuration are deleted once nobody holds them.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+DEFAULT_DIR = Path(__file__).parent / 'ai_cache' / 'meta' / 'bulkheads'
+
+
+def _config():
+    return getattr(settings, 'AI_BULKHEADS', {})
+
+
+# ============================================
+# Slots
+# ============================================
+
+class ProcessSlots:
+    """`size` slots shared by the threads of this process"""
+
+    def __init__(self, name, size):
+        self._semaphore = threading.BoundedSemaphore(size)
+
+    def try_take(self):
+        return True if self._semaphore.acquire(blocking=False) else None
+
+    def give(self, token):
+        self._semaphore.release()
+
+
+class HostSlots:
+    """`size` slots shared by every process on the host - one flock()ed file each"""
+
+    def __init__(self, name, size, directory=DEFAULT_DIR):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        self.paths = [str(directory / f"{name}.{i}.lock") for i in range(size)]
+        self._remove_extra(directory, name, size)
+
+    @staticmethod
+    def _remove_extra(directory, name, size):
+        """Delete slot files beyond `size` (pool shrunk) that no process holds"""
+        for path in directory.glob(f"{name}.*.lock"):
+            index = path.name[len(name) + 1:-len('.lock')]
+            if not index.isdigit() or int(index) < size:
+                continue
+            try:
+                fd = os.open(path, os.O_RDWR)
+            except OSError:
+                continue
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                os.unlink(path)
+            except OSError:
+                pass  # still held by a worker running the old configuration
+            finally:
+                os.close(fd)
+
+    def try_take(self):
+        """Open file descriptor holding a slot, or None when all are taken"""
+        start = random.randrange(len(self.paths))  # spread processes over the slots
+        for offset in range(len(self.paths)):
+            fd = os.open(self.paths[(start + offset) % len(self.paths)], os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except OSError:
+                os.close(fd)
+        return None
+
+    def give(self, token):
+        try:
+            fcntl.flock(token, fcntl.LOCK_UN)
+        finally:
+            os.close(token)
+
+
+# ============================================
+# Bulkhead
+# ============================================
+
+class Bulkhead:
+    """Running slots + a bounded wait queue for one endpoint class"""
+
+    def __init__(self, name, max_concurrent, max_queue=0, queue_timeout=1.0, slots=ProcessSlots):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.running = slots(name, max_concurrent)
+        self.waiting = slots(f"{name}.queue", max_queue) if max_queue else None
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def _enter_queue(self):
+        """Queue ticket, or None when the queue is full too"""
+        ticket = self.waiting.try_take() if self.waiting else None
+        if ticket is None:
+            self._count('rejected_full')
+        else:
+            self._count('queued')
+        return ticket
+
+    def acquire(self):
+        """Slot token, or None when saturated (queue full / waited queue_timeout)"""
+        token = self.running.try_take()
+        if token is not None:
+            self._count('admitted')
+            return token
+        ticket = self._enter_queue()
+        if ticket is None:
+            return None
+        try:
+            deadline = time.monotonic() + self.queue_timeout
+            delay = 0.005
+            while time.monotonic() < deadline:
+                time.sleep(delay)
+                delay = min(delay * 2, 0.05)
+                token = self.running.try_take()
+                if token is not None:
+                    self._count('admitted')
+                    return token
+            self._count('rejected_timeout')
+            return None
+        finally:
+            self.waiting.give(ticket)
+
+    async def aacquire(self):
+        """acquire() for async requests - waits in the queue with asyncio.sleep"""
+        token = self.running.try_take()
+        if token is not None:
+            self._count('admitted')
+            return token
+        ticket = self._enter_queue()
+        if ticket is None:
+            return None
+        try:
+            deadline = time.monotonic() + self.queue_timeout
+            delay = 0.005
+            while time.monotonic() < deadline:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.05)
+                token = self.running.try_take()
+                if token is not None:
+                    self._count('admitted')
+                    return token
+            self._count('rejected_timeout')
+            return None
+        finally:
+            self.waiting.give(ticket)
+
+    def release(self, token):
+        self.running.give(token)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts, max_concurrent=self.max_concurrent, max_queue=self.max_queue)
+
+
+_bulkheads = {}
+_bulkheads_lock = threading.Lock()
+
+
+def get_bulkhead(name, async_view=False):
+    """Process-wide Bulkhead for a pool in AI_BULKHEADS['pools'] (['async_pools'] for async views; None = unlimited)"""
+    pool = _config().get('async_pools' if async_view else 'pools', {}).get(name) or {}
+    if not pool.get('max_concurrent'):
+        return None
+    if async_view:
+        name = f"{name}.async"  # slots of its own
+    host = _config().get('scope', 'host') == 'host' and fcntl is not None
+    # Keyed on the settings too, so changed limits get a fresh pool
+    key = (name, pool['max_concurrent'], pool.get('max_queue', 0), pool.get('queue_timeout', 1.0), host)
+    bulkhead = _bulkheads.get(key)
+    if bulkhead is None:
+        with _bulkheads_lock:
+            bulkhead = _bulkheads.get(key)
+            if bulkhead is None:
+                directory = _config().get('path') or DEFAULT_DIR
+                slots = (lambda n, size: HostSlots(n, size, directory)) if host else ProcessSlots
+                bulkhead = Bulkhead(name, pool['max_concurrent'], pool.get('max_queue', 0),
+                                    pool.get('queue_timeout', 1.0), slots)
+                _bulkheads[key] = bulkhead
+    return bulkhead
+
+
+def pool_for(path):
+    """Endpoint class of a request path (first matching prefix in AI_BULKHEADS['routes'])"""
+    for prefix, pool in _config().get('routes', ()):
+        if path.startswith(prefix):
+            return pool
+    return None
+
+
+def is_async_view(request):
+    """Whether the request is routed to an async view"""
+    try:
+        match = resolve(request.path_info, getattr(request, 'urlconf', None))
+    except Resolver404:
+        return False
+    return iscoroutinefunction(match.func)
+
+
+def stats():
+    """Counters of every pool used by this process"""
+    return {bulkhead.name: bulkhead.stats() for bulkhead in list(_bulkheads.values())}
+
+
+# ============================================
+# Middleware
+# ============================================
+
+def busy_response(bulkhead):
+    response = JsonResponse({
+        'error': 'Server busy - please try again shortly',
+        'pool': bulkhead.name,
+        'retry_after': _config().get('retry_after', 2),
+    }, status=503)
+    response['Retry-After'] = str(_config().get('retry_after', 2))
+    return response
+
+
+def _release_after(content, release):
+    try:
+        yield from content
+    finally:
+        release()
+
+
+async def _arelease_after(content, release):
+    try:
+        async for chunk in content:
+            yield chunk
+    finally:
+        release()
+
+
+def _hold_until_sent(response, bulkhead, token):
+    """Release the slot now - or, for a stream, once the last chunk has been sent"""
+    if not response.streaming:
+        bulkhead.release(token)
+        return response
+    released = []
+
+    def release():
+        if not released:
+            released.append(True)
+            bulkhead.release(token)
+
+    wrap = _arelease_after if response.is_async else _release_after
+    response.streaming_content = wrap(response.streaming_content, release)
+    return response
+
+
+class BulkheadMiddleware:
+    """Runs each request inside its endpoint class's bulkhead (see module docstring)"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def _bulkhead(self, request, async_view=False):
+        if not _config().get('enabled', True):
+            return None
+        pool = pool_for(request.path)
+        return get_bulkhead(pool, async_view) if pool else None
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        bulkhead = self._bulkhead(request)
+        if bulkhead is None:
+            return self.get_response(request)
+        token = bulkhead.acquire()
+        if token is None:
+            print(f"🚧 Bulkhead '{bulkhead.name}' full - rejected {request.path}")
+            return busy_response(bulkhead)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            bulkhead.release(token)
+            raise
+        return _hold_until_sent(response, bulkhead, token)
+
+    async def __acall__(self, request):
+        # Sync views still hold a thread under ASGI - only async ones get the async pools
+        bulkhead = self._bulkhead(request, async_view=is_async_view(request))
+        if bulkhead is None:
+            return await self.get_response(request)
+        token = await bulkhead.aacquire()
+        if token is None:
+            print(f"🚧 Bulkhead '{bulkhead.name}' full - rejected {request.path}")
+            return busy_response(bulkhead)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            bulkhead.release(token)
+            raise
+        return _hold_until_sent(response, bulkhead, token)
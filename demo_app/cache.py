@@ -1,86 +1,778 @@
 """
 Cache system for AI responses
 Stores responses to avoid redundant API calls
+
+Backends (settings.AI_CACHE['backend']):
+- 'sqlite' (default): one WAL-mode SQLite file, zlib-compressed JSON payloads,
+  atomic upserts, an expiry index for purging and O(1) stats via triggers
+- 'file': the original one-JSON-file-per-key store
+- 'django': Django's cache framework (caches[AI_CACHE['django_alias']]) - with
+  the database cache every gunicorn worker and Render instance shares one cache
+Any of them can sit behind an in-process LRU tier bounded in bytes
+(AI_CACHE['memory_max_bytes']) so hot topics skip disk and JSON decoding.
+
+Every entry has a soft TTL (fresh_until) and a hard TTL (expires_at).
+load_from_cache only returns fresh entries; load_or_revalidate also serves
+stale ones (between the two) and refreshes them in the background.
+
+Failures are cached too (save_failure / load_failure), for a short TTL that
+depends on the error class, so a failing topic doesn't call the AI on every click.
 """
 
 import os
 import json
 import hashlib
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime, timedelta
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .cache_metrics import get_metrics
+from .topic_index import normalize_topic, get_topic_index, fuzzy_keys
+
 CACHE_DIR = Path(__file__).parent / 'ai_cache'
 CACHE_DIR.mkdir(exist_ok=True)
 
 def get_cache_key(topic, content_hash=None):
     """Generate cache key from topic"""
-    # Use topic as primary cache key
-    clean_topic = topic.lower().strip()
+    # Use the normalized topic as primary cache key (a known near-duplicate only with AI_TOPIC_INDEX['fuzzy'])
+    clean_topic = normalize_topic(topic) or topic.lower().strip()
+    topic_index = get_topic_index()
+    if topic_index is not None and clean_topic and fuzzy_keys():
+        clean_topic = topic_index.canonical(content_hash or '', clean_topic)
     # Add hash if content provided
     if content_hash:
         return f"{clean_topic}_{content_hash}"
     return clean_topic
 
+def remember_topic(topic, content_hash=None):
+    """Register a topic whose result was just cached (near-duplicate lookups only see these)"""
+    clean_topic = normalize_topic(topic) or topic.lower().strip()
+    topic_index = get_topic_index()
+    if topic_index is not None and clean_topic:
+        topic_index.register(content_hash or '', clean_topic)
+
 def get_content_hash(content):
     """Get MD5 hash of content"""
     return hashlib.md5(content.encode()).hexdigest()[:8]
 
-def get_cache_file(cache_key):
-    """Get cache file path"""
-    return CACHE_DIR / f"{cache_key}.json"
-
-def save_to_cache(cache_key, data, ttl_hours=24):
-    """Save data to cache with TTL"""
-    cache_file = get_cache_file(cache_key)
-    
-    cache_data = {
-        'timestamp': datetime.now().isoformat(),
-        'ttl_hours': ttl_hours,
-        'data': data
-    }
-    
-    try:
-        with open(cache_file, 'w') as f:
+
+# ============================================
+# File store (original layout: ai_cache/<key>.json)
+# ============================================
+class FileCacheStore:
+    """One pretty-printed JSON file per key; expiry is checked on read"""
+
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _file(self, cache_key):
+        return self.directory / f"{cache_key}.json"
+
+    def set(self, cache_key, data, ttl_seconds, stale_seconds=0):
+        cache_data = {
+            'timestamp': datetime.now().isoformat(),
+            'ttl_hours': ttl_seconds / 3600,
+            'stale_hours': stale_seconds / 3600,
+            'data': data
+        }
+        with open(self._file(cache_key), 'w') as f:
             json.dump(cache_data, f, indent=2)
+
+    def get_entry(self, cache_key):
+        """(data, created_at, fresh_until, expires_at) or None - expiry is NOT checked"""
+        cache_file = self._file(cache_key)
+        if not cache_file.exists():
+            return None
+        with open(cache_file, 'r') as f:
+            cache_data = json.load(f)
+        timestamp = datetime.fromisoformat(cache_data['timestamp'])
+        fresh_until = timestamp + timedelta(hours=cache_data.get('ttl_hours', 24))
+        expiry = fresh_until + timedelta(hours=cache_data.get('stale_hours', 0))
+        return cache_data['data'], timestamp.timestamp(), fresh_until.timestamp(), expiry.timestamp()
+
+    def get(self, cache_key):
+        """data, or None if missing/not fresh (files past the hard TTL are deleted)"""
+        entry = self.get_entry(cache_key)
+        if entry is None:
+            return None
+        if time.time() < entry[2]:
+            return entry[0]
+        print(f"⏰ Cache expired: {cache_key}")
+        if time.time() >= entry[3]:
+            self.delete(cache_key)
+        return None
+
+    def delete(self, cache_key):
+        self._file(cache_key).unlink(missing_ok=True)
+
+    def clear(self):
+        for cache_file in self.directory.glob('*.json'):
+            cache_file.unlink()
+
+    def stats(self):
+        cache_files = list(self.directory.glob('*.json'))
+        return {
+            'backend': 'file',
+            'count': len(cache_files),
+            'bytes': sum(f.stat().st_size for f in cache_files),
+        }
+
+
+# ============================================
+# SQLite store (WAL, compressed, indexed expiry)
+# ============================================
+class SQLiteCacheStore:
+    """
+    Single-file cache shared safely by every thread and worker process on the host.
+    Rows: key -> zlib(JSON), created_at, fresh_until, expires_at (indexed), size.
+    A one-row `cache_stats` table kept up to date by triggers makes stats() O(1).
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS cache_entries (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        created_at REAL NOT NULL,
+        fresh_until REAL NOT NULL,
+        expires_at REAL NOT NULL,
+        size INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS cache_entries_expires ON cache_entries (expires_at);
+
+    CREATE TABLE IF NOT EXISTS cache_stats (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        entries INTEGER NOT NULL,
+        bytes INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO cache_stats (id, entries, bytes) VALUES (1, 0, 0);
+
+    CREATE TRIGGER IF NOT EXISTS cache_entries_ins AFTER INSERT ON cache_entries BEGIN
+        UPDATE cache_stats SET entries = entries + 1, bytes = bytes + NEW.size WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS cache_entries_del AFTER DELETE ON cache_entries BEGIN
+        UPDATE cache_stats SET entries = entries - 1, bytes = bytes - OLD.size WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS cache_entries_upd AFTER UPDATE OF size ON cache_entries BEGIN
+        UPDATE cache_stats SET bytes = bytes + NEW.size - OLD.size WHERE id = 1;
+    END;
+    """
+
+    def __init__(self, path, compress_level=6, purge_every=500):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.compress_level = compress_level
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(cache_entries)')}
+        if 'fresh_until' not in columns:
+            # Store created before soft TTLs existed: every entry is fresh until its expiry
+            conn.execute('ALTER TABLE cache_entries ADD COLUMN fresh_until REAL NOT NULL DEFAULT 0')
+            conn.execute('UPDATE cache_entries SET fresh_until = expires_at')
+
+    def _conn(self):
+        """One connection per thread (sqlite3 connections aren't thread-safe)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def encode(self, data):
+        return zlib.compress(json.dumps(data, separators=(',', ':')).encode(), self.compress_level)
+
+    def decode(self, value):
+        return json.loads(zlib.decompress(value))
+
+    def set(self, cache_key, data, ttl_seconds, stale_seconds=0):
+        value = self.encode(data)
+        now = time.time()
+        self._conn().execute(
+            """
+            INSERT INTO cache_entries (key, value, created_at, fresh_until, expires_at, size)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                value = excluded.value, created_at = excluded.created_at,
+                fresh_until = excluded.fresh_until, expires_at = excluded.expires_at,
+                size = excluded.size
+            """,
+            (cache_key, value, now, now + ttl_seconds, now + ttl_seconds + stale_seconds, len(value)),
+        )
+        with self._writes_lock:
+            self._writes += 1
+            purge = self.purge_every and self._writes % self.purge_every == 0
+        if purge:
+            self.purge_expired()
+
+    def get_entry(self, cache_key):
+        """(data, created_at, fresh_until, expires_at) or None - expiry is NOT checked"""
+        row = self._conn().execute(
+            'SELECT value, created_at, fresh_until, expires_at FROM cache_entries WHERE key = ?', (cache_key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return self.decode(row[0]), row[1], row[2], row[3]
+
+    def get(self, cache_key):
+        """data, or None if missing/not fresh (expired rows are left for purge_expired)"""
+        entry = self.get_entry(cache_key)
+        if entry is None:
+            return None
+        if entry[2] <= time.time():
+            print(f"⏰ Cache expired: {cache_key}")
+            return None
+        return entry[0]
+
+    def delete(self, cache_key):
+        self._conn().execute('DELETE FROM cache_entries WHERE key = ?', (cache_key,))
+
+    def purge_expired(self):
+        """Delete expired rows (uses the expires_at index); returns how many"""
+        deleted = self._conn().execute(
+            'DELETE FROM cache_entries WHERE expires_at <= ?', (time.time(),)
+        ).rowcount
+        if deleted:
+            get_metrics().purged(deleted)
+            print(f"🧹 Purged {deleted} expired cache entries")
+        return deleted
+
+    def clear(self):
+        self._conn().execute('DELETE FROM cache_entries')
+
+    def stats(self):
+        entries, total_bytes = self._conn().execute(
+            'SELECT entries, bytes FROM cache_stats WHERE id = 1'
+        ).fetchone()
+        return {'backend': 'sqlite', 'count': entries, 'bytes': total_bytes}
+
+
+# ============================================
+# Django cache-framework store (shared across workers/nodes)
+# ============================================
+class DjangoCacheStore:
+    """
+    Stores entries through django.core.cache.caches[alias] (database, file-based
+    or locmem backends). Keys are hashed so any topic is a valid key for every
+    backend (length/charset limits), and every node computes the same key.
+    """
+
+    KEY_PREFIX = 'ai_cache'
+    KEY_VERSION = 1
+
+    def __init__(self, alias='default'):
+        from django.core.cache import caches
+        self.alias = alias
+        self.cache = caches[alias]
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def make_key(self, cache_key):
+        digest = hashlib.sha256(cache_key.encode()).hexdigest()[:40]
+        return f"{self.KEY_PREFIX}:v{self.KEY_VERSION}:{digest}"
+
+    def set(self, cache_key, data, ttl_seconds, stale_seconds=0):
+        now = time.time()
+        entry = {
+            'key': cache_key, 'data': data, 'created_at': now,
+            'fresh_until': now + ttl_seconds, 'expires_at': now + ttl_seconds + stale_seconds,
+        }
+        self.cache.set(self.make_key(cache_key), entry, timeout=max(int(ttl_seconds + stale_seconds), 1))
+        with self._lock:
+            self._writes += 1
+
+    def get_entry(self, cache_key):
+        """(data, created_at, fresh_until, expires_at) or None - expiry is NOT checked"""
+        entry = self.cache.get(self.make_key(cache_key))
+        if entry is None or entry.get('key') != cache_key:
+            return None
+        fresh_until = entry.get('fresh_until', entry['expires_at'])
+        return entry['data'], entry['created_at'], fresh_until, entry['expires_at']
+
+    def get(self, cache_key):
+        entry = self.get_entry(cache_key)
+        if entry is None:
+            return None
+        if entry[2] <= time.time():
+            print(f"⏰ Cache expired: {cache_key}")
+            return None
+        return entry[0]
+
+    def delete(self, cache_key):
+        self.cache.delete(self.make_key(cache_key))
+
+    def clear(self):
+        """Clears the whole Django cache alias - give the AI cache its own alias"""
+        self.cache.clear()
+
+    def stats(self):
+        """Entry count where the backend can report it cheaply (None otherwise)"""
+        from django.core.cache.backends.db import DatabaseCache
+        from django.core.cache.backends.filebased import FileBasedCache
+        from django.core.cache.backends.locmem import LocMemCache
+        from django.db import connections, router
+
+        count, total_bytes = None, 0
+        if isinstance(self.cache, DatabaseCache):
+            db = router.db_for_read(self.cache.cache_model_class)
+            table = connections[db].ops.quote_name(self.cache._table)
+            with connections[db].cursor() as cursor:
+                cursor.execute(f"SELECT COUNT(*) FROM {table}")
+                count = cursor.fetchone()[0]
+        elif isinstance(self.cache, FileBasedCache):
+            files = self.cache._list_cache_files()
+            count = len(files)
+            total_bytes = sum(os.path.getsize(f) for f in files if os.path.exists(f))
+        elif isinstance(self.cache, LocMemCache):
+            count = len(self.cache._cache)
+        return {'backend': f"django:{self.alias}", 'count': count, 'bytes': total_bytes}
+
+
+# ============================================
+# In-process LRU tier
+# ============================================
+class MemoryLRU:
+    """
+    LRU of decoded entries bounded by total (JSON) size in bytes.
+    Values are shared, not copied - callers must treat cached data as read-only.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (data, created_at, fresh_until, expires_at, size)
+        self.bytes = 0
+
+    def get_entry(self, cache_key):
+        """(data, created_at, fresh_until, expires_at) or None (expired entries are dropped)"""
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return None
+            if entry[3] <= time.time():
+                self._remove(cache_key)
+                return None
+            self._entries.move_to_end(cache_key)
+            return entry[:4]
+
+    def set(self, cache_key, data, created_at, fresh_until, expires_at, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(cache_key)
+            self._entries[cache_key] = (data, created_at, fresh_until, expires_at, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                get_metrics().evicted()
+
+    def _remove(self, cache_key):
+        entry = self._entries.pop(cache_key, None)
+        if entry is not None:
+            self.bytes -= entry[4]
+
+    def delete(self, cache_key):
+        with self._lock:
+            self._remove(cache_key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TieredCacheStore:
+    """
+    Memory LRU in front of a persistent store.
+    memory_ttl_seconds caps how long a worker trusts its own copy, so entries
+    rewritten/deleted by other workers are picked up within that window.
+    """
+
+    def __init__(self, store, max_bytes, memory_ttl_seconds=300):
+        self.store = store
+        self.memory = MemoryLRU(max_bytes)
+        self.memory_ttl_seconds = memory_ttl_seconds
+        self._lock = threading.Lock()
+        self.counts = {'memory_hits': 0, 'store_hits': 0, 'misses': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def _remember(self, cache_key, data, created_at, fresh_until, expires_at, size=None):
+        if size is None:
+            size = len(json.dumps(data, separators=(',', ':')))
+        memory_expiry = min(expires_at, time.time() + self.memory_ttl_seconds)
+        self.memory.set(cache_key, data, created_at, fresh_until, memory_expiry, size)
+
+    def get_entry(self, cache_key):
+        now = time.time()
+        cached = self.memory.get_entry(cache_key)
+        if cached is not None and cached[2] > now:
+            self._count('memory_hits')
+            return cached
+        # Missing or stale in memory - another worker may have stored a fresher copy
+        entry = self.store.get_entry(cache_key)
+        if entry is not None and entry[3] > now and (cached is None or entry[2] > cached[2]):
+            self._count('store_hits')
+            self._remember(cache_key, *entry)
+            return entry
+        if cached is not None:
+            self._count('memory_hits')
+            return cached
+        self._count('misses')
+        return entry
+
+    def get(self, cache_key):
+        entry = self.get_entry(cache_key)
+        if entry is None:
+            return None
+        if entry[2] <= time.time():
+            print(f"⏰ Cache expired: {cache_key}")
+            return None
+        return entry[0]
+
+    def set(self, cache_key, data, ttl_seconds, stale_seconds=0):
+        self.store.set(cache_key, data, ttl_seconds, stale_seconds)
+        now = time.time()
+        self._remember(cache_key, data, now, now + ttl_seconds, now + ttl_seconds + stale_seconds)
+
+    def delete(self, cache_key):
+        self.memory.delete(cache_key)
+        self.store.delete(cache_key)
+
+    def clear(self):
+        self.memory.clear()
+        self.store.clear()
+
+    def tier_stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+        lookups = sum(counts.values())
+        ratio = lambda n: round(n / lookups, 3) if lookups else 0.0
+        return {
+            'lookups': lookups,
+            'memory': {'hits': counts['memory_hits'], 'hit_ratio': ratio(counts['memory_hits']),
+                       'entries': len(self.memory), 'bytes': self.memory.bytes,
+                       'max_bytes': self.memory.max_bytes},
+            'store': {'hits': counts['store_hits'], 'hit_ratio': ratio(counts['store_hits'])},
+            'misses': counts['misses'],
+            'overall_hit_ratio': ratio(counts['memory_hits'] + counts['store_hits']),
+        }
+
+    def stats(self):
+        return dict(self.store.stats(), tiers=self.tier_stats())
+
+
+# ============================================
+# Store selection
+# ============================================
+_store = None
+_store_lock = threading.Lock()
+
+def _build_store():
+    config = getattr(settings, 'AI_CACHE', {})
+    backend = config.get('backend', 'sqlite')
+    if backend == 'file':
+        store = FileCacheStore(config.get('path') or CACHE_DIR)
+    elif backend == 'sqlite':
+        store = SQLiteCacheStore(
+            config.get('path') or CACHE_DIR / 'ai_cache.sqlite3',
+            compress_level=config.get('compress_level', 6),
+        )
+    elif backend == 'django':
+        store = DjangoCacheStore(config.get('django_alias', 'default'))
+    else:
+        raise ValueError(f"Unknown AI_CACHE backend: {backend}")
+
+    max_bytes = config.get('memory_max_bytes', 0)
+    if max_bytes:
+        return TieredCacheStore(store, max_bytes, config.get('memory_ttl_seconds', 300))
+    return store
+
+def get_store():
+    """Process-wide cache store configured by settings.AI_CACHE"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = _build_store()
+    return _store
+
+
+# ============================================
+# Public API
+# ============================================
+def save_to_cache(cache_key, data, ttl_hours=24, stale_hours=None):
+    """
+    Save data to cache with TTL.
+    Fresh for ttl_hours, then servable as stale (see load_or_revalidate) for
+    stale_hours more (default AI_CACHE['stale_hours']).
+    """
+    if stale_hours is None:
+        stale_hours = getattr(settings, 'AI_CACHE', {}).get('stale_hours', 0)
+    try:
+        start = time.perf_counter()
+        get_store().set(cache_key, data, ttl_hours * 3600, stale_hours * 3600)
+        size = len(json.dumps(data, separators=(',', ':')))
+        get_metrics().stored(cache_key, size, (time.perf_counter() - start) * 1000)
         print(f"💾 Cached: {cache_key}")
         return True
     except Exception as e:
         print(f"❌ Cache save error: {e}")
         return False
 
+def _lookup(cache_key, serve_stale=False):
+    """(entry, outcome) with the lookup recorded in the cache metrics"""
+    start = time.perf_counter()
+    try:
+        entry = get_store().get_entry(cache_key)
+    except Exception as e:
+        print(f"❌ Cache load error: {e}")
+        entry = None
+    now = time.time()
+    if entry is None:
+        outcome = 'miss'
+    elif now < entry[2]:
+        outcome = 'hit'
+    elif now < entry[3] and serve_stale:
+        outcome = 'stale'
+    else:
+        outcome = 'expired'
+    get_metrics().lookup(cache_key, outcome, (time.perf_counter() - start) * 1000,
+                         entry[0] if outcome in ('hit', 'stale') else None)
+    return entry, outcome
+
 def load_from_cache(cache_key):
-    """Load data from cache if valid"""
-    cache_file = get_cache_file(cache_key)
-    
-    if not cache_file.exists():
+    """Load data from cache if fresh"""
+    entry, outcome = _lookup(cache_key)
+    if outcome == 'hit':
+        print(f"✅ Cache hit: {cache_key}")
+        return entry[0]
+    if entry is not None:
+        print(f"⏰ Cache expired: {cache_key}")
+    return None
+
+# ============================================
+# Stale-While-Revalidate
+# ============================================
+_refresh_pool = None
+_refreshing = set()
+_refresh_lock = threading.Lock()
+
+def _refresh_executor():
+    global _refresh_pool
+    with _refresh_lock:
+        if _refresh_pool is None:
+            _refresh_pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'AI_CACHE', {}).get('refresh_workers', 2),
+                thread_name_prefix='ai-cache-refresh',
+            )
+        return _refresh_pool
+
+def schedule_refresh(cache_key, refresh):
+    """Run refresh() in the background unless a refresh for cache_key is already pending"""
+    with _refresh_lock:
+        if cache_key in _refreshing:
+            return False
+        _refreshing.add(cache_key)
+
+    def run():
+        from django.db import connections
+        try:
+            print(f"🔄 Background refresh: {cache_key}")
+            refresh()
+        except Exception as e:
+            print(f"⚠️ Background refresh failed for {cache_key}: {str(e)[:100]}")
+        finally:
+            with _refresh_lock:
+                _refreshing.discard(cache_key)
+            connections.close_all()
+
+    _refresh_executor().submit(run)
+    return True
+
+def load_or_revalidate(cache_key, refresh):
+    """
+    Stale-while-revalidate lookup:
+    - fresh entry: returned
+    - stale (past the soft TTL, before the hard TTL): returned right away and
+      refresh() is scheduled in the background (once per key)
+    - missing / past the hard TTL: None - the caller generates
+    """
+    entry, outcome = _lookup(cache_key, serve_stale=True)
+    if outcome == 'hit':
+        print(f"✅ Cache hit: {cache_key}")
+        return entry[0]
+    if outcome == 'stale':
+        print(f"♻️ Serving stale: {cache_key} (refreshing in background)")
+        schedule_refresh(cache_key, refresh)
+        return entry[0]
+    if outcome == 'expired':
+        print(f"⏰ Cache expired: {cache_key}")
+    return None
+
+async def aload_or_revalidate(cache_key, refresh):
+    """load_or_revalidate for async callers (refresh still runs in a background thread)"""
+    return await sync_to_async(load_or_revalidate)(cache_key, refresh)
+
+async def aload_from_cache(cache_key):
+    """load_from_cache for async callers (the django/DB backend can't run on the event loop)"""
+    return await sync_to_async(load_from_cache)(cache_key)
+
+async def asave_to_cache(cache_key, data, ttl_hours=24):
+    """save_to_cache for async callers"""
+    return await sync_to_async(save_to_cache)(cache_key, data, ttl_hours)
+
+# ============================================
+# Negative cache (remembered failures)
+# ============================================
+# TTLs in seconds per error class; overridden by AI_NEGATIVE_CACHE['ttl_seconds']
+FAILURE_TTLS = {
+    'rate_limit': 30,   # keys are busy - capped by the "Retry in Ns" hint when there is one
+    'timeout': 60,
+    'error': 120,
+    'config': 60,       # no keys / no model configured
+    'auth': 300,        # every key rejected
+    'empty': 300,
+    'parse': 900,       # the model keeps answering this topic in an unusable format
+    'deadline': 0,      # the request ran out of time (see deadline.py) - says nothing about the topic
+}
+
+def classify_failure(error):
+    """Error class of an 'Error: ...' string or failure message"""
+    text = str(error or '').lower()
+    if 'rate limit' in text or '429' in text or 'quota' in text:
+        return 'rate_limit'
+    if 'invalid api key' in text or 'no valid api keys' in text or '401' in text:
+        return 'auth'
+    if 'no api keys configured' in text or 'no ai model' in text:
+        return 'config'
+    if 'request deadline' in text:
+        return 'deadline'
+    if 'timeout' in text or 'timed out' in text or 'deadline' in text:
+        return 'timeout'
+    if 'parse' in text or 'json' in text:
+        return 'parse'
+    if not text or 'empty response' in text or text.endswith(': none'):
+        return 'empty'
+    return 'error'
+
+def failure_ttl(error_class, error=''):
+    """Seconds to remember a failure of this class (0 = don't)"""
+    config = getattr(settings, 'AI_NEGATIVE_CACHE', {})
+    if not config.get('enabled', True):
+        return 0
+    ttl = config.get('ttl_seconds', {}).get(error_class, FAILURE_TTLS.get(error_class, FAILURE_TTLS['error']))
+    retry_in = re.search(r'retry in (\d+)s', str(error).lower())
+    if error_class == 'rate_limit' and retry_in:
+        ttl = min(ttl, int(retry_in.group(1)))
+    return ttl
+
+def _failure_key(cache_key):
+    return f"{cache_key}__failed"
+
+def save_failure(cache_key, error, error_class=None):
+    """Remember that generating cache_key failed; returns the failure record (None if not cached)"""
+    error_class = error_class or classify_failure(error)
+    ttl = failure_ttl(error_class, error)
+    if ttl <= 0:
         return None
-    
+    failure = {
+        'error': str(error)[:300],
+        'error_class': error_class,
+        'failed_at': time.time(),
+        'retry_at': time.time() + ttl,
+    }
     try:
-        with open(cache_file, 'r') as f:
-            cache_data = json.load(f)
-        
-        # Check TTL
-        timestamp = datetime.fromisoformat(cache_data['timestamp'])
-        ttl_hours = cache_data.get('ttl_hours', 24)
-        expiry = timestamp + timedelta(hours=ttl_hours)
-        
-        if datetime.now() < expiry:
-            print(f"✅ Cache hit: {cache_key}")
-            return cache_data['data']
-        else:
-            print(f"⏰ Cache expired: {cache_key}")
-            cache_file.unlink()
-            return None
-            
+        get_store().set(_failure_key(cache_key), failure, ttl, 0)
+    except Exception as e:
+        print(f"❌ Cache save error: {e}")
+        return None
+    print(f"🚫 Remembering failure for {ttl}s ({error_class}): {cache_key}")
+    return dict(failure, retry_after=ttl)
+
+def load_failure(cache_key):
+    """Recent failure record for cache_key (with 'retry_after' seconds), or None"""
+    try:
+        failure = get_store().get(_failure_key(cache_key))
     except Exception as e:
         print(f"❌ Cache load error: {e}")
         return None
+    if failure is None:
+        return None
+    get_metrics().negative_hit(cache_key)
+    retry_after = max(1, int(failure['retry_at'] - time.time()))
+    print(f"🚫 Recent {failure['error_class']} failure cached for {cache_key} (retry in {retry_after}s)")
+    return dict(failure, retry_after=retry_after)
+
+async def aload_failure(cache_key):
+    return await sync_to_async(load_failure)(cache_key)
+
+async def asave_failure(cache_key, error, error_class=None):
+    return await sync_to_async(save_failure)(cache_key, error, error_class)
+
+# ============================================
+# Per-artifact entries
+# ============================================
+# Every artifact is also cached on its own under a content-addressed key, so the
+# all-in-one batch, its stream and its job workers share results, and only
+# missing or expired artifacts are regenerated.
+# One name per output format: flashcards/mcqs/keywords are written by BATCH 2
+# and by the standalone endpoints (Smart_api.generate_artifact - same 5 items,
+# same JSON shape); quick search uses a shorter prompt than BATCH 1, so it
+# gets its own name.
+# Bump a version when its prompts change to retire the old entries.
+ARTIFACT_VERSIONS = {
+    'explanation': 1, 'story': 1,            # batch_api BATCH 1
+    'flashcards': 1, 'mcqs': 1, 'keywords': 1,  # batch_api BATCH 2 + Smart_api standalone prompts
+    'quick_explanation': 1,                  # batch_api.search_only_prompt
+}
+CONTEXT_CHARS = 1000  # prompts only ever see content[:1000]
+
+def artifact_key(artifact, topic, context=''):
+    """<topic>__<artifact>_v<prompt version>_<hash of the prompt context>"""
+    versions = dict(ARTIFACT_VERSIONS, **getattr(settings, 'AI_ARTIFACT_VERSIONS', {}))
+    context = (context or '')[:CONTEXT_CHARS]
+    context_hash = hashlib.sha256(context.encode()).hexdigest()[:16] if context else 'none'
+    return f"{get_cache_key(topic)}__{artifact}_v{versions[artifact]}_{context_hash}"
+
+def load_artifact(artifact, topic, context=''):
+    """Fresh cached artifact value, or None"""
+    return load_from_cache(artifact_key(artifact, topic, context))
+
+def save_artifact(artifact, topic, context, value, ttl_hours=72):
+    if value and save_to_cache(artifact_key(artifact, topic, context), value, ttl_hours=ttl_hours):
+        remember_topic(topic)
+
+async def aload_artifact(artifact, topic, context=''):
+    return await sync_to_async(load_artifact)(artifact, topic, context)
+
+async def asave_artifact(artifact, topic, context, value, ttl_hours=72):
+    return await sync_to_async(save_artifact)(artifact, topic, context, value, ttl_hours)
 
 def clear_cache():
     """Clear all cache"""
     try:
-        for cache_file in CACHE_DIR.glob('*.json'):
-            cache_file.unlink()
+        get_store().clear()
         print("🗑️ Cache cleared")
         return True
     except Exception as e:
@@ -89,9 +781,15 @@ def clear_cache():
 
 def cache_stats():
     """Get cache statistics"""
-    cache_files = list(CACHE_DIR.glob('*.json'))
-    total_size = sum(f.stat().st_size for f in cache_files)
-    return {
-        'count': len(cache_files),
-        'size_mb': round(total_size / 1024 / 1024, 2)
+    stats = get_store().stats()
+    result = {
+        'backend': stats['backend'],
+        'count': stats['count'],
+        'size_mb': round(stats['bytes'] / 1024 / 1024, 2)
     }
+    if 'tiers' in stats:
+        result['tiers'] = stats['tiers']
+    topic_index = get_topic_index()
+    if topic_index is not None:
+        result['topics'] = topic_index.stats()
+    return result
@@ -0,0 +1,326 @@
+"""
+Cache observability - counters, latency histograms and per-key stats for the AI cache
+Recorded by demo_app/cache.py on every lookup/write:
+
+- lookups split into hits (fresh), stale hits, misses and expired entries,
+  plus hits on remembered failures (negative cache)
+- sets, memory-tier evictions and purged expired rows
+- bytes read / written (JSON size of the data)
+- latency histograms for hits, misses and writes, and the generation time
+  of entries (miss -> the write that fills it)
+- generation time saved: every hit is credited with what generating that key
+  took (or the average generation time of its kind when it was generated
+  by another process)
+
+Each worker process snapshots its metrics to ai_cache/meta/metrics/<host>-<pid>.json
+every few seconds; snapshot() merges all of them, so the staff endpoint and
+`manage.py ai_cache_stats` report the whole host, not one worker.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+DEFAULT_METRICS_DIR = Path(__file__).parent / 'ai_cache' / 'meta' / 'metrics'
+
+# Histogram bucket upper bounds in milliseconds (the last bucket is +inf)
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+COUNTERS = (
+    'lookups', 'hits', 'stale_hits', 'misses', 'expired', 'negative_hits',
+    'sets', 'evictions', 'purged', 'bytes_read', 'bytes_written',
+    'generations', 'generation_ms_saved',
+)
+HISTOGRAMS = ('hit_ms', 'miss_ms', 'set_ms', 'generation_ms')
+
+
+def _config():
+    return getattr(settings, 'AI_CACHE_METRICS', {})
+
+
+def key_kind(cache_key):
+    """'all_in_one', 'failure' or the artifact type of a cache key"""
+    if cache_key.endswith('__failed'):
+        return 'failure'
+    if '__' in cache_key:
+        return cache_key.rsplit('__', 1)[1].split('_v', 1)[0]
+    return 'all_in_one'
+
+
+# ============================================
+# Histograms (plain dicts, so snapshots merge by adding)
+# ============================================
+
+def new_histogram():
+    return {'count': 0, 'sum_ms': 0.0, 'max_ms': 0.0, 'buckets': [0] * (len(BUCKETS_MS) + 1)}
+
+
+def observe(histogram, ms):
+    histogram['count'] += 1
+    histogram['sum_ms'] += ms
+    histogram['max_ms'] = max(histogram['max_ms'], ms)
+    for i, bound in enumerate(BUCKETS_MS):
+        if ms <= bound:
+            histogram['buckets'][i] += 1
+            return
+    histogram['buckets'][-1] += 1
+
+
+def merge_histogram(into, other):
+    into['count'] += other['count']
+    into['sum_ms'] += other['sum_ms']
+    into['max_ms'] = max(into['max_ms'], other['max_ms'])
+    into['buckets'] = [a + b for a, b in zip(into['buckets'], other['buckets'])]
+
+
+def summarize(histogram):
+    """count / mean / p50 / p95 / p99 / max (percentiles are bucket upper bounds)"""
+    count = histogram['count']
+    summary = {'count': count, 'mean_ms': round(histogram['sum_ms'] / count, 3) if count else 0.0}
+    for name, q in (('p50_ms', 0.50), ('p95_ms', 0.95), ('p99_ms', 0.99)):
+        value, seen = 0.0, 0
+        if count:
+            for i, n in enumerate(histogram['buckets']):
+                seen += n
+                if seen >= q * count:
+                    value = BUCKETS_MS[i] if i < len(BUCKETS_MS) else histogram['max_ms']
+                    break
+        summary[name] = round(min(value, histogram['max_ms']), 3)
+    summary['max_ms'] = round(histogram['max_ms'], 3)
+    return summary
+
+
+# ============================================
+# Per-process metrics
+# ============================================
+
+class CacheMetrics:
+    """Thread-safe metrics for one process (see snapshot() for the host-wide view)"""
+
+    def __init__(self, directory=None, flush_seconds=10.0, max_keys=2000, top_keys=200):
+        self.directory = Path(directory) if directory else DEFAULT_METRICS_DIR
+        self.flush_seconds = flush_seconds
+        self.max_keys = max_keys
+        self.top_keys = top_keys
+        self.name = f"{socket.gethostname()}-{os.getpid()}"
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.counts = dict.fromkeys(COUNTERS, 0)
+            self.histograms = {name: new_histogram() for name in HISTOGRAMS}
+            self.kinds = {}     # kind -> [generations, generation_ms]
+            self.keys = {}      # key -> [hits, bytes, generation_ms]
+            self._pending = {}  # key -> monotonic time of the miss waiting to be filled
+
+    # ----- recording -----
+
+    def _key(self, cache_key):
+        stats = self.keys.get(cache_key)
+        if stats is None:
+            if len(self.keys) >= self.max_keys:
+                # Keep the hottest half - cold keys are what we can afford to forget
+                keep = sorted(self.keys.items(), key=lambda item: item[1][0], reverse=True)[:self.max_keys // 2]
+                self.keys = dict(keep)
+            stats = self.keys[cache_key] = [0, 0, 0.0]
+        return stats
+
+    def _generation_ms(self, cache_key, stats):
+        if stats[2]:
+            return stats[2]
+        generations, total_ms = self.kinds.get(key_kind(cache_key), (0, 0.0))
+        if generations:
+            return total_ms / generations
+        overall = self.histograms['generation_ms']
+        return overall['sum_ms'] / overall['count'] if overall['count'] else 0.0
+
+    def lookup(self, cache_key, outcome, ms, data=None):
+        """outcome: 'hit' (fresh), 'stale' (served stale), 'miss' or 'expired'; data = what was served"""
+        with self._lock:
+            self.counts['lookups'] += 1
+            stats = self._key(cache_key)
+            if outcome in ('hit', 'stale'):
+                if not stats[1]:
+                    # Measured once per key - hits shouldn't pay for serialization
+                    stats[1] = len(json.dumps(data, separators=(',', ':')))
+                self.counts['hits' if outcome == 'hit' else 'stale_hits'] += 1
+                self.counts['bytes_read'] += stats[1]
+                self.counts['generation_ms_saved'] += self._generation_ms(cache_key, stats)
+                stats[0] += 1
+                observe(self.histograms['hit_ms'], ms)
+            else:
+                self.counts['misses' if outcome == 'miss' else 'expired'] += 1
+                observe(self.histograms['miss_ms'], ms)
+            if outcome != 'hit':
+                # A stale/missing entry is about to be (re)generated
+                if len(self._pending) > self.max_keys:
+                    self._pending.clear()
+                self._pending.setdefault(cache_key, time.monotonic() - ms / 1000)
+        self._maybe_flush()
+
+    def negative_hit(self, cache_key):
+        with self._lock:
+            self.counts['negative_hits'] += 1
+            # A remembered failure is not a generation in progress
+            self._pending.pop(cache_key, None)
+        self._maybe_flush()
+
+    def stored(self, cache_key, size, ms):
+        with self._lock:
+            self.counts['sets'] += 1
+            self.counts['bytes_written'] += size
+            observe(self.histograms['set_ms'], ms)
+            stats = self._key(cache_key)
+            stats[1] = size
+            started = self._pending.pop(cache_key, None)
+            if started is not None:
+                generation_ms = (time.monotonic() - started) * 1000
+                self.counts['generations'] += 1
+                observe(self.histograms['generation_ms'], generation_ms)
+                stats[2] = generation_ms
+                kind = self.kinds.setdefault(key_kind(cache_key), [0, 0.0])
+                kind[0] += 1
+                kind[1] += generation_ms
+        self._maybe_flush()
+
+    def evicted(self, count=1):
+        with self._lock:
+            self.counts['evictions'] += count
+
+    def purged(self, count):
+        with self._lock:
+            self.counts['purged'] += count
+
+    # ----- snapshots -----
+
+    def local_snapshot(self):
+        with self._lock:
+            keys = sorted(self.keys.items(), key=lambda item: item[1][0], reverse=True)[:self.top_keys]
+            keys += sorted(self.keys.items(), key=lambda item: item[1][1], reverse=True)[:self.top_keys]
+            return {
+                'process': self.name,
+                'started_at': self.started_at,
+                'updated_at': time.time(),
+                'counts': dict(self.counts),
+                'histograms': json.loads(json.dumps(self.histograms)),
+                'kinds': {kind: list(values) for kind, values in self.kinds.items()},
+                'keys': {key: list(stats) for key, stats in keys},
+            }
+
+    def _maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """Write this process's snapshot for other processes to merge"""
+        self._last_flush = time.monotonic()
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / f"{self.name}.json"
+            tmp = path.with_suffix('.tmp')
+            tmp.write_text(json.dumps(self.local_snapshot(), separators=(',', ':')))
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"⚠️ Cache metrics write error: {e}")
+
+
+# ============================================
+# Host-wide view
+# ============================================
+
+def _merge(snapshots, top):
+    counts = dict.fromkeys(COUNTERS, 0)
+    histograms = {name: new_histogram() for name in HISTOGRAMS}
+    kinds, keys = {}, {}
+    for snap in snapshots:
+        for name, value in snap['counts'].items():
+            counts[name] = counts.get(name, 0) + value
+        for name, histogram in snap['histograms'].items():
+            merge_histogram(histograms.setdefault(name, new_histogram()), histogram)
+        for kind, (generations, total_ms) in snap['kinds'].items():
+            merged = kinds.setdefault(kind, [0, 0.0])
+            merged[0] += generations
+            merged[1] += total_ms
+        for key, (hits, size, generation_ms) in snap['keys'].items():
+            merged = keys.setdefault(key, [0, 0, 0.0])
+            merged[0] += hits
+            merged[1] = max(merged[1], size)
+            merged[2] = max(merged[2], generation_ms)
+
+    served = counts['hits'] + counts['stale_hits']
+    lookups = counts['lookups']
+    ratio = lambda n: round(n / lookups, 3) if lookups else 0.0
+    key_row = lambda key, stats: {'key': key, 'kind': key_kind(key), 'hits': stats[0], 'bytes': stats[1],
+                                  'generation_ms': round(stats[2], 1)}
+    return {
+        'processes': len(snapshots),
+        'since': min((snap['started_at'] for snap in snapshots), default=None),
+        'counts': counts,
+        'hit_ratio': ratio(served),
+        'fresh_hit_ratio': ratio(counts['hits']),
+        'miss_ratio': ratio(counts['misses'] + counts['expired']),
+        'generation_seconds_saved': round(counts['generation_ms_saved'] / 1000, 1),
+        'latency': {name: summarize(histogram) for name, histogram in histograms.items()},
+        'generation_by_kind': {
+            kind: {'generations': generations, 'mean_ms': round(total_ms / generations, 1) if generations else 0.0}
+            for kind, (generations, total_ms) in sorted(kinds.items())
+        },
+        'hottest_keys': [key_row(key, stats) for key, stats in
+                         sorted(keys.items(), key=lambda item: item[1][0], reverse=True)[:top] if stats[0]],
+        'largest_keys': [key_row(key, stats) for key, stats in
+                         sorted(keys.items(), key=lambda item: item[1][1], reverse=True)[:top] if stats[1]],
+    }
+
+
+def snapshot(top=20):
+    """Metrics of every process on this host (snapshots older than max_age_hours are dropped)"""
+    metrics = get_metrics()
+    if metrics.counts['lookups'] or metrics.counts['sets']:
+        metrics.flush()
+    max_age = _config().get('max_age_hours', 24) * 3600
+    snapshots = []
+    for path in metrics.directory.glob('*.json'):
+        try:
+            if time.time() - path.stat().st_mtime > max_age:
+                path.unlink()
+                continue
+            snapshots.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return _merge(snapshots, top)
+
+
+def reset_all():
+    """Zero this process's metrics and drop every saved snapshot"""
+    metrics = get_metrics()
+    metrics.reset()
+    for path in metrics.directory.glob('*.json'):
+        path.unlink(missing_ok=True)
+
+
+_metrics = None
+_init_lock = threading.Lock()
+
+
+def get_metrics():
+    """Process-wide instance configured from settings.AI_CACHE_METRICS"""
+    global _metrics
+    if _metrics is None:
+        with _init_lock:
+            if _metrics is None:
+                config = _config()
+                _metrics = CacheMetrics(
+                    directory=config.get('path'),
+                    flush_seconds=config.get('flush_seconds', 10),
+                    max_keys=config.get('max_keys', 2000),
+                    top_keys=config.get('top_keys', 200),
+                )
+    return _metrics
@@ -0,0 +1,263 @@
+"""
+Cache warming from search popularity
+`manage.py warm_ai_cache` (run off-peak) picks the most searched topics in
+SearchHistory, skips the ones already fresh in the AI cache and generates the
+rest through generate_all_content, so daytime searches become cache hits.
+
+- popularity is counted per normalized topic, so "Photosynthesis" and
+  "what is photosynthesis?" add up to one entry
+- a few topics are generated at a time and only while the key pool has spare
+  capacity; warming stops early rather than burning through a key's quota
+- progress is checkpointed to ai_cache/meta/, an interrupted run resumes
+  where it stopped
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count
+from django.utils import timezone
+
+from .batch_api import generate_all_content
+from .cache import get_cache_key, get_store
+from .models import SearchHistory
+from .topic_index import normalize_topic
+
+DEFAULT_CHECKPOINT = Path(__file__).parent / 'ai_cache' / 'meta' / 'warm_checkpoint.json'
+CALLS_PER_TOPIC = 2  # BATCH 1 + BATCH 2
+
+
+def _config():
+    return getattr(settings, 'AI_CACHE_WARMING', {})
+
+
+# ============================================
+# Planning
+# ============================================
+
+def popular_topics(top=50, days=7):
+    """[(topic, searches)] most searched first, counted per normalized topic"""
+    since = timezone.now() - timedelta(days=days)
+    rows = (SearchHistory.objects.filter(timestamp__gte=since)
+            .values('query').annotate(searches=Count('id')).order_by('-searches'))
+
+    totals = Counter()
+    spellings = {}  # normalized -> (searches, most common raw spelling)
+    for row in rows[:top * 10].iterator():
+        query = ' '.join(row['query'].split())
+        if not query:
+            continue
+        normalized = normalize_topic(query) or query.lower()
+        totals[normalized] += row['searches']
+        if row['searches'] > spellings.get(normalized, (0, ''))[0]:
+            spellings[normalized] = (row['searches'], query)
+
+    return [(spellings[normalized][1], searches) for normalized, searches in totals.most_common(top)]
+
+
+def fresh_for(cache_key):
+    """Seconds the cached entry stays fresh (0 when missing or already stale)"""
+    try:
+        entry = get_store().get_entry(cache_key)
+    except Exception as e:
+        print(f"❌ Cache load error: {e}")
+        return 0
+    if entry is None:
+        return 0
+    return max(0.0, entry[2] - time.time())
+
+
+# ============================================
+# Checkpoint
+# ============================================
+
+class Checkpoint:
+    """Plan + progress of one warming run, rewritten atomically after every topic"""
+
+    def __init__(self, path, params):
+        self.path = Path(path)
+        self.params = params
+        self.plan = []
+        self.done = []
+        self.failed = []
+        self._lock = threading.Lock()
+
+    def load(self):
+        """True when a checkpoint for the same parameters was found"""
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return False
+        if data.get('params') != self.params:
+            print("⚠️ Checkpoint was made with different options - starting over")
+            return False
+        self.plan, self.done, self.failed = data['plan'], data['done'], data['failed']
+        return True
+
+    def pending(self):
+        """Planned topics not warmed yet (failed ones are retried on resume)"""
+        done = set(self.done)
+        return [topic for topic in self.plan if topic not in done]
+
+    def record(self, topic, ok):
+        with self._lock:
+            if topic in self.failed:
+                self.failed.remove(topic)
+            (self.done if ok else self.failed).append(topic)
+            self.save()
+
+    def save(self):
+        data = {'params': self.params, 'plan': self.plan, 'done': self.done, 'failed': self.failed}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix('.tmp')
+            tmp.write_text(json.dumps(data, indent=1))
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"⚠️ Checkpoint write error: {e}")
+
+    def clear(self):
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+
+# ============================================
+# Quota
+# ============================================
+
+def spare_calls(reserve=1):
+    """
+    AI calls the key pool can take right now while leaving `reserve` requests
+    per healthy key for live traffic (also capped by each key's daily quota left).
+    None when no key will ever be usable.
+    """
+    from .Smart_api import get_key_pool_status, get_key_quota_remaining
+    status = get_key_pool_status()
+    if status['total'] == 0 or status['invalid'] == status['total']:
+        return None
+    today = get_key_quota_remaining()
+    return sum(max(0, min(int(key['requests_available']), today[key['key'] - 1]) - reserve)
+               for key in status['keys'] if key['state'] == 'healthy')
+
+
+# ============================================
+# Warming
+# ============================================
+
+def _warm_one(topic, include_story):
+    """Generate and cache one topic; True when every part came back"""
+    try:
+        results = generate_all_content(topic, include_story=include_story, request_class=None)
+        ok = bool(results.get('search')) and not results.get('errors')
+        if not ok:
+            print(f"⚠️ Warming incomplete for '{topic}': {results.get('errors')}")
+        return ok
+    except Exception as e:
+        print(f"❌ Warming failed for '{topic}': {str(e)[:100]}")
+        return False
+    finally:
+        close_old_connections()
+
+
+def warm(top=50, days=7, workers=2, include_story=True, min_fresh_hours=0, max_topics=None,
+         reserve=1, max_wait=120, checkpoint_path=None, restart=False, dry_run=False, stop_event=None):
+    """
+    Warm the cache with the `top` most searched topics of the last `days` days.
+    Entries fresh for at least min_fresh_hours more are skipped. Returns a summary dict.
+    """
+    stop_event = stop_event or threading.Event()
+    params = {'top': top, 'days': days, 'include_story': include_story, 'min_fresh_hours': min_fresh_hours}
+    checkpoint = Checkpoint(checkpoint_path or _config().get('checkpoint_path') or DEFAULT_CHECKPOINT, params)
+
+    resumed = not restart and checkpoint.load()
+    if resumed:
+        print(f"↩️ Resuming warm-up: {len(checkpoint.done)} done, {len(checkpoint.pending())} left")
+    else:
+        checkpoint.plan = [topic for topic, _ in popular_topics(top, days)]
+        print(f"📈 {len(checkpoint.plan)} popular topic(s) in the last {days} day(s)")
+
+    summary = {'planned': len(checkpoint.plan), 'fresh': 0, 'warmed': 0, 'failed': 0,
+               'remaining': 0, 'resumed': resumed, 'stopped': ''}
+
+    queue = []
+    for topic in checkpoint.pending():
+        if fresh_for(get_cache_key(topic)) > min_fresh_hours * 3600:
+            summary['fresh'] += 1
+            continue
+        queue.append(topic)
+    deferred = 0
+    if max_topics is not None:
+        deferred = max(0, len(queue) - max_topics)
+        queue = queue[:max_topics]
+    print(f"🔥 {len(queue)} topic(s) to warm, {summary['fresh']} already fresh")
+
+    if dry_run:
+        summary['remaining'] = len(queue) + deferred
+        summary['topics'] = queue
+        return summary
+    if not resumed:
+        checkpoint.save()
+
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ai-warm') as pool:
+        while (queue or in_flight) and not summary['stopped']:
+            # Collect finished topics
+            finished = [f for f in in_flight if f.done()]
+            if not finished and in_flight and (not queue or len(in_flight) >= workers):
+                finished, _ = wait(in_flight, timeout=1, return_when=FIRST_COMPLETED)
+            for future in finished:
+                topic = in_flight.pop(future)
+                ok = future.result()
+                summary['warmed' if ok else 'failed'] += 1
+                checkpoint.record(topic, ok)
+                print(f"{'✅' if ok else '❌'} [{summary['warmed'] + summary['failed']}] {topic}")
+
+            if stop_event.is_set():
+                summary['stopped'] = 'interrupted'
+                break
+            if not queue or len(in_flight) >= workers:
+                continue
+
+            # Start the next topic only while the keys have room for it
+            spare = spare_calls(reserve)
+            if spare is None:
+                summary['stopped'] = 'no usable API keys'
+                break
+            if spare < CALLS_PER_TOPIC * (len(in_flight) + 1):
+                waited = 0
+                while not stop_event.is_set() and waited < max_wait and not any(f.done() for f in in_flight):
+                    spare = spare_calls(reserve)
+                    if spare is None or spare >= CALLS_PER_TOPIC * (len(in_flight) + 1):
+                        break
+                    stop_event.wait(1)
+                    waited += 1
+                if waited >= max_wait:
+                    summary['stopped'] = f'key quota exhausted (no capacity for {max_wait}s)'
+                continue
+
+            topic = queue.pop(0)
+            in_flight[pool.submit(_warm_one, topic, include_story)] = topic
+
+        # Let running generations finish so their results are cached and recorded
+        for future in list(in_flight):
+            topic = in_flight.pop(future)
+            ok = future.result()
+            summary['warmed' if ok else 'failed'] += 1
+            checkpoint.record(topic, ok)
+
+    summary['remaining'] = len(queue) + deferred
+    if summary['stopped']:
+        print(f"⏸️ Warm-up stopped ({summary['stopped']}) - run again to resume")
+    elif not summary['remaining']:
+        checkpoint.clear()
+    return summary
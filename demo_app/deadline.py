@@ -0,0 +1,148 @@
+"""
+Request deadlines for AI work
+A view decorated with @with_deadline('search_all') gets a time budget from
+settings.AI_DEADLINES['endpoints']. The absolute deadline is kept in a
+context variable, so everything below the view (batch_api, call_ai_with_retry,
+the provider) reads it without extra parameters:
+
+- provider network timeouts are capped at the time left (call_timeout())
+- key waits and retry backoff sleeps never run past it (budget())
+- a call or retry is not started with less than min_attempt_seconds left
+  (can_attempt()) - the work is abandoned with DEADLINE_ERROR instead, and
+  batch_api caches whatever parts were finished as a partial result
+
+Background work (cache warming, refreshes, job workers) runs without a
+deadline - only call_timeout bounds each provider call there.
+Thread pools don't inherit context variables: use submit() to carry the
+deadline into a pool thread.
+"""
+
+import asyncio
+import contextvars
+import functools
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+DEADLINE_ERROR = "Error: Request deadline exceeded"
+
+_deadline = contextvars.ContextVar('ai_request_deadline', default=None)
+
+
+def _config():
+    return getattr(settings, 'AI_DEADLINES', {})
+
+
+def remaining():
+    """Seconds left before the current deadline (None = no deadline)"""
+    at = _deadline.get()
+    if at is None:
+        return None
+    return max(0.0, at - time.monotonic())
+
+
+def expired():
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def budget(seconds):
+    """`seconds`, cut down to the time left"""
+    left = remaining()
+    return seconds if left is None else min(seconds, left)
+
+
+def can_attempt(after=0):
+    """Whether a call started `after` seconds from now still has min_attempt_seconds to run"""
+    left = remaining()
+    return left is None or left - after >= _config().get('min_attempt_seconds', 2)
+
+
+def call_timeout():
+    """Network timeout for one provider call"""
+    return budget(_config().get('call_timeout', 60))
+
+
+@contextmanager
+def deadline(seconds):
+    """Run the block with a deadline `seconds` from now (an outer, earlier deadline still wins)"""
+    at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(at if current is None else min(at, current))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def submit(executor, fn, *args, **kwargs):
+    """executor.submit() that carries the caller's deadline into the pool thread"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+# ============================================
+# View decorator
+# ============================================
+
+def _within(content, at):
+    """Iterate a streaming response with the deadline set while each chunk is produced"""
+    iterator = iter(content)
+    while True:
+        token = _deadline.set(at)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _deadline.reset(token)
+        yield chunk
+
+
+async def _awithin(content, at):
+    iterator = aiter(content)
+    while True:
+        token = _deadline.set(at)
+        try:
+            chunk = await anext(iterator)
+        except StopAsyncIteration:
+            return
+        finally:
+            _deadline.reset(token)
+        yield chunk
+
+
+def _streamed_within(response, at):
+    # A streaming body is produced after the view returns - outside its deadline block
+    if getattr(response, 'streaming', False):
+        wrap = _awithin if response.is_async else _within
+        response.streaming_content = wrap(response.streaming_content, at)
+    return response
+
+
+def with_deadline(endpoint):
+    """Give the view's AI work AI_DEADLINES['endpoints'][endpoint] seconds (sync and async views)"""
+
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                seconds = _config().get('endpoints', {}).get(endpoint)
+                if not _config().get('enabled', True) or not seconds:
+                    return await view(request, *args, **kwargs)
+                with deadline(seconds):
+                    response = await view(request, *args, **kwargs)
+                    return _streamed_within(response, _deadline.get())
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            seconds = _config().get('endpoints', {}).get(endpoint)
+            if not _config().get('enabled', True) or not seconds:
+                return view(request, *args, **kwargs)
+            with deadline(seconds):
+                response = view(request, *args, **kwargs)
+                return _streamed_within(response, _deadline.get())
+        return wrapper
+
+    return decorator
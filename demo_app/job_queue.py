@@ -0,0 +1,181 @@
+"""
+Background job mode for the all-in-one generation
+The web request only enqueues a GenerationJob row and returns its id;
+`manage.py run_ai_workers` claims jobs from the table and runs them,
+saving partial results as BATCH 1 text streams in.
+
+Claiming is a conditional UPDATE (status=queued -> running), so any number
+of worker threads/processes can share the table without double-running a job.
+"""
+
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from .batch_api import stream_all_content
+from .cache import get_cache_key, get_content_hash
+from .models import GenerationJob
+
+ACTIVE = (GenerationJob.QUEUED, GenerationJob.RUNNING)
+
+
+def _config():
+    return getattr(settings, 'AI_JOBS', {})
+
+
+# ============================================
+# Enqueue / Status
+# ============================================
+
+def enqueue_job(topic, content='', include_story=True):
+    """New job for topic, or the already queued/running job for the same cache key"""
+    content_hash = get_content_hash(content) if content else ""
+    cache_key = get_cache_key(topic, content_hash)
+
+    existing = GenerationJob.objects.filter(cache_key=cache_key, status__in=ACTIVE).first()
+    if existing:
+        print(f"🤝 Joining queued job {existing.id} for: {topic}")
+        return existing
+
+    job = GenerationJob.objects.create(
+        topic=topic,
+        content=content,
+        include_story=include_story,
+        cache_key=cache_key,
+    )
+    print(f"📥 Queued job {job.id}: {topic}")
+    return job
+
+
+def job_status(job):
+    """JSON-ready snapshot of a job"""
+    data = {
+        'job_id': str(job.id),
+        'status': job.status,
+        'version': job.version,
+        'partial': job.partial,
+    }
+    if job.status == GenerationJob.QUEUED:
+        data['position'] = GenerationJob.objects.filter(
+            status=GenerationJob.QUEUED, created_at__lt=job.created_at
+        ).count()
+    if job.status == GenerationJob.DONE:
+        data['data'] = job.result
+    if job.status == GenerationJob.FAILED:
+        data['error'] = job.error
+    return data
+
+
+def is_settled(job, seen_version):
+    """True when a long-poll should answer: finished, or progress newer than seen_version"""
+    return job.status not in ACTIVE or job.version > seen_version
+
+
+# ============================================
+# Worker side
+# ============================================
+
+def requeue_stale_jobs():
+    """Put back jobs whose worker stopped heart-beating (crashed/killed)"""
+    stale_after = _config().get('stale_after_seconds', 300)
+    max_attempts = _config().get('max_attempts', 2)
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    stale = GenerationJob.objects.filter(status=GenerationJob.RUNNING, heartbeat_at__lt=cutoff)
+
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status=GenerationJob.FAILED,
+        error='Worker stopped responding',
+        finished_at=timezone.now(),
+        version=F('version') + 1,
+    )
+    requeued = stale.update(status=GenerationJob.QUEUED, worker='')
+    if failed or requeued:
+        print(f"♻️ Stale jobs: {requeued} requeued, {failed} failed")
+    return requeued
+
+
+def claim_next_job(worker_name):
+    """Oldest queued job, atomically marked running for this worker (or None)"""
+    for job_id in GenerationJob.objects.filter(status=GenerationJob.QUEUED).values_list('id', flat=True)[:5]:
+        now = timezone.now()
+        claimed = GenerationJob.objects.filter(id=job_id, status=GenerationJob.QUEUED).update(
+            status=GenerationJob.RUNNING,
+            worker=worker_name,
+            attempts=F('attempts') + 1,
+            started_at=now,
+            heartbeat_at=now,
+            version=F('version') + 1,
+        )
+        if claimed:
+            return GenerationJob.objects.get(id=job_id)
+    return None
+
+
+def _save_progress(job, partial):
+    GenerationJob.objects.filter(id=job.id).update(
+        partial=partial,
+        heartbeat_at=timezone.now(),
+        version=F('version') + 1,
+    )
+
+
+def run_job(job):
+    """Generate everything for a claimed job, saving partial results as they arrive"""
+    interval = _config().get('partial_interval', 1.0)
+    partial = {'search': '', 'story': '', 'flashcards': [], 'mcqs': [], 'keywords': []}
+    last_save = time.monotonic()
+
+    print(f"⚙️ [{job.worker}] Running job {job.id}: {job.topic}")
+    try:
+        for event, payload in stream_all_content(job.topic, job.content or None, job.include_story):
+            if event == 'explanation':
+                partial['search'] += payload
+            elif event == 'story':
+                partial['story'] += payload
+            elif event == 'materials':
+                partial.update(payload)
+                _save_progress(job, partial)
+                last_save = time.monotonic()
+            elif event == 'done':
+                GenerationJob.objects.filter(id=job.id).update(
+                    status=GenerationJob.DONE,
+                    result=payload,
+                    partial={},
+                    finished_at=timezone.now(),
+                    version=F('version') + 1,
+                )
+                print(f"✅ [{job.worker}] Job {job.id} done")
+                return True
+
+            if time.monotonic() - last_save >= interval:
+                _save_progress(job, partial)
+                last_save = time.monotonic()
+
+        raise RuntimeError('Generation ended without a result')
+
+    except Exception as e:
+        print(f"❌ [{job.worker}] Job {job.id} failed: {e}")
+        GenerationJob.objects.filter(id=job.id).update(
+            status=GenerationJob.FAILED,
+            error=str(e)[:500],
+            partial=partial,
+            finished_at=timezone.now(),
+            version=F('version') + 1,
+        )
+        return False
+
+
+def work(worker_name, stop_event, poll_interval=1.0):
+    """Worker loop: claim -> run until stop_event is set"""
+    while not stop_event.is_set():
+        close_old_connections()
+        job = claim_next_job(worker_name)
+        if job is None:
+            stop_event.wait(poll_interval)
+            continue
+        run_job(job)
+    close_old_connections()
@@ -0,0 +1,236 @@
+"""
+API Key Pool - thread-safe key selection with health tracking
+Every key is in one of three states:
+- healthy:  usable (subject to its RPM/TPM token buckets)
+- cooldown: skipped until `cooldown_until` (after 429s or repeated errors)
+- invalid:  rejected by the provider (401), never used again until reset
+
+Keys are handed out per call, so no process-wide credential is ever
+mutated while other threads are mid-request.
+"""
+
+import asyncio
+import threading
+import time
+
+from .rate_limiter import KeyRateLimiter
+
+HEALTHY = 'healthy'
+COOLDOWN = 'cooldown'
+INVALID = 'invalid'
+
+
+class KeyState:
+    """Health bookkeeping for one key"""
+
+    def __init__(self, index, key):
+        self.index = index
+        self.key = key
+        self.invalid = False
+        self.cooldown_until = 0.0
+        self.consecutive_failures = 0
+        self.rate_limit_strikes = 0
+        self.calls = 0
+        self.successes = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.last_error = ''
+
+    def state(self, now):
+        if self.invalid:
+            return INVALID
+        if self.cooldown_until > now:
+            return COOLDOWN
+        return HEALTHY
+
+
+class APIKeyPool:
+    """
+    Hands out API keys that are healthy and have rate-limit capacity.
+    keys:   list of API key strings
+    limits: list of {'rpm', 'tpm'} dicts (same order as keys)
+    """
+
+    def __init__(self, keys, limits, cooldown_seconds=60, max_cooldown_seconds=600, failure_threshold=3):
+        self._lock = threading.Lock()
+        self.keys = list(keys)
+        self.limiter = KeyRateLimiter(limits)
+        self.states = [KeyState(i, key) for i, key in enumerate(self.keys)]
+        self.cooldown_seconds = cooldown_seconds
+        self.max_cooldown_seconds = max_cooldown_seconds
+        self.failure_threshold = failure_threshold
+
+    def __len__(self):
+        return len(self.keys)
+
+    # ============================================
+    # Acquire
+    # ============================================
+
+    def _unavailable(self, exclude, now):
+        """Indexes the limiter must skip: excluded, cooling down or invalid"""
+        with self._lock:
+            return {s.index for s in self.states if s.index in exclude or s.state(now) != HEALTHY}
+
+    def try_acquire(self, tokens=0, exclude=()):
+        """
+        Non-blocking: (index, key, 0.0) for a usable key, or (None, None, wait)
+        where wait is the shortest time until any key could be used
+        (inf when every key is invalid or excluded).
+        """
+        now = time.time()
+        skip = self._unavailable(exclude, now)
+        usable = [i for i in range(len(self.keys)) if i not in skip]
+
+        if not usable:
+            with self._lock:
+                cooling = [s.cooldown_until - now for s in self.states
+                           if s.index not in exclude and s.state(now) == COOLDOWN]
+            return None, None, (min(cooling) if cooling else float('inf'))
+
+        # Everything not usable is excluded, so the limiter never falls back to a bad key
+        index, wait = self.limiter.try_acquire(tokens, exclude=set(range(len(self.keys))) - set(usable))
+        if index is None:
+            return None, None, wait
+
+        with self._lock:
+            self.states[index].calls += 1
+        return index, self.keys[index], 0.0
+
+    def acquire(self, tokens=0, exclude=(), max_wait=5.0):
+        """
+        Blocking variant: waits for capacity up to `max_wait` seconds.
+        Returns (index, key, 0.0) or (None, None, retry_after) when nothing frees
+        up in time - callers fail fast instead of sleeping through a cooldown.
+        """
+        deadline = time.monotonic() + max_wait
+        while True:
+            index, key, wait = self.try_acquire(tokens, exclude)
+            if index is not None:
+                return index, key, 0.0
+            remaining = deadline - time.monotonic()
+            if wait > remaining:
+                return None, None, wait
+            time.sleep(min(max(wait, 0.01), 1.0))
+
+    async def aacquire(self, tokens=0, exclude=(), max_wait=5.0):
+        """acquire() for async callers - waits with asyncio.sleep instead of blocking"""
+        deadline = time.monotonic() + max_wait
+        while True:
+            index, key, wait = self.try_acquire(tokens, exclude)
+            if index is not None:
+                return index, key, 0.0
+            remaining = deadline - time.monotonic()
+            if wait > remaining:
+                return None, None, wait
+            await asyncio.sleep(min(max(wait, 0.01), 1.0))
+
+    def capacity(self, tokens=0, exclude=()):
+        """
+        Non-reserving look at the pool: (requests that could start now on usable
+        keys, seconds until the next one could - inf when no key will ever be usable)
+        """
+        now = time.time()
+        skip = self._unavailable(exclude, now)
+        usable = [i for i in range(len(self.keys)) if i not in skip]
+        available, wait = self.limiter.capacity(tokens, usable)
+        with self._lock:
+            cooling = [s.cooldown_until - now for s in self.states
+                       if s.index not in exclude and s.state(now) == COOLDOWN]
+        return available, min([wait] + cooling)
+
+    def settle(self, index, reserved_tokens, used_tokens):
+        self.limiter.settle(index, reserved_tokens, used_tokens)
+
+    # ============================================
+    # Health Reporting
+    # ============================================
+
+    def mark_success(self, index):
+        with self._lock:
+            state = self.states[index]
+            state.successes += 1
+            state.consecutive_failures = 0
+            state.rate_limit_strikes = 0
+
+    def mark_rate_limited(self, index, retry_after=None):
+        """429: cool the key down, doubling the cooldown on repeated strikes"""
+        with self._lock:
+            state = self.states[index]
+            state.rate_limited += 1
+            state.rate_limit_strikes += 1
+            cooldown = retry_after or self.cooldown_seconds * (2 ** (state.rate_limit_strikes - 1))
+            cooldown = min(cooldown, self.max_cooldown_seconds)
+            state.cooldown_until = time.time() + cooldown
+            state.last_error = '429 rate limited'
+            return cooldown
+
+    def mark_invalid(self, index, message=''):
+        with self._lock:
+            state = self.states[index]
+            state.invalid = True
+            state.errors += 1
+            state.last_error = message[:100] or '401 invalid key'
+
+    def mark_failure(self, index, message=''):
+        """Other errors: open the circuit after `failure_threshold` in a row"""
+        with self._lock:
+            state = self.states[index]
+            state.errors += 1
+            state.consecutive_failures += 1
+            state.last_error = message[:100]
+            if state.consecutive_failures >= self.failure_threshold:
+                extra = state.consecutive_failures - self.failure_threshold
+                cooldown = min(self.cooldown_seconds * (2 ** extra), self.max_cooldown_seconds)
+                state.cooldown_until = time.time() + cooldown
+                return cooldown
+            return 0
+
+    def invalid_indexes(self):
+        """Keys rejected by the provider"""
+        with self._lock:
+            return {s.index for s in self.states if s.invalid}
+
+    def reset(self, index=None):
+        """Bring one key (or all keys) back to healthy"""
+        with self._lock:
+            for state in self.states:
+                if index is None or state.index == index:
+                    state.invalid = False
+                    state.cooldown_until = 0.0
+                    state.consecutive_failures = 0
+                    state.rate_limit_strikes = 0
+
+    # ============================================
+    # Monitoring
+    # ============================================
+
+    def status(self):
+        """Snapshot of every key's health + bucket levels (keys are masked)"""
+        now = time.time()
+        buckets = self.limiter.status()
+        with self._lock:
+            keys = []
+            for state in self.states:
+                key_state = state.state(now)
+                keys.append({
+                    'key': state.index + 1,
+                    'masked': f"{state.key[:8]}...{state.key[-4:]}",
+                    'state': key_state,
+                    'cooldown_remaining': round(max(0.0, state.cooldown_until - now), 1) if key_state == COOLDOWN else 0,
+                    'consecutive_failures': state.consecutive_failures,
+                    'calls': state.calls,
+                    'successes': state.successes,
+                    'rate_limited': state.rate_limited,
+                    'errors': state.errors,
+                    'last_error': state.last_error,
+                    'requests_available': buckets[state.index]['requests_available'],
+                    'tokens_available': buckets[state.index]['tokens_available'],
+                })
+        return {
+            'total': len(keys),
+            'healthy': sum(1 for k in keys if k['state'] == HEALTHY),
+            'cooldown': sum(1 for k in keys if k['state'] == COOLDOWN),
+            'invalid': sum(1 for k in keys if k['state'] == INVALID),
+            'keys': keys,
+        }
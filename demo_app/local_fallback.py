@@ -0,0 +1,98 @@
+"""
+Local study materials - no AI call
+Used by admission control when the keys are out of capacity: keywords,
+flashcards and fill-in-the-blank MCQs are extracted from the content the
+client sent (the explanation it already has). Plainer than the AI versions,
+but same JSON shape, so the frontend renders them unchanged.
+"""
+
+import random
+import re
+from collections import Counter
+
+from .topic_index import STOPWORDS, fold_plural
+
+EXTRA_STOPWORDS = {
+    'also', 'be', 'been', 'by', 'can', 'from', 'has', 'have', 'into', 'more', 'most', 'not', 'or',
+    'other', 'such', 'than', 'their', 'there', 'these', 'they', 'through', 'used', 'using', 'was',
+    'were', 'when', 'where', 'which', 'while', 'will', 'would', 'each', 'many', 'some', 'very',
+    'what', 'how', 'why', 'who', 'example', 'examples', 'important', 'called', 'known', 'work', 'works',
+}
+TYPES = ['definition', 'keypoints', 'process']
+
+_SENTENCE = re.compile(r'(?<=[.!?])\s+')
+_WORD = re.compile(r"[A-Za-z][A-Za-z\-']{3,}")
+
+
+def _sentences(content):
+    text = re.sub(r'[#*_`>]+', ' ', content)  # markdown
+    return [s.strip() for s in _SENTENCE.split(' '.join(text.split())) if 40 <= len(s.strip()) <= 300]
+
+
+def key_terms(topic, content, count=6):
+    """[(term, sentence that uses it)] - most frequent content words not in the topic itself"""
+    topic_words = {fold_plural(w) for w in topic.lower().split()}
+    sentences = _sentences(content)
+    counts = Counter()
+    spelling = {}
+    for sentence in sentences:
+        for word in _WORD.findall(sentence):
+            folded = fold_plural(word.lower())
+            if folded in STOPWORDS or folded in EXTRA_STOPWORDS or folded in topic_words:
+                continue
+            counts[folded] += 1
+            spelling.setdefault(folded, word if not word.isupper() else word.lower())
+
+    terms = []
+    for folded, _ in counts.most_common():
+        sentence = next((s for s in sentences if re.search(rf'\b{re.escape(spelling[folded])}', s, re.I)), None)
+        if sentence:
+            terms.append((spelling[folded], sentence))
+        if len(terms) == count:
+            break
+    return terms
+
+
+def keywords(topic, content, count=6):
+    return [{'k': term.capitalize(), 'd': sentence[:120]} for term, sentence in key_terms(topic, content, count)]
+
+
+def flashcards(topic, content, count=6):
+    cards = []
+    for i, sentence in enumerate(_sentences(content)[:count]):
+        term = next((t for t, s in key_terms(topic, sentence, 1)), topic)
+        cards.append({'q': f"What does the explanation say about {term} in {topic}?", 'a': sentence,
+                      'type': TYPES[i % len(TYPES)]})
+    return cards
+
+
+def mcqs(topic, content, count=5):
+    """Fill-in-the-blank questions whose options are other key terms"""
+    terms = key_terms(topic, content, count + 3)
+    if len(terms) < 4:
+        return []
+    rng = random.Random(topic)
+    questions = []
+    for term, sentence in terms[:count]:
+        blanked = re.sub(rf'\b{re.escape(term)}\w*', '_____', sentence, flags=re.I)
+        options = [term] + rng.sample([t for t, _ in terms if t != term], 3)
+        rng.shuffle(options)
+        questions.append({
+            'q': f"Fill in the blank: {blanked}",
+            'opts': options,
+            'ans': options.index(term),
+            'explanation': sentence,
+        })
+    return questions
+
+
+BUILDERS = {'keywords': keywords, 'flashcards': flashcards, 'mcqs': mcqs}
+
+
+def build(field, topic, content):
+    """Items for 'flashcards' / 'mcqs' / 'keywords', or [] when the content is too thin"""
+    try:
+        return BUILDERS[field](topic, content or '')
+    except Exception as e:
+        print(f"⚠️ Local {field} fallback failed: {str(e)[:100]}")
+        return []
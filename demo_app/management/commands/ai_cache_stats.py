@@ -0,0 +1,75 @@
+"""
+Show AI cache metrics for every worker on this host (see demo_app/cache_metrics.py)
+
+    python manage.py ai_cache_stats --top 10
+    python manage.py ai_cache_stats --json
+    python manage.py ai_cache_stats --reset
+"""
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from demo_app.cache import cache_stats
+from demo_app.cache_metrics import reset_all, snapshot
+
+
+def _size(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f"{n:.0f} {unit}" if unit == 'B' else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+class Command(BaseCommand):
+    help = 'Show AI cache hit/miss/latency metrics and the hottest and largest keys'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10, help='How many hottest/largest keys to list')
+        parser.add_argument('--json', action='store_true', help='Print the raw JSON snapshot')
+        parser.add_argument('--reset', action='store_true', help='Discard all saved metrics')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            reset_all()
+            self.stdout.write(self.style.SUCCESS('🗑️ Cache metrics reset'))
+            return
+
+        metrics = snapshot(options['top'])
+        store = cache_stats()
+        if options['json']:
+            self.stdout.write(json.dumps({'cache': store, 'metrics': metrics}, indent=2))
+            return
+
+        counts = metrics['counts']
+        out = self.stdout.write
+        out('=' * 60)
+        out(f"📊 AI CACHE ({store['backend']}): {store['count']} entries, {store['size_mb']} MB "
+            f"- {metrics['processes']} worker snapshot(s)")
+        out('=' * 60)
+        out(f"Lookups:     {counts['lookups']}  (hit ratio {metrics['hit_ratio']:.1%}, "
+            f"fresh {metrics['fresh_hit_ratio']:.1%})")
+        out(f"Hits:        {counts['hits']} fresh, {counts['stale_hits']} stale")
+        out(f"Misses:      {counts['misses']} missing, {counts['expired']} expired")
+        out(f"Failures:    {counts['negative_hits']} served from the negative cache")
+        out(f"Writes:      {counts['sets']}  ({counts['generations']} generations)")
+        out(f"Evictions:   {counts['evictions']} from memory, {counts['purged']} expired rows purged")
+        out(f"Bytes:       {_size(counts['bytes_read'])} read, {_size(counts['bytes_written'])} written")
+        out(f"Time saved:  {metrics['generation_seconds_saved']}s of generation")
+
+        out('\n⏱️ Latency (ms)         count     mean      p50      p95      p99      max')
+        for name, summary in metrics['latency'].items():
+            out(f"   {name:<18} {summary['count']:>8} {summary['mean_ms']:>8.2f} {summary['p50_ms']:>8.2f} "
+                f"{summary['p95_ms']:>8.2f} {summary['p99_ms']:>8.2f} {summary['max_ms']:>8.2f}")
+
+        if metrics['generation_by_kind']:
+            out('\n⚙️ Generation by kind')
+            for kind, data in metrics['generation_by_kind'].items():
+                out(f"   {kind:<14} {data['generations']:>6} x {data['mean_ms'] / 1000:.1f}s")
+
+        out('\n🔥 Hottest keys')
+        for row in metrics['hottest_keys']:
+            out(f"   {row['hits']:>7}  {row['key']}")
+        out('\n📦 Largest keys')
+        for row in metrics['largest_keys']:
+            out(f"   {_size(row['bytes']):>9}  {row['key']}")
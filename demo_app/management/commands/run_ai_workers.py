@@ -0,0 +1,56 @@
+"""
+Process queued AI generation jobs (see demo_app/job_queue.py)
+
+    python manage.py run_ai_workers --workers 4
+"""
+
+import os
+import signal
+import socket
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from demo_app.job_queue import requeue_stale_jobs, work
+
+
+class Command(BaseCommand):
+    help = 'Run a pool of background workers for queued AI generation jobs'
+
+    def add_arguments(self, parser):
+        config = getattr(settings, 'AI_JOBS', {})
+        parser.add_argument('--workers', type=int, default=config.get('workers', 4),
+                            help='Worker threads in this process')
+        parser.add_argument('--poll', type=float, default=config.get('poll_interval', 1.0),
+                            help='Seconds between queue checks when idle')
+
+    def handle(self, *args, **options):
+        stop_event = threading.Event()
+
+        def shutdown(signum, frame):
+            self.stdout.write('🛑 Stopping workers after their current job...')
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        requeue_stale_jobs()
+
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        threads = [
+            threading.Thread(target=work, args=(f"{prefix}:{i + 1}", stop_event, options['poll']),
+                             name=f"ai-worker-{i + 1}")
+            for i in range(options['workers'])
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(self.style.SUCCESS(f"⚙️ {len(threads)} AI worker(s) running ({prefix})"))
+
+        # Main thread: periodically recover jobs from crashed workers
+        while not stop_event.wait(60):
+            requeue_stale_jobs()
+
+        for thread in threads:
+            thread.join()
+        self.stdout.write(self.style.SUCCESS('✅ Workers stopped'))
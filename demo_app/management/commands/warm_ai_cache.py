@@ -0,0 +1,75 @@
+"""
+Pre-generate the most searched topics (see demo_app/cache_warming.py)
+
+    python manage.py warm_ai_cache --top 100 --days 7 --workers 2
+    python manage.py warm_ai_cache --dry-run        # just show what would be warmed
+"""
+
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from demo_app.cache_warming import warm
+
+
+class Command(BaseCommand):
+    help = 'Warm the AI cache with the most searched topics from SearchHistory'
+
+    def add_arguments(self, parser):
+        config = getattr(settings, 'AI_CACHE_WARMING', {})
+        parser.add_argument('--top', type=int, default=config.get('top', 50),
+                            help='How many of the most searched topics to warm')
+        parser.add_argument('--days', type=int, default=config.get('days', 7),
+                            help='Popularity window in days')
+        parser.add_argument('--workers', type=int, default=config.get('workers', 2),
+                            help='Topics generated at the same time')
+        parser.add_argument('--min-fresh-hours', type=float, default=config.get('min_fresh_hours', 0),
+                            help='Also regenerate entries that go stale within this many hours')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Generate at most this many topics in this run')
+        parser.add_argument('--reserve', type=int, default=config.get('reserve_per_key', 1),
+                            help='Requests per key per minute left free for live traffic')
+        parser.add_argument('--max-wait', type=int, default=config.get('max_wait', 120),
+                            help='Give up after waiting this many seconds for key capacity')
+        parser.add_argument('--no-story', action='store_true', help='Skip the story part')
+        parser.add_argument('--checkpoint', default=None, help='Checkpoint file path')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+        parser.add_argument('--dry-run', action='store_true', help='List the topics without generating')
+
+    def handle(self, *args, **options):
+        stop_event = threading.Event()
+
+        def shutdown(signum, frame):
+            self.stdout.write('🛑 Stopping after the topics in progress (progress is checkpointed)...')
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        summary = warm(
+            top=options['top'],
+            days=options['days'],
+            workers=max(1, options['workers']),
+            include_story=not options['no_story'],
+            min_fresh_hours=options['min_fresh_hours'],
+            max_topics=options['limit'],
+            reserve=options['reserve'],
+            max_wait=options['max_wait'],
+            checkpoint_path=options['checkpoint'],
+            restart=options['restart'],
+            dry_run=options['dry_run'],
+            stop_event=stop_event,
+        )
+
+        if options['dry_run']:
+            for topic in summary['topics']:
+                self.stdout.write(f"  • {topic}")
+
+        style = self.style.WARNING if summary['stopped'] or summary['failed'] else self.style.SUCCESS
+        self.stdout.write(style(
+            f"🔥 Warm-up: {summary['warmed']} warmed, {summary['fresh']} already fresh, "
+            f"{summary['failed']} failed, {summary['remaining']} remaining "
+            f"(of {summary['planned']} popular topics)"
+        ))
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demo_app', '0003_generationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuotaUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key_id', models.CharField(max_length=16)),
+                ('model', models.CharField(max_length=100)),
+                ('day', models.DateField()),
+                ('calls', models.IntegerField(default=0)),
+                ('errors', models.IntegerField(default=0)),
+                ('rate_limited', models.IntegerField(default=0)),
+                ('prompt_tokens', models.BigIntegerField(default=0)),
+                ('output_tokens', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'AI Quota Usage',
+                'verbose_name_plural': 'AI Quota Usage',
+                'db_table': 'ai_quota_usage',
+                'ordering': ['-day', 'key_id', 'model'],
+                'unique_together': {('key_id', 'model', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,127 @@
+"""
+Lazy model discovery with a local file cache
+Nothing here runs at import time:
+- first use reads ai_cache/meta/models.json (written by a previous run)
+- a fresh file is used as-is, a stale one is used immediately and
+  refreshed in a background thread
+- only when there is no file at all does the first caller hit the network
+If the network is down, the last known model list keeps working.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+DEFAULT_MODEL_CACHE_FILE = Path(__file__).parent / 'ai_cache' / 'meta' / 'models.json'
+
+_models = None
+_models_fetched_at = 0.0
+_lock = threading.Lock()
+_discover_lock = threading.Lock()
+_refreshing = threading.Event()
+
+
+def _cache_file():
+    return Path(getattr(settings, 'AI_MODEL_CACHE', {}).get('path') or DEFAULT_MODEL_CACHE_FILE)
+
+
+def _ttl_seconds():
+    return getattr(settings, 'AI_MODEL_CACHE', {}).get('ttl_hours', 24) * 3600
+
+
+def _read_cache_file(provider_name):
+    """Return (models, fetched_at) from disk, or (None, 0) if missing/unusable"""
+    try:
+        with open(_cache_file(), 'r') as f:
+            cache_data = json.load(f)
+        if cache_data.get('provider') != provider_name or not cache_data.get('models'):
+            return None, 0.0
+        return cache_data['models'], float(cache_data['fetched_at'])
+    except (OSError, ValueError, KeyError):
+        return None, 0.0
+
+
+def _write_cache_file(provider_name, models, fetched_at):
+    """Atomic write so concurrent workers never read half a file"""
+    cache_file = _cache_file()
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump({'provider': provider_name, 'fetched_at': fetched_at, 'models': models}, f)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        print(f"⚠️ Model cache write error: {e}")
+
+
+def _discover(fetch, provider_name):
+    """Call the provider, persist the result; returns the model list (or None on failure)"""
+    global _models, _models_fetched_at
+    models = fetch()
+    if not models:
+        return None
+    fetched_at = time.time()
+    with _lock:
+        _models, _models_fetched_at = models, fetched_at
+    _write_cache_file(provider_name, models, fetched_at)
+    print(f"🔍 Discovered {len(models)} model(s)")
+    return models
+
+
+def _refresh_in_background(fetch, provider_name):
+    """At most one background refresh per process"""
+    if _refreshing.is_set():
+        return
+    _refreshing.set()
+
+    def run():
+        try:
+            _discover(fetch, provider_name)
+        except Exception as e:
+            print(f"⚠️ Background model refresh failed: {str(e)[:100]}")
+        finally:
+            _refreshing.clear()
+
+    threading.Thread(target=run, name='model-discovery', daemon=True).start()
+
+
+def get_available_models(fetch, provider_name):
+    """
+    Model names for provider_name.
+    fetch: zero-arg callable doing the real (network) listing, only called when needed.
+    """
+    global _models, _models_fetched_at
+
+    with _lock:
+        models, fetched_at = _models, _models_fetched_at
+
+    if models is None:
+        models, fetched_at = _read_cache_file(provider_name)
+        if models is not None:
+            with _lock:
+                _models, _models_fetched_at = models, fetched_at
+
+    if models is None:
+        # Cold start with no cache file: one caller pays for discovery, the rest wait for it
+        with _discover_lock:
+            with _lock:
+                models = _models
+            if models is None:
+                models = _discover(fetch, provider_name)
+        return models or []
+
+    if time.time() - fetched_at > _ttl_seconds():
+        _refresh_in_background(fetch, provider_name)
+
+    return models
+
+
+def invalidate():
+    """Forget the in-memory list (next call re-reads the file)"""
+    global _models, _models_fetched_at
+    with _lock:
+        _models, _models_fetched_at = None, 0.0
@@ -0,0 +1,222 @@
+"""
+Model routing - which model answers which kind of request
+find_working_model() picks one AI_MODEL; the router picks per task instead
+(settings.AI_MODEL_ROUTING['tasks']): each task lists candidate models in
+order of preference, matched against the discovered model list.
+
+Configured names must match a discovered model exactly, or one of their
+AI_MODEL_ROUTING['aliases'] (e.g. a pinned "-001" version). Prefixes are not
+guessed - "gemini-2.5-flash" must never quietly become "gemini-2.5-flash-lite".
+Names that resolve to nothing are skipped and logged once per process.
+
+- 'ordered' tasks (explanation, story) use the first healthy candidate -
+  quality first, the rest are fallbacks
+- 'fastest' tasks (flashcards, MCQs, keywords, the materials batch) use the
+  candidate with the lowest EWMA latency for that task; candidates within
+  latency_tolerance of it count as ties and the cheapest of those wins.
+  Candidates without a sample yet are tried first, so each gets measured.
+
+Every call's latency, outcome and tokens feed the stats. A model with
+failure_threshold consecutive failures, or an EWMA error rate above
+max_error_rate, is cooled down for cooldown_seconds: it moves to the end of
+every route until then, and call_ai_with_retry falls back to the next
+candidate on each retry. Stats are per process (like the key pool).
+"""
+
+import threading
+import time
+
+from django.conf import settings
+
+TASKS = ('explanation', 'story', 'flashcards', 'mcqs', 'keywords', 'materials')
+
+
+def _config():
+    return getattr(settings, 'AI_MODEL_ROUTING', {})
+
+
+def resolve(name, available):
+    """The discovered model a configured name refers to (exact, else its first available alias) or None"""
+    if name in available:
+        return name
+    for alias in _config().get('aliases', {}).get(name, ()):
+        if alias in available:
+            return alias
+    return None
+
+
+def price(model):
+    """(input, output) USD per 1M tokens from AI_MODEL_ROUTING['costs'] - (0, 0) if unknown"""
+    costs = _config().get('costs', {})
+    for name in sorted(costs, key=len, reverse=True):  # longest name first: '...-flash-lite' before '...-flash'
+        if model.startswith(name):
+            return tuple(costs[name])
+    return (0.0, 0.0)
+
+
+class ModelStats:
+    """Live numbers for one model"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.error_rate = 0.0  # EWMA of 0/1 outcomes
+        self.latency = {}  # task -> EWMA seconds of successful calls
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+        self.cooldown_until = 0.0
+        self.last_error = ''
+
+    def cooling_down(self, now):
+        return now < self.cooldown_until
+
+    def as_dict(self, model, now):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'error_rate': round(self.error_rate, 3),
+            'latency_ewma': {task: round(seconds, 3) for task, seconds in self.latency.items()},
+            'prompt_tokens': self.prompt_tokens,
+            'output_tokens': self.output_tokens,
+            'cost_usd': round(self.cost, 6),
+            'price_per_1m': price(model),
+            'cooldown_remaining': round(max(0.0, self.cooldown_until - now), 1),
+            'last_error': self.last_error,
+        }
+
+
+class ModelRouter:
+    """Routes tasks to models and keeps the per-model stats (see module docstring)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._unavailable = set()  # configured names already reported missing
+
+    def _get(self, model):
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats[model] = ModelStats()
+        return stats
+
+    # ============================================
+    # Routing
+    # ============================================
+
+    def candidates(self, task, available):
+        """Configured candidates for task that exist in `available`, in config order"""
+        spec = _config().get('tasks', {}).get(task) or {}
+        resolved = []
+        for name in spec.get('models', ()):
+            model = resolve(name, available)
+            if model is None:
+                self._report_unavailable(task, name, available)
+            elif model not in resolved:
+                resolved.append(model)
+        return resolved
+
+    def _report_unavailable(self, task, name, available):
+        if not available:
+            return  # discovery hasn't run (or failed) - nothing to compare against
+        with self._lock:
+            if name in self._unavailable:
+                return
+            self._unavailable.add(name)
+        print(f"⚠️ Model '{name}' (task '{task}') is not available - skipped. "
+              f"Add it to AI_MODEL_ROUTING['aliases'] if it goes by another name")
+
+    def pool(self, task, available, default=None):
+        """Every model route() can pick for task, in config order - [default] when routing is off"""
+        if not _config().get('enabled', True) or task is None:
+            return [default] if default else []
+        return self.candidates(task, available) or ([default] if default else [])
+
+    def route(self, task, available, default=None, exclude=()):
+        """
+        Models to try for task, best first. Models in `exclude` (already failed
+        for this request) and cooling-down ones go last. Falls back to [default]
+        when routing is off or no candidate is available.
+        """
+        if not _config().get('enabled', True) or task is None:
+            return [default] if default else []
+        candidates = self.candidates(task, available)
+        if not candidates:
+            return [default] if default else []
+
+        now = time.monotonic()
+        strategy = (_config().get('tasks', {}).get(task) or {}).get('strategy', 'ordered')
+        with self._lock:
+            healthy = [m for m in candidates if not self._get(m).cooling_down(now)]
+            cooling = sorted((m for m in candidates if m not in healthy), key=lambda m: self._get(m).cooldown_until)
+            if strategy == 'fastest':
+                healthy = self._by_speed(task, healthy)
+        ordered = healthy + cooling
+        return [m for m in ordered if m not in exclude] + [m for m in ordered if m in exclude]
+
+    def _by_speed(self, task, models):
+        """Unmeasured first (config order), then fastest - near-ties go to the cheaper model"""
+        unmeasured = [m for m in models if task not in self._get(m).latency]
+        measured = sorted((m for m in models if m not in unmeasured), key=lambda m: self._get(m).latency[task])
+        if not measured:
+            return unmeasured
+        tolerance = 1 + _config().get('latency_tolerance', 0.2)
+        fastest = self._get(measured[0]).latency[task]
+        ties = [m for m in measured if self._get(m).latency[task] <= fastest * tolerance]
+        ties.sort(key=lambda m: sum(price(m)))
+        return unmeasured + ties + [m for m in measured if m not in ties]
+
+    # ============================================
+    # Recording
+    # ============================================
+
+    def record(self, model, task, seconds, ok, prompt_tokens=0, output_tokens=0, error=''):
+        """One finished provider call"""
+        if not model:
+            return
+        alpha = _config().get('ewma_alpha', 0.2)
+        now = time.monotonic()
+        with self._lock:
+            stats = self._get(model)
+            stats.calls += 1
+            stats.error_rate += alpha * ((0.0 if ok else 1.0) - stats.error_rate)
+            if ok:
+                stats.consecutive_failures = 0
+                if task:
+                    previous = stats.latency.get(task)
+                    stats.latency[task] = seconds if previous is None else previous + alpha * (seconds - previous)
+                stats.prompt_tokens += prompt_tokens
+                stats.output_tokens += output_tokens
+                input_price, output_price = price(model)
+                stats.cost += (prompt_tokens * input_price + output_tokens * output_price) / 1_000_000
+                return
+
+            stats.errors += 1
+            stats.consecutive_failures += 1
+            stats.last_error = str(error)[:100]
+            if (stats.consecutive_failures >= _config().get('failure_threshold', 3)
+                    or (stats.calls >= _config().get('min_samples', 5)
+                        and stats.error_rate > _config().get('max_error_rate', 0.5))):
+                stats.cooldown_until = now + _config().get('cooldown_seconds', 60)
+                print(f"🧭 Model {model} degraded - routing around it for {_config().get('cooldown_seconds', 60)}s")
+
+    # ============================================
+    # Monitoring
+    # ============================================
+
+    def table(self, available, default=None):
+        """{task: {'strategy', 'candidates', 'route'}} as it stands right now"""
+        table = {}
+        for task, spec in _config().get('tasks', {}).items():
+            table[task] = {
+                'strategy': spec.get('strategy', 'ordered'),
+                'candidates': self.candidates(task, available),
+                'route': self.route(task, available, default),
+            }
+        return table
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {model: stats.as_dict(model, now) for model, stats in self._stats.items()}
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from datetime import date
+import uuid
 
 # ============================================
 # Search History - Stores all user searches
@@ -78,4 +79,79 @@ class StudyStreakLog(models.Model):
         unique_together = ['user', 'date']  # Prevent duplicate entries
 
     def __str__(self):
-        return f"{self.user.username} - {self.date}"
\ No newline at end of file
+        return f"{self.user.username} - {self.date}"
+
+# ============================================
+# AI Generation Jobs - DB-backed work queue
+# ============================================
+class GenerationJob(models.Model):
+    """
+    One all-in-one generation run outside the HTTP request.
+    Web views enqueue, `manage.py run_ai_workers` processes,
+    clients poll /ai/jobs/<id>/ for partial and final results.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    topic = models.CharField(max_length=255)
+    content = models.TextField(blank=True, default='')
+    include_story = models.BooleanField(default=True)
+    cache_key = models.CharField(max_length=300, db_index=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    partial = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    version = models.IntegerField(default=0)  # bumped on every progress update (long-poll)
+    attempts = models.IntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'generation_jobs'
+        ordering = ['created_at']
+        verbose_name = 'Generation Job'
+        verbose_name_plural = 'Generation Jobs'
+
+    def __str__(self):
+        return f"{self.topic} - {self.status}"
+
+
+# ============================================
+# AI Quota Ledger - calls/tokens per key, model and day
+# ============================================
+class QuotaUsage(models.Model):
+    """
+    Daily usage of one API key on one model, shared by every worker and node.
+    Rows are only changed with F() increments (see demo_app/quota.py).
+    """
+    key_id = models.CharField(max_length=16)  # sha256 prefix - the key itself is never stored
+    model = models.CharField(max_length=100)
+    day = models.DateField()  # in the provider's quota timezone
+    calls = models.IntegerField(default=0)
+    errors = models.IntegerField(default=0)
+    rate_limited = models.IntegerField(default=0)
+    prompt_tokens = models.BigIntegerField(default=0)
+    output_tokens = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'ai_quota_usage'
+        ordering = ['-day', 'key_id', 'model']
+        unique_together = ['key_id', 'model', 'day']
+        verbose_name = 'AI Quota Usage'
+        verbose_name_plural = 'AI Quota Usage'
+
+    def __str__(self):
+        return f"{self.day} {self.key_id} {self.model} - {self.calls} calls"
@@ -0,0 +1,201 @@
+"""
+Quota ledger - AI calls and tokens per API key, model and day
+Every provider call is recorded here (prompt/output tokens come from the
+response's usage metadata). Counts are buffered in memory and flushed by a
+background thread with atomic F() increments into QuotaUsage, so every worker
+and node reads the same daily totals and nothing touches the DB on the hot path.
+
+Days follow the provider's quota reset (midnight Pacific for Gemini), and
+the daily limit is each key's requests-per-day (AI_RATE_LIMITS['rpd'],
+SMARTLEARN_API_KEY_<n>_RPD per key).
+"""
+
+import atexit
+import hashlib
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+FIELDS = ('calls', 'errors', 'rate_limited', 'prompt_tokens', 'output_tokens')
+
+
+def _config():
+    return getattr(settings, 'AI_QUOTA', {})
+
+
+def key_id(api_key):
+    """Stable id for a key across processes/nodes (never store the key itself)"""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+def quota_zone():
+    """Timezone the provider's daily quota resets in"""
+    return ZoneInfo(_config().get('timezone', 'America/Los_Angeles'))
+
+
+def quota_day():
+    """Today in the quota timezone"""
+    return datetime.now(quota_zone()).date()
+
+
+class QuotaLedger:
+    """
+    keys:         API key strings (same order as the key pool)
+    daily_limits: requests per day for each key
+    """
+
+    def __init__(self, keys, daily_limits, flush_seconds=2, read_cache_seconds=2):
+        self.key_ids = [key_id(key) for key in keys]
+        self.daily_limits = list(daily_limits)
+        self.flush_seconds = flush_seconds
+        self.read_cache_seconds = read_cache_seconds
+        self._lock = threading.Lock()
+        self._pending = {}  # (key_id, model, day) -> Counter
+        self._flushing = {}  # taken by flush() but maybe not written yet - still counted by readers
+        self._read = (0.0, None, {})  # (read at, day, {(key_id, model): Counter})
+        self._thread = None
+        self._stop = None  # set to end the current flush thread
+
+    # ============================================
+    # Recording
+    # ============================================
+
+    def record(self, key_index, model, calls=1, errors=0, rate_limited=0, prompt_tokens=0, output_tokens=0):
+        """Count one provider call (never blocks on the database)"""
+        row = (self.key_ids[key_index], model or 'unknown', quota_day())
+        with self._lock:
+            counts = self._pending.setdefault(row, Counter())
+            counts.update({'calls': calls, 'errors': errors, 'rate_limited': rate_limited,
+                           'prompt_tokens': prompt_tokens, 'output_tokens': output_tokens})
+            if self._thread is None:
+                self._stop = threading.Event()
+                self._thread = threading.Thread(target=self._run, args=(self._stop,), name='ai-quota-flush', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def _run(self, stop):
+        while not stop.wait(self.flush_seconds):
+            self.flush()
+            close_old_connections()
+        close_old_connections()
+
+    def stop(self):
+        """Stop the flush thread and write what is still buffered (the next record() starts a new thread)"""
+        with self._lock:
+            thread, stop, self._thread, self._stop = self._thread, self._stop, None, None
+        if thread is not None:
+            atexit.unregister(self.stop)
+            stop.set()
+            thread.join()
+        self.flush()
+
+    def flush(self):
+        """Write buffered counts to the database; failed rows are kept for the next flush"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushing = pending
+        for (key, model, day), counts in pending.items():
+            try:
+                self._apply(key, model, day, counts)
+            except Exception as e:
+                print(f"⚠️ Quota ledger write error: {str(e)[:100]}")
+                with self._lock:
+                    self._pending.setdefault((key, model, day), Counter()).update(counts)
+        with self._lock:
+            self._flushing = {}
+            if pending:
+                self._read = (0.0, None, {})
+
+    def _apply(self, key, model, day, counts):
+        from .models import QuotaUsage
+        increments = {field: F(field) + counts[field] for field in FIELDS if counts[field]}
+        rows = QuotaUsage.objects.filter(key_id=key, model=model, day=day)
+        if rows.update(updated_at=timezone.now(), **increments):
+            return
+        try:
+            with transaction.atomic():
+                QuotaUsage.objects.create(key_id=key, model=model, day=day,
+                                          **{field: counts[field] for field in FIELDS})
+        except IntegrityError:
+            # Another worker created today's row first
+            rows.update(updated_at=timezone.now(), **increments)
+
+    # ============================================
+    # Reading
+    # ============================================
+
+    def _usage(self):
+        """{(key_id, model): Counter} for today - database (cached briefly) + unflushed counts"""
+        day = quota_day()
+        read_at, read_day, stored = self._read
+        if read_day != day or time.monotonic() - read_at > self.read_cache_seconds:
+            from .models import QuotaUsage
+            stored = {}
+            try:
+                rows = (QuotaUsage.objects.filter(day=day, key_id__in=self.key_ids)
+                        .values('key_id', 'model').annotate(**{field: Sum(field) for field in FIELDS}))
+                for row in rows:
+                    stored[(row['key_id'], row['model'])] = Counter({field: row[field] for field in FIELDS})
+            except Exception as e:
+                print(f"⚠️ Quota ledger read error: {str(e)[:100]}")
+            self._read = (time.monotonic(), day, stored)
+
+        usage = {row: Counter(counts) for row, counts in stored.items()}
+        with self._lock:
+            for (key, model, pending_day), counts in list(self._pending.items()) + list(self._flushing.items()):
+                if pending_day == day:
+                    usage.setdefault((key, model), Counter()).update(counts)
+        return usage
+
+    def key_remaining(self, unusable=()):
+        """Calls each key can still make today (0 for unusable keys)"""
+        used = Counter()
+        for (key, _), counts in self._usage().items():
+            used[key] += counts['calls']
+        return [0 if index in unusable else max(0, limit - used[self.key_ids[index]])
+                for index, limit in enumerate(self.daily_limits)]
+
+    def quota_info(self, unusable=()):
+        """Today's totals: calls_made / quota_limit / remaining / usage_percent + tokens"""
+        usage = self._usage()
+        totals = Counter()
+        for counts in usage.values():
+            totals.update(counts)
+        remaining = self.key_remaining(unusable)
+        limit = sum(limit for index, limit in enumerate(self.daily_limits) if index not in unusable)
+        return {
+            'calls_made': totals['calls'],
+            'quota_limit': limit,
+            'remaining': sum(remaining),
+            'usage_percent': round(100.0 * totals['calls'] / limit, 1) if limit else 100.0,
+            'prompt_tokens': totals['prompt_tokens'],
+            'output_tokens': totals['output_tokens'],
+            'day': quota_day().isoformat(),
+        }
+
+    def status(self, unusable=()):
+        """quota_info() plus per-key and per-model breakdowns (for monitoring)"""
+        usage = self._usage()
+        remaining = self.key_remaining(unusable)
+        keys = []
+        for index, key in enumerate(self.key_ids):
+            counts = Counter()
+            for (row_key, _), row_counts in usage.items():
+                if row_key == key:
+                    counts.update(row_counts)
+            keys.append({'key': index + 1, 'key_id': key, 'limit': self.daily_limits[index],
+                         'remaining': remaining[index], **{field: counts[field] for field in FIELDS}})
+        models = {}
+        for (_, model), counts in usage.items():
+            models.setdefault(model, Counter()).update(counts)
+        info = self.quota_info(unusable)
+        info['keys'] = keys
+        info['models'] = {model: {field: counts[field] for field in FIELDS} for model, counts in models.items()}
+        return info
@@ -0,0 +1,162 @@
+"""
+Per-key token-bucket rate limiting for AI calls
+Each API key gets two buckets (requests per minute + tokens per minute)
+sized from that key's real limits. Calls are dispatched to whichever
+key has capacity, so N keys give roughly N x the throughput.
+Thread-safe: one lock guards all buckets of a limiter.
+"""
+
+import threading
+import time
+
+
+# ============================================
+# Token Bucket
+# ============================================
+
+class TokenBucket:
+    """Classic token bucket: `capacity` tokens, refilled at `rate` tokens/second"""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` tokens are available (0 if available now)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        if self.rate <= 0:
+            return float('inf')
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+    def give(self, amount):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+# ============================================
+# Per-Key Limiter
+# ============================================
+
+class KeyRateLimiter:
+    """
+    RPM + TPM buckets for every API key.
+    limits: list of {'rpm': int, 'tpm': int} dicts, one per key (same order as API_KEYS)
+    """
+
+    def __init__(self, limits):
+        self._lock = threading.Lock()
+        self._next = 0
+        self.limits = [dict(limit) for limit in limits]
+        self.buckets = [
+            {
+                'rpm': TokenBucket(limit['rpm'] / 60.0, limit['rpm']),
+                'tpm': TokenBucket(limit['tpm'] / 60.0, limit['tpm']),
+            }
+            for limit in self.limits
+        ]
+
+    def __len__(self):
+        return len(self.buckets)
+
+    def try_acquire(self, tokens=0, exclude=()):
+        """
+        Reserve one request + `tokens` on the first key with capacity.
+        Returns (key_index, 0.0) on success or (None, seconds_to_wait).
+        Keys are scanned round-robin so load spreads evenly.
+        """
+        with self._lock:
+            now = time.monotonic()
+            count = len(self.buckets)
+            candidates = [i for i in range(count) if i not in exclude] or list(range(count))
+            start = self._next
+            shortest = float('inf')
+
+            for offset in range(count):
+                index = (start + offset) % count
+                if index not in candidates:
+                    continue
+                buckets = self.buckets[index]
+                wait = max(buckets['rpm'].wait_time(1, now), buckets['tpm'].wait_time(tokens, now))
+                if wait == 0:
+                    buckets['rpm'].take(1)
+                    buckets['tpm'].take(tokens)
+                    self._next = (index + 1) % count
+                    return index, 0.0
+                shortest = min(shortest, wait)
+
+            return None, shortest
+
+    def acquire(self, tokens=0, exclude=(), timeout=None):
+        """Block until some key has capacity; returns its index (None on timeout)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            index, wait = self.try_acquire(tokens, exclude)
+            if index is not None:
+                return index
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                wait = min(wait, remaining)
+            # Sleep outside the lock so other threads can dispatch to other keys
+            time.sleep(min(wait, 1.0))
+
+    def capacity(self, tokens=0, indexes=None):
+        """
+        (requests that could start right now, seconds until the next one could)
+        over the given keys - nothing is reserved.
+        """
+        with self._lock:
+            now = time.monotonic()
+            available = 0
+            shortest = float('inf')
+            for index in range(len(self.buckets)) if indexes is None else indexes:
+                buckets = self.buckets[index]
+                wait = max(buckets['rpm'].wait_time(1, now), buckets['tpm'].wait_time(tokens, now))
+                if wait == 0:
+                    by_tokens = int(buckets['tpm'].tokens // tokens) if tokens else int(buckets['rpm'].tokens)
+                    available += max(1, min(int(buckets['rpm'].tokens), by_tokens))
+                shortest = min(shortest, wait)
+            return available, shortest
+
+    def settle(self, key_index, reserved_tokens, used_tokens):
+        """Refund over-estimated tokens once the real usage is known"""
+        refund = reserved_tokens - used_tokens
+        if refund > 0:
+            with self._lock:
+                self.buckets[key_index]['tpm'].give(refund)
+
+    def status(self):
+        """Current bucket levels per key (for monitoring)"""
+        with self._lock:
+            now = time.monotonic()
+            result = []
+            for index, buckets in enumerate(self.buckets):
+                buckets['rpm']._refill(now)
+                buckets['tpm']._refill(now)
+                result.append({
+                    'key': index + 1,
+                    'rpm_limit': self.limits[index]['rpm'],
+                    'tpm_limit': self.limits[index]['tpm'],
+                    'requests_available': int(buckets['rpm'].tokens),
+                    'tokens_available': int(buckets['tpm'].tokens),
+                })
+            return result
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token)"""
+    return len(text or '') // 4 + 1
@@ -0,0 +1,179 @@
+"""
+Response cache for AI views
+@cache_ai_response stores the JSON body of a successful GET in the AI cache,
+keyed on the normalized inputs, the models the view's task can be routed to
+(see model_router.py) and a prompt-template version, so a repeated request
+never reaches the AI provider. Which of those models answered is not part of
+the key - a cooldown moving the route to a fallback must not empty the cache -
+but changing the task's configured models does start fresh entries.
+
+Every response carries an ETag and Cache-Control; a browser revalidating
+with If-None-Match gets a 304 without the body.
+
+    @cache_ai_response('story_view', topic_param='concept', params={'tone': 'simple'}, version=1, task='story')
+    def generate_story(request): ...
+
+Works on sync and async views. Bump `version` when the view's prompt changes.
+Another view answering the same request (e.g. the SSE stream of /ai/) shares
+its entries through cached_view_response / store_view_response.
+"""
+
+import asyncio
+import functools
+import hashlib
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponseNotModified, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+
+from .cache import get_cache_key, load_from_cache, save_to_cache, aload_from_cache, asave_to_cache
+
+ERROR_PREFIXES = ('Error', 'Failed', "I couldn't", 'Please enter')
+
+
+def _config():
+    return getattr(settings, 'AI_RESPONSE_CACHE', {})
+
+
+def _normalize(value):
+    return ' '.join(value.lower().split())
+
+
+def _cacheable(response, body):
+    """Only successful answers are cached - never error text or degraded answers returned with a 200"""
+    if response.status_code != 200 or not isinstance(body, dict) or 'degraded' in body:
+        return False
+    return not any(isinstance(v, str) and (not v.strip() or v.startswith(ERROR_PREFIXES)) for v in body.values())
+
+
+def _task_models(task):
+    from . import Smart_api
+    return '+'.join(Smart_api.task_models(task)) or 'none'
+
+
+def response_key(name, version, topic, params, model):
+    """<canonical topic>__<name>_v<version>_<hash of the other params + the models that may answer>"""
+    variant = json.dumps({'params': params, 'model': model}, sort_keys=True)
+    return f"{get_cache_key(topic)}__{name}_v{version}_{hashlib.sha256(variant.encode()).hexdigest()[:16]}"
+
+
+def _request_key(request, name, version, topic_param, params, model):
+    """Cache key for this request, or None when it shouldn't be cached"""
+    if request.method != 'GET' or not _config().get('enabled', True):
+        return None
+    topic = request.GET.get(topic_param, '').strip()
+    if not topic:
+        return None
+    values = {param: _normalize(request.GET.get(param, '') or default) for param, default in params.items()}
+    return response_key(name, version, topic, values, model)
+
+
+def _not_modified(request, etag):
+    return etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+
+
+def _with_headers(response, etag, hit):
+    response['ETag'] = etag
+    response['X-Cache'] = 'HIT' if hit else 'MISS'
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=_config().get('max_age', 300),
+        stale_while_revalidate=_config().get('stale_while_revalidate', 3600),
+    )
+    return response
+
+
+def _cached_response(request, cached):
+    if _not_modified(request, cached['etag']):
+        return _with_headers(HttpResponseNotModified(), cached['etag'], hit=True)
+    return _with_headers(JsonResponse(cached['body']), cached['etag'], hit=True)
+
+
+def _store(response):
+    """(entry to cache, etag) for a fresh response, or (None, None) if it can't be cached"""
+    try:
+        body = json.loads(response.content)
+    except (ValueError, AttributeError):
+        return None, None
+    if not _cacheable(response, body):
+        patch_cache_control(response, no_store=True)
+        return None, None
+    etag = quote_etag(hashlib.sha256(response.content).hexdigest()[:32])
+    return {'body': body, 'etag': etag}, etag
+
+
+def cached_view_response(request, name, topic_param, params=None, version=1, task=None):
+    """Body the cache_ai_response(name, ...) view has cached for this request, or None"""
+    cache_key = _request_key(request, name, version, topic_param, params or {}, _task_models(task))
+    cached = load_from_cache(cache_key) if cache_key else None
+    return cached['body'] if cached else None
+
+
+def store_view_response(request, body, name, topic_param, params=None, version=1, task=None):
+    """Cache `body` as the cache_ai_response(name, ...) view's response to this request"""
+    cache_key = _request_key(request, name, version, topic_param, params or {}, _task_models(task))
+    entry, _ = _store(JsonResponse(body))
+    if cache_key and entry:
+        save_to_cache(cache_key, entry, ttl_hours=_config().get('ttl_hours', 72))
+
+
+async def acached_view_response(request, name, topic_param, params=None, version=1, task=None):
+    return await sync_to_async(cached_view_response)(request, name, topic_param, params, version, task)
+
+
+async def astore_view_response(request, body, name, topic_param, params=None, version=1, task=None):
+    await sync_to_async(store_view_response)(request, body, name, topic_param, params, version, task)
+
+
+def cache_ai_response(name, topic_param, params=None, version=1, task=None):
+    """
+    name:        cache namespace for the view (e.g. 'ai_view')
+    topic_param: GET parameter holding the topic/prompt - normalized like every cache key,
+                 so "Photosynthesis" and "what is photosynthesis?" share one entry
+    params:      other GET parameters in the key, {name: default} (missing == default)
+    version:     prompt-template version
+    task:        AI_MODEL_ROUTING task the view calls the AI with (None = the default model)
+    """
+    params = params or {}
+    ttl_hours = _config().get('ttl_hours', 72)
+
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                model = await asyncio.to_thread(_task_models, task)
+                cache_key = _request_key(request, name, version, topic_param, params, model)
+                if cache_key is None:
+                    return await view(request, *args, **kwargs)
+                cached = await aload_from_cache(cache_key)
+                if cached:
+                    return _cached_response(request, cached)
+                response = await view(request, *args, **kwargs)
+                entry, etag = _store(response)
+                if entry:
+                    await asave_to_cache(cache_key, entry, ttl_hours=ttl_hours)
+                    _with_headers(response, etag, hit=False)
+                return response
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            cache_key = _request_key(request, name, version, topic_param, params, _task_models(task))
+            if cache_key is None:
+                return view(request, *args, **kwargs)
+            cached = load_from_cache(cache_key)
+            if cached:
+                return _cached_response(request, cached)
+            response = view(request, *args, **kwargs)
+            entry, etag = _store(response)
+            if entry:
+                save_to_cache(cache_key, entry, ttl_hours=ttl_hours)
+                _with_headers(response, etag, hit=False)
+            return response
+        return wrapper
+
+    return decorator
@@ -0,0 +1,276 @@
+"""
+Single-flight request coalescing for AI generation
+When many users search the same topic at once, only the first request
+calls the AI; identical concurrent requests wait for its result.
+
+- in-process:  threads (and coroutines) share one in-flight generation per key
+- cross-worker: leaders hold an flock() on ai_cache/locks/<key>.lock, so other
+  gunicorn workers on the same host wait and then read the cache instead of
+  generating again (POSIX only - elsewhere coalescing is per process).
+  The leader deletes its lock file before releasing it, so the directory only
+  holds files for generations in progress; a waiter that then gets the lock
+  on the deleted file notices (inode check) and locks the current one.
+
+Waits end at the request's deadline (deadline.py); the waiter then runs fn()
+itself, which gives up at once and returns the deadline error.
+"""
+
+import asyncio
+import hashlib
+import inspect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+from .deadline import budget
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+DEFAULT_LOCK_DIR = Path(__file__).parent / 'ai_cache' / 'locks'
+POLL_SECONDS = 0.05
+
+
+class Flight:
+    """One in-progress generation that followers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    do(key, fn, recheck):
+      fn      - zero-arg callable doing the expensive work
+      recheck - zero-arg callable returning a cached result (or None); called
+                once the cross-worker lock is held, in case another worker
+                finished the same work while we were waiting
+    """
+
+    def __init__(self, lock_dir=None, wait_timeout=180.0, enabled=True):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.lock_dir = Path(lock_dir) if lock_dir else DEFAULT_LOCK_DIR
+        self.wait_timeout = wait_timeout
+        self.enabled = enabled
+        self.counts = {'leaders': 0, 'followers': 0, 'worker_hits': 0, 'timeouts': 0}
+
+    # ============================================
+    # In-process flights
+    # ============================================
+
+    def _join(self, key):
+        """(flight, is_leader)"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = Flight()
+                self.counts['leaders'] += 1
+                return flight, True
+            flight.followers += 1
+            self.counts['followers'] += 1
+            return flight, False
+
+    def _land(self, key, flight, result=None, error=None):
+        flight.result, flight.error = result, error
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.done.set()
+
+    def _follow(self, key, flight):
+        if flight.error is not None:
+            raise flight.error
+        print(f"🤝 Shared in-flight result: {key}")
+        return flight.result
+
+    # ============================================
+    # Cross-worker lock (flock on a per-key file)
+    # ============================================
+
+    def _lock_path(self, key):
+        return self.lock_dir / f"{hashlib.md5(key.encode()).hexdigest()}.lock"
+
+    def _open_lock(self, key):
+        if fcntl is None:
+            return None
+        try:
+            self.lock_dir.mkdir(parents=True, exist_ok=True)
+            return open(self._lock_path(key), 'a')
+        except OSError as e:
+            print(f"⚠️ Single-flight lock unavailable: {e}")
+            return None
+
+    def _try_lock(self, key, handle):
+        """'held', 'busy' or 'stale' (locked a file the previous leader has since deleted)"""
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 'busy'
+        try:
+            current = os.stat(self._lock_path(key)).st_ino == os.fstat(handle.fileno()).st_ino
+        except OSError:
+            current = False
+        return 'held' if current else 'stale'
+
+    def _step(self, key, handle, deadline):
+        """
+        One attempt at the lock: (handle, done, deadline) - done once the lock is
+        held (handle.locked = True) or the wait is over (timeout / no lock file).
+        """
+        state = self._try_lock(key, handle)
+        if state == 'held':
+            handle.locked = True
+            return handle, True, deadline
+        if state == 'stale':
+            handle.close()
+            handle = self._open_lock(key)
+            return handle, handle is None, deadline
+        if deadline is None:
+            print(f"⏳ Another worker is generating: {key}")
+            deadline = time.monotonic() + budget(self.wait_timeout)
+        elif time.monotonic() > deadline:
+            self.counts['timeouts'] += 1
+            return handle, True, deadline
+        return handle, False, deadline
+
+    def _unlock(self, key, handle):
+        """Delete the lock file (only while holding it) and release"""
+        if handle is None:
+            return
+        try:
+            if getattr(handle, 'locked', False):
+                os.unlink(self._lock_path(key))
+        except OSError:
+            pass
+        finally:
+            handle.close()  # closing releases the flock
+
+    @contextmanager
+    def _worker_lock(self, key):
+        """Hold the host-wide lock for key (gives up waiting after wait_timeout)"""
+        handle = self._open_lock(key)
+        try:
+            done, deadline = handle is None, None
+            while not done:
+                handle, done, deadline = self._step(key, handle, deadline)
+                if not done and handle is not None and deadline is not None:
+                    time.sleep(POLL_SECONDS)
+            yield
+        finally:
+            self._unlock(key, handle)
+
+    async def _aworker_lock(self, key):
+        """Async lock wait; returns the open handle (for _unlock) or None"""
+        handle = self._open_lock(key)
+        done, deadline = handle is None, None
+        try:
+            while not done:
+                handle, done, deadline = self._step(key, handle, deadline)
+                if not done and handle is not None and deadline is not None:
+                    await asyncio.sleep(POLL_SECONDS)
+        except BaseException:
+            self._unlock(key, handle)
+            raise
+        return handle
+
+    def _recheck(self, recheck):
+        if recheck is None:
+            return None
+        result = recheck()
+        if result is not None and not inspect.isawaitable(result):
+            with self._lock:
+                self.counts['worker_hits'] += 1
+        return result
+
+    # ============================================
+    # Public API
+    # ============================================
+
+    def do(self, key, fn, recheck=None):
+        if not self.enabled:
+            return fn()
+
+        flight, leader = self._join(key)
+        if not leader:
+            if not flight.done.wait(budget(self.wait_timeout)):
+                self.counts['timeouts'] += 1
+                return fn()
+            return self._follow(key, flight)
+
+        try:
+            with self._worker_lock(key):
+                result = self._recheck(recheck)
+                if result is None:
+                    result = fn()
+        except BaseException as e:
+            self._land(key, flight, error=e)
+            raise
+        self._land(key, flight, result=result)
+        return result
+
+    async def ado(self, key, afn, recheck=None):
+        """do() for coroutines: afn is a zero-arg async callable, recheck may be async too"""
+        if not self.enabled:
+            return await afn()
+
+        flight, leader = self._join(key)
+        if not leader:
+            deadline = time.monotonic() + budget(self.wait_timeout)
+            while not flight.done.is_set():
+                if time.monotonic() > deadline:
+                    self.counts['timeouts'] += 1
+                    return await afn()
+                await asyncio.sleep(POLL_SECONDS)
+            return self._follow(key, flight)
+
+        handle = None
+        try:
+            handle = await self._aworker_lock(key)
+            result = self._recheck(recheck)
+            if inspect.isawaitable(result):
+                result = await result
+                if result is not None:
+                    with self._lock:
+                        self.counts['worker_hits'] += 1
+            if result is None:
+                result = await afn()
+        except BaseException as e:
+            self._land(key, flight, error=e)
+            raise
+        finally:
+            self._unlock(key, handle)
+        self._land(key, flight, result=result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts, in_flight=len(self._flights))
+
+
+_single_flight = None
+_init_lock = threading.Lock()
+
+
+def get_single_flight():
+    """Process-wide instance configured from settings.AI_SINGLE_FLIGHT"""
+    global _single_flight
+    if _single_flight is None:
+        with _init_lock:
+            if _single_flight is None:
+                config = getattr(settings, 'AI_SINGLE_FLIGHT', {})
+                _single_flight = SingleFlight(
+                    lock_dir=config.get('lock_dir'),
+                    wait_timeout=config.get('wait_timeout', 180.0),
+                    enabled=config.get('enabled', True),
+                )
+    return _single_flight
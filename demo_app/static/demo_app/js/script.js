@@ -634,6 +634,69 @@ function renderTest() {
   });
 }
 
+/* =====================================================================
+   STREAMING SEARCH (Server-Sent Events)
+   ===================================================================== */
+function renderMarkdown(text) {
+  if (typeof marked !== 'undefined' && typeof marked.parse === 'function') {
+    return marked.parse(text);
+  }
+  // Fallback: basic markdown conversion
+  const html = text
+    .replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>')
+    .replace(/\*(.*?)\*/g, '<em>$1</em>')
+    .replace(/\n\n/g, '</p><p>')
+    .replace(/\n/g, '<br>');
+  return '<p>' + html + '</p>';
+}
+
+// When the AI is at capacity the server may answer with a saved explanation of a
+// related topic (related_topic in the JSON) - say so instead of passing it off as the answer.
+function withRelatedTopicNote(data, text) {
+  if (!data || !data.related_topic || !text) return text;
+  showNotification(`⚠️ AI is busy - showing a saved answer for "${data.related_topic}"`, 4000);
+  return `> ⚠️ **Related topic:** the AI is busy, so this is a saved explanation of ` +
+    `**${escapeHtml(data.related_topic)}**, not a new answer. Try again in a moment.\n\n${text}`;
+}
+
+// Streams /ai/stream/ and calls onText(fullTextSoFar) per chunk.
+// Resolves with the full answer; falls back to /ai/ if streaming is unavailable.
+function streamExplanation(query, onText) {
+  const fallback = async () => {
+    const res = await fetch(`/ai/?prompt=${encodeURIComponent(query)}`);
+    if (!res.ok) throw new Error('Network error');
+    const data = await res.json();
+    return withRelatedTopicNote(data, data.response || '');
+  };
+
+  if (typeof EventSource === 'undefined') return fallback();
+
+  return new Promise((resolve, reject) => {
+    const source = new EventSource(`/ai/stream/?prompt=${encodeURIComponent(query)}`);
+    let text = '';
+
+    source.addEventListener('chunk', (ev) => {
+      text += JSON.parse(ev.data).text;
+      onText(text);
+    });
+    source.addEventListener('done', (ev) => {
+      source.close();
+      const data = JSON.parse(ev.data);
+      resolve(withRelatedTopicNote(data, data.response || text));
+    });
+    source.addEventListener('error', (ev) => {
+      source.close();
+      if (ev.data) {
+        resolve(JSON.parse(ev.data).error);
+      } else if (!text) {
+        fallback().then(resolve, reject);
+      } else {
+        resolve(text);
+      }
+    });
+  });
+}
+
 /* =====================================================================
    HELPER FUNCTIONS
    ===================================================================== */
@@ -1064,33 +1127,23 @@ function initializeApp() {
       searchResult.innerHTML = `<div class="rounded-xl border border-white/10 p-3 bg-black/10 text-[var(--text)]">🔍 Generating fresh content for "${escapeHtml(query)}"...</div>`;
 
       try {
-        const url = `/ai/?prompt=${encodeURIComponent(query)}`;
-        const res = await fetch(url);
-        
-        if (!res.ok) throw new Error('Network error');
-        
-        const data = await res.json();
-        const aiResponse = (data.response || '').trim() || 'Answer coming soon...';
-
-        // ✅ FIX: Use marked.js to convert markdown to HTML properly
-        let html = aiResponse;
-        if (typeof marked !== 'undefined' && typeof marked.parse === 'function') {
-          html = marked.parse(aiResponse);
-        } else {
-          // Fallback: basic markdown conversion
-          html = aiResponse
-            .replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>')
-            .replace(/\*(.*?)\*/g, '<em>$1</em>')
-            .replace(/\n\n/g, '</p><p>')
-            .replace(/\n/g, '<br>');
-          html = '<p>' + html + '</p>';
-        }
-        
-        searchResult.innerHTML = '';
         const inner = document.createElement('div');
         inner.id = 'searchResultInner';
         inner.className = 'p-4 overflow-auto max-h-72 text-left space-y-4';
-        inner.innerHTML = html;
+
+        // ✅ Stream the explanation - text appears as soon as the first chunk arrives
+        const streamed = await streamExplanation(query, (textSoFar) => {
+          if (!inner.parentNode) {
+            searchResult.innerHTML = '';
+            searchResult.appendChild(inner);
+          }
+          inner.innerHTML = renderMarkdown(textSoFar);
+        });
+        const aiResponse = (streamed || '').trim() || 'Answer coming soon...';
+
+        // ✅ FIX: Use marked.js to convert markdown to HTML properly
+        searchResult.innerHTML = '';
+        inner.innerHTML = renderMarkdown(aiResponse);
         searchResult.appendChild(inner);
         searchResult.scrollTop = 0;
 
@@ -1153,7 +1206,7 @@ function initializeApp() {
         if (!res.ok) throw new Error('Network error');
         
         const data = await res.json();
-        let html = marked.parse(data.response || 'Story generation failed');
+        let html = marked.parse(withRelatedTopicNote(data, data.response) || 'Story generation failed');
         
         storyOutput.innerHTML = html;
         showNotification('📖 Story generated!', 2000);
@@ -0,0 +1,38 @@
+"""
+WhiteNoise for ASGI
+whitenoise 6.6's middleware is sync-only. Under ASGI Django then runs it -
+and, through async_to_sync, the whole rest of the request - on the one shared
+sync thread, so the async AI views (AI_ASYNC_VIEWS) would answer one request
+at a time. This subclass serves static files the same way but is async
+capable, so requests that aren't for a static file go straight on to the
+async middleware and views.
+"""
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            # Opens the file - keep it off the event loop
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
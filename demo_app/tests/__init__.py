@@ -0,0 +1,9 @@
+"""
+Unit tests for SmartLearn's AI plumbing - one module per feature, run offline
+against the fake provider:
+
+    AI_PROVIDER=fake python manage.py test demo_app.tests
+
+AITestCase (base.py) keeps every AI_* file under a temp dir, so a run never
+writes into demo_app/ai_cache/.
+"""
@@ -0,0 +1,143 @@
+import json
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from .. import Smart_api, admission, cache, topic_index, views
+from ..admission import Overloaded, admit, degraded, similar_topics
+from ..topic_index import TopicIndex, get_topic_index
+from .base import AITestCase
+
+LADDER = {
+    'enabled': True,
+    'near_duplicate_threshold': 0.5,
+    'classes': {'explain': ['stale', 'near_duplicate'], 'materials': ['fallback']},
+}
+
+
+@override_settings(AI_ADMISSION=LADDER)
+class AdmissionLadderTests(AITestCase):
+    def save(self, topic, value, ttl_hours=24):
+        cache.save_to_cache(cache.get_cache_key(topic), value, ttl_hours=ttl_hours, stale_hours=24)
+        cache.remember_topic(topic)
+
+    def test_nothing_cached(self):
+        self.assertEqual(degraded('explain', 'mitosis', cache.get_cache_key), (None, None, None))
+
+    def test_stale_before_near_duplicate(self):
+        self.save('cell mitosis', {'text': 'related'})
+        self.save('mitosis', {'text': 'own'}, ttl_hours=-1)  # expired, still in the store
+        data, how, related = degraded('explain', 'mitosis', cache.get_cache_key)
+        self.assertEqual((data, how, related), ({'text': 'own'}, 'stale', None))
+
+    def test_fresh_entry_is_cached(self):
+        self.save('mitosis', {'text': 'own'})
+        self.assertEqual(degraded('explain', 'mitosis', cache.get_cache_key)[1], 'cached')
+
+    def test_near_duplicate_names_related_topic(self):
+        self.save('cell mitosis', {'text': 'related'})
+        data, how, related = degraded('explain', 'mitosis', cache.get_cache_key)
+        self.assertEqual((data, how, related), ({'text': 'related'}, 'near_duplicate', 'cell mitosis'))
+
+    def test_class_without_cache_steps(self):
+        self.save('mitosis', {'text': 'own'})
+        self.assertEqual(degraded('materials', 'mitosis', cache.get_cache_key), (None, None, None))
+
+    def test_near_duplicate_among_many_topics(self):
+        self.save('cell mitosis', {'text': 'related'})
+        index = get_topic_index()
+        for i in range(3000):
+            index.index.add('', f'cell type {i}')
+        self.assertEqual(similar_topics('mitosis'), ['cell mitosis'])
+
+
+class SimilarScanTests(SimpleTestCase):
+    """TopicIndex.similar(scan_limit=...) checks a bounded number of topics sharing a word"""
+
+    def index(self, common=1000):
+        index = TopicIndex()
+        index.add('', 'cell mitosis')
+        for i in range(common):
+            index.add('', f'cell sample {i}')
+        return index
+
+    def test_rarest_word_first(self):
+        self.assertEqual(self.index().similar('', 'cell mitosis stage', 0.5, scan_limit=10)[0][0], 'cell mitosis')
+
+    def test_scan_is_bounded(self):
+        index = self.index()
+        with mock.patch.object(topic_index, 'jaccard', wraps=topic_index.jaccard) as scored:
+            index.similar('', 'cell', 0.5, scan_limit=50)
+        self.assertLessEqual(scored.call_count, 50 + index.bands)
+
+    def test_namespaces_kept_apart(self):
+        index = TopicIndex()
+        index.add('a', 'cell mitosis')
+        self.assertEqual(index.similar('b', 'mitosis', 0.5, scan_limit=100), [])
+
+
+class AdmitTests(AITestCase):
+    def test_admitted_with_capacity(self):
+        self.assertTrue(admit('explain'))
+
+    def test_disabled(self):
+        for index in range(len(Smart_api.key_pool)):
+            Smart_api.key_pool.mark_invalid(index)
+        with override_settings(AI_ADMISSION={'enabled': False}):
+            self.assertTrue(admit('explain'))
+
+    def test_no_usable_keys(self):
+        for index in range(len(Smart_api.key_pool)):
+            Smart_api.key_pool.mark_invalid(index)
+        decision = admit('explain')
+        self.assertFalse(decision)
+        self.assertEqual((decision.reason, decision.retry_after), ('no usable API keys', 301))
+
+    def test_rate_limited(self):
+        for index in range(len(Smart_api.key_pool)):
+            Smart_api.key_pool.mark_rate_limited(index, retry_after=60)
+        decision = admit('explain')
+        self.assertFalse(decision)
+        self.assertEqual(decision.reason, 'rate limited')
+        self.assertAlmostEqual(decision.retry_after, 61, delta=2)
+
+    def test_short_wait_admitted(self):
+        for index in range(len(Smart_api.key_pool)):
+            Smart_api.key_pool.mark_rate_limited(index, retry_after=2)
+        self.assertTrue(admit('explain'))
+
+    def test_daily_quota_exhausted(self):
+        spent = [0] * len(Smart_api.key_pool)
+        with mock.patch.object(Smart_api, 'get_key_quota_remaining', return_value=spent), \
+                mock.patch.object(admission, '_seconds_to_quota_reset', return_value=7200):
+            decision = admit('explain')
+        self.assertEqual((decision.reason, decision.retry_after), ('daily quota exhausted', 7201))
+
+    def test_reject_raises(self):
+        with self.assertRaises(Overloaded) as raised:
+            admission.Admission(False, 30, 'rate limited').reject()
+        self.assertEqual(raised.exception.retry_after, 30)
+
+
+@override_settings(AI_RESPONSE_CACHE={'enabled': False}, AI_ADMISSION=LADDER)
+class OverloadedViewTests(AITestCase):
+    def setUp(self):
+        super().setUp()
+        for index in range(len(Smart_api.key_pool)):
+            Smart_api.key_pool.mark_rate_limited(index, retry_after=60)
+
+    def get(self, prompt):
+        return views.get_ai_response(RequestFactory().get('/ai/', {'prompt': prompt}))
+
+    def test_503_with_retry_after(self):
+        calls = Smart_api.ai_provider.calls
+        response = self.get('mitosis')
+        self.assertEqual(response.status_code, 503)
+        self.assertGreater(int(response['Retry-After']), 5)
+        self.assertEqual(Smart_api.ai_provider.calls, calls)
+
+    def test_degraded_answer_from_cache(self):
+        cache.save_artifact('explanation', 'cell mitosis', '', 'Cells divide.')
+        data = json.loads(self.get('mitosis').content)
+        self.assertEqual((data['response'], data['degraded'], data['related_topic']),
+                         ('Cells divide.', 'near_duplicate', 'cell mitosis'))
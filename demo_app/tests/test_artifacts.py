@@ -0,0 +1,110 @@
+import json
+
+from asgiref.sync import async_to_sync
+from django.test import override_settings
+
+from .. import Smart_api, batch_api, cache, topic_index
+from ..admission import Overloaded
+from .base import AITestCase
+
+NOTES = 'Mitosis is how one cell divides into two identical daughter cells.'
+
+
+class ArtifactKeyTests(AITestCase):
+    def test_artifact_key_stable(self):
+        key = cache.artifact_key('flashcards', 'What is mitosis?', 'notes')
+        self.assertEqual(key, cache.artifact_key('flashcards', 'mitosis', 'notes'))
+        self.assertTrue(key.startswith('mitosis__flashcards_v1_'))
+
+    def test_artifact_key_context_limited_to_prompt(self):
+        context = 'x' * cache.CONTEXT_CHARS
+        self.assertEqual(cache.artifact_key('story', 'mitosis', context),
+                         cache.artifact_key('story', 'mitosis', context + 'ignored'))
+        self.assertNotEqual(cache.artifact_key('story', 'mitosis', 'a'), cache.artifact_key('story', 'mitosis', 'b'))
+
+    def test_artifacts_never_share_keys(self):
+        keys = {cache.artifact_key(artifact, 'mitosis') for artifact in cache.ARTIFACT_VERSIONS}
+        self.assertEqual(len(keys), len(cache.ARTIFACT_VERSIONS))
+
+    def test_version_bump_changes_key(self):
+        before = cache.artifact_key('mcqs', 'mitosis')
+        with override_settings(AI_ARTIFACT_VERSIONS={'mcqs': 2}):
+            self.assertNotEqual(cache.artifact_key('mcqs', 'mitosis'), before)
+
+    def test_topic_registered_only_once_saved(self):
+        index = topic_index.get_topic_index()
+        self.assertEqual(index.index.lookup('', 'mitosis'), (None, 0.0))
+        cache.save_artifact('explanation', 'mitosis', '', 'Cells divide.')
+        self.assertEqual(index.index.lookup('', 'mitosis'), ('mitosis', 1.0))
+
+
+class ArtifactSharingTests(AITestCase):
+    """/ai/search-all/ and the standalone endpoints read and write the same entries"""
+
+    GENERATORS = {
+        'flashcards': Smart_api.generate_flashcards_ai,
+        'mcqs': Smart_api.generate_mcqs_ai,
+        'keywords': Smart_api.extract_keywords_ai,
+    }
+
+    def calls(self):
+        return Smart_api.ai_provider.calls
+
+    def test_standalone_prompts_match_batch_counts(self):
+        for artifact, generate in self.GENERATORS.items():
+            self.assertEqual(len(json.loads(generate('mitosis', NOTES))), 5, artifact)
+
+    def test_standalone_answers_from_batch(self):
+        results = batch_api.generate_all_content('mitosis')
+        calls = self.calls()
+        # The frontend posts the explanation it just showed as the content
+        for artifact, generate in self.GENERATORS.items():
+            self.assertEqual(json.loads(generate('mitosis', results['search'])), results[artifact], artifact)
+        self.assertEqual(self.calls(), calls)
+
+    def test_batch_answers_from_standalone(self):
+        standalone = {artifact: json.loads(generate('mitosis', NOTES)) for artifact, generate in self.GENERATORS.items()}
+        calls = self.calls()
+        results = batch_api.generate_all_content('mitosis', NOTES)
+        # Only BATCH 1 ran - the materials came from the standalone entries
+        self.assertEqual(self.calls(), calls + 1)
+        for artifact, items in standalone.items():
+            self.assertEqual(results[artifact], items)
+
+    def test_async_shares_entries(self):
+        generated = Smart_api.generate_mcqs_ai('mitosis', NOTES)
+        calls = self.calls()
+        self.assertEqual(async_to_sync(Smart_api.agenerate_mcqs_ai)('mitosis', NOTES), generated)
+        self.assertEqual(self.calls(), calls)
+
+    def test_async_generates_and_caches(self):
+        generated = async_to_sync(Smart_api.aextract_keywords_ai)('mitosis', NOTES)
+        self.assertEqual(cache.load_artifact('keywords', 'mitosis', NOTES), json.loads(generated))
+
+    def test_unusable_reply_remembered(self):
+        self.fake(responses=[{'match': 'study flashcards', 'text': 'no json here'}])
+        self.assertIsNone(Smart_api.generate_flashcards_ai('mitosis', NOTES))
+        calls = self.calls()
+        self.assertIsNone(async_to_sync(Smart_api.agenerate_flashcards_ai)('mitosis', NOTES))
+        self.assertEqual(self.calls(), calls)
+        failure = cache.load_failure(cache.artifact_key('flashcards', 'mitosis', NOTES))
+        self.assertEqual(failure['error_class'], 'parse')
+
+    def test_batch_items_cleaned_like_standalone(self):
+        results = batch_api._new_results('mitosis')
+        batch_api.parse_batch2(json.dumps({
+            'flashcards': [{'q': 'Q?', 'a': 'A'}, {'q': 'no answer'}],
+            'mcqs': [{'q': 'Q?', 'opts': ['a', 'b'], 'ans': 0}],
+            'keywords': [{'k': 'term', 'd': 'definition'}],
+        }), results)
+        self.assertEqual(results['flashcards'], [{'q': 'Q?', 'a': 'A', 'type': 'definition'}])
+        self.assertEqual(results['mcqs'], [])
+        self.assertEqual(len(results['keywords']), 1)
+
+    def test_overloaded_without_capacity(self):
+        for index in range(len(Smart_api.key_pool)):
+            Smart_api.key_pool.mark_invalid(index)
+        with self.assertRaises(Overloaded):
+            Smart_api.extract_keywords_ai('mitosis', NOTES)
+        with self.assertRaises(Overloaded):
+            async_to_sync(Smart_api.aextract_keywords_ai)('mitosis', NOTES)
@@ -0,0 +1,61 @@
+import asyncio
+import json
+import time
+
+from asgiref.sync import async_to_sync
+from django.test import AsyncRequestFactory, RequestFactory, override_settings
+
+from .. import Smart_api, views, views_async
+from .base import AITestCase
+
+
+@override_settings(AI_RESPONSE_CACHE={'enabled': False})
+class AsyncViewTests(AITestCase):
+    """The async views answer exactly like the sync ones"""
+
+    def compare(self, name, path, params, body=None):
+        if body is None:
+            sync_request = RequestFactory().get(path, params)
+            async_request = AsyncRequestFactory().get(path, params)
+        else:
+            path = f"{path}?{'&'.join(f'{k}={v}' for k, v in params.items())}"
+            sync_request = RequestFactory().post(path, body, content_type='application/json')
+            async_request = AsyncRequestFactory().post(path, body, content_type='application/json')
+        sync_response = getattr(views, name)(sync_request)
+        async_response = async_to_sync(getattr(views_async, name))(async_request)
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(json.loads(async_response.content), json.loads(sync_response.content))
+        return json.loads(async_response.content)
+
+    def test_ai_response(self):
+        data = self.compare('get_ai_response', '/ai/', {'prompt': 'mitosis'})
+        self.assertFalse(data['response'].startswith('Error'))
+
+    def test_story(self):
+        self.assertIn('story', self.compare('generate_story', '/story/', {'concept': 'gravity'}))
+
+    def test_flashcards(self):
+        data = self.compare('generate_flashcards_endpoint', '/ai/generate-flashcards/', {'topic': 'mitosis'},
+                            {'content': 'Cells divide into two daughter cells.'})
+        self.assertTrue(data['success'])
+
+    def test_search_all(self):
+        data = self.compare('search_all_in_one', '/ai/search-all/', {'topic': 'mitosis', 'content': 'notes'})
+        self.assertTrue(data['data']['search'])
+
+    def test_empty_prompt(self):
+        self.assertEqual(self.compare('get_ai_response', '/ai/', {}), {'response': 'Please enter something.'})
+
+
+class AsyncCallTests(AITestCase):
+    def test_calls_overlap(self):
+        self.fake(latency={'distribution': 'fixed', 'mean': 0.2})
+
+        async def run():
+            return await asyncio.gather(*(Smart_api.acall_ai_with_retry(f"Explain topic {i}") for i in range(20)))
+
+        started = time.monotonic()
+        results = async_to_sync(run)()
+        # 20 x 0.2s one after another would take 4s
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertFalse(any(result.startswith('Error:') for result in results))
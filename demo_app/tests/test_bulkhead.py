@@ -0,0 +1,164 @@
+import asyncio
+import tempfile
+import threading
+from pathlib import Path
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, override_settings
+from django.urls import path
+
+from .. import bulkhead
+from ..bulkhead import Bulkhead, BulkheadMiddleware, HostSlots, get_bulkhead, is_async_view
+from .base import reset_singletons
+
+
+def sync_view(request):
+    return HttpResponse('ok')
+
+
+async def async_view(request):
+    return HttpResponse('ok')
+
+
+# Routes for request.urlconf - one sync and one async AI endpoint
+urlpatterns = [
+    path('ai/', sync_view),
+    path('story/', async_view),
+]
+
+POOLS = {
+    'enabled': True,
+    'scope': 'process',
+    'retry_after': 3,
+    'pools': {'ai_quick': {'max_concurrent': 1, 'max_queue': 1, 'queue_timeout': 0.05}, 'db': {'max_concurrent': None}},
+    'async_pools': {'ai_quick': {'max_concurrent': 3, 'max_queue': 0}},
+    'routes': [('/ai/', 'ai_quick'), ('/story/', 'ai_quick'), ('/', 'db')],
+}
+
+
+class BulkheadTests(SimpleTestCase):
+    def test_admits_up_to_max_concurrent(self):
+        pool = Bulkhead('test', 2)
+        tokens = [pool.acquire(), pool.acquire()]
+        self.assertNotIn(None, tokens)
+        self.assertIsNone(pool.acquire())
+        pool.release(tokens[0])
+        self.assertIsNotNone(pool.acquire())
+        self.assertEqual(pool.stats()['admitted'], 3)
+        self.assertEqual(pool.stats()['rejected_full'], 1)
+
+    def test_queue_times_out(self):
+        pool = Bulkhead('test', 1, max_queue=1, queue_timeout=0.05)
+        pool.acquire()
+        self.assertIsNone(pool.acquire())
+        self.assertEqual(pool.stats()['queued'], 1)
+        self.assertEqual(pool.stats()['rejected_timeout'], 1)
+
+    def test_queued_request_gets_freed_slot(self):
+        pool = Bulkhead('test', 1, max_queue=1, queue_timeout=2.0)
+        token = pool.acquire()
+        threading.Timer(0.05, pool.release, [token]).start()
+        self.assertIsNotNone(pool.acquire())
+
+    def test_async_queue(self):
+        pool = Bulkhead('test', 1, max_queue=1, queue_timeout=2.0)
+        token = pool.acquire()
+
+        async def wait():
+            asyncio.get_running_loop().call_later(0.05, pool.release, token)
+            return await pool.aacquire()
+        self.assertIsNotNone(async_to_sync(wait)())
+
+    def test_async_pools_larger(self):
+        """Async views hold no thread while waiting - their pools must not be sized for threads"""
+        for name in ('ai_generation', 'ai_quick'):
+            self.assertGreater(settings.AI_BULKHEADS['async_pools'][name]['max_concurrent'],
+                               settings.AI_BULKHEADS['pools'][name]['max_concurrent'])
+
+
+class HostSlotsTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = self.enterContext(tempfile.TemporaryDirectory())
+
+    def test_slots_shared_between_instances(self):
+        # Two instances stand in for two workers - flock() is per open file
+        first, second = HostSlots('pool', 1, self.dir), HostSlots('pool', 1, self.dir)
+        token = first.try_take()
+        self.assertIsNotNone(token)
+        self.assertIsNone(second.try_take())
+        first.give(token)
+        second.give(second.try_take())
+
+    def test_shrinking_removes_extra_slots(self):
+        HostSlots('pool', 3, self.dir).try_take()
+        HostSlots('pool', 1, self.dir)
+        self.assertEqual(len(list(Path(self.dir).glob('pool.*.lock'))), 1)
+
+
+@override_settings(AI_BULKHEADS=POOLS)
+class BulkheadMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        reset_singletons()
+        self.addCleanup(reset_singletons)
+
+    def hold(self, path, async_view=False):
+        """Take every slot of the path's pool"""
+        pool = get_bulkhead(bulkhead.pool_for(path), async_view)
+        tokens = [pool.acquire() for _ in range(pool.max_concurrent)]
+        self.addCleanup(lambda: [pool.release(token) for token in tokens])
+
+    def get(self, path, response=None):
+        request = RequestFactory().get(path)
+        request.urlconf = __name__
+        return BulkheadMiddleware(lambda request: response or HttpResponse('ok'))(request)
+
+    def aget(self, path):
+        async def get_response(request):
+            return HttpResponse('ok')
+        request = AsyncRequestFactory().get(path)
+        request.urlconf = __name__
+        return async_to_sync(BulkheadMiddleware(get_response))(request)
+
+    def test_full_pool_503(self):
+        self.hold('/ai/')
+        response = self.get('/ai/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '3')
+
+    def test_other_pools_unaffected(self):
+        self.hold('/ai/')
+        self.assertEqual(self.get('/history/get/').status_code, 200)
+
+    def test_disabled(self):
+        self.hold('/ai/')
+        with override_settings(AI_BULKHEADS=dict(POOLS, enabled=False)):
+            self.assertEqual(self.get('/ai/').status_code, 200)
+
+    def test_stream_holds_slot_until_sent(self):
+        response = self.get('/ai/', StreamingHttpResponse(iter(['a', 'b'])))
+        self.assertEqual(self.get('/ai/').status_code, 503)
+        self.assertEqual(b''.join(response.streaming_content), b'ab')
+        self.assertEqual(self.get('/ai/').status_code, 200)
+
+    def test_is_async_view(self):
+        for path, expected in (('/ai/', False), ('/story/', True), ('/missing/', False)):
+            request = RequestFactory().get(path)
+            request.urlconf = __name__
+            self.assertEqual(is_async_view(request), expected)
+
+    def test_async_views_use_async_pools(self):
+        self.hold('/story/')
+        self.assertEqual(self.aget('/story/').status_code, 200)
+        self.hold('/story/', async_view=True)
+        self.assertEqual(self.aget('/story/').status_code, 503)
+
+    def test_sync_views_under_asgi_keep_thread_pools(self):
+        self.hold('/ai/')
+        self.assertEqual(self.aget('/ai/').status_code, 503)
+
+    def test_async_view_without_async_pool_unlimited(self):
+        self.hold('/story/')
+        with override_settings(AI_BULKHEADS=dict(POOLS, async_pools={})):
+            self.assertEqual(self.aget('/story/').status_code, 200)
@@ -0,0 +1,104 @@
+import json
+import os
+import time
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from .. import cache_metrics
+from ..cache import load_from_cache, load_or_revalidate, save_failure, load_failure, save_to_cache
+from ..cache_metrics import CacheMetrics, key_kind, snapshot
+from .base import AITestCase
+
+
+class KeyKindTests(SimpleTestCase):
+    def test_kinds(self):
+        self.assertEqual(key_kind('mitosis'), 'all_in_one')
+        self.assertEqual(key_kind('mitosis__flashcards_v1_none'), 'flashcards')
+        self.assertEqual(key_kind('mitosis__failed'), 'failure')
+
+
+class CacheMetricsTests(AITestCase):
+    def metrics(self):
+        return cache_metrics.get_metrics()
+
+    def test_lookups_counted(self):
+        load_from_cache('mitosis')
+        save_to_cache('mitosis', {'search': 'Cells divide'})
+        load_from_cache('mitosis')
+        save_to_cache('meiosis', {'search': 'Halves'}, ttl_hours=-0.001, stale_hours=1)
+        load_or_revalidate('meiosis', lambda: None)
+        counts = self.metrics().counts
+        self.assertEqual((counts['lookups'], counts['hits'], counts['misses'], counts['stale_hits']), (3, 1, 1, 1))
+        self.assertEqual(counts['sets'], 2)
+
+    def test_generation_time_credited_to_hits(self):
+        load_from_cache('mitosis')
+        time.sleep(0.02)
+        save_to_cache('mitosis', {'search': 'Cells divide'})
+        self.assertEqual(self.metrics().counts['generations'], 1)
+        load_from_cache('mitosis')
+        self.assertGreaterEqual(self.metrics().counts['generation_ms_saved'], 20)
+
+    def test_negative_hits(self):
+        save_failure('mitosis', 'Error: Empty response')
+        load_failure('mitosis')
+        self.assertEqual(self.metrics().counts['negative_hits'], 1)
+
+    def test_snapshot_merges_processes(self):
+        save_to_cache('mitosis', {'search': 'Cells divide'})
+        load_from_cache('mitosis')
+        other = CacheMetrics(directory=self.metrics().directory)
+        other.name = 'other-worker'
+        other.lookup('meiosis', 'miss', 1.0)
+        other.flush()
+        merged = snapshot()
+        self.assertEqual(merged['processes'], 2)
+        self.assertEqual(merged['counts']['lookups'], 2)
+        self.assertEqual(merged['hit_ratio'], 0.5)
+        self.assertEqual(merged['hottest_keys'][0]['key'], 'mitosis')
+
+    def test_old_snapshots_dropped(self):
+        stale = CacheMetrics(directory=self.metrics().directory)
+        stale.name = 'gone-worker'
+        stale.lookup('meiosis', 'miss', 1.0)
+        stale.flush()
+        path = stale.directory / 'gone-worker.json'
+        os.utime(path, (0, 0))
+        self.assertEqual(snapshot()['processes'], 0)
+        self.assertFalse(path.exists())
+
+    def test_key_stats_bounded(self):
+        metrics = CacheMetrics(directory=self.tmp / 'bounded', max_keys=10)
+        for i in range(25):
+            metrics.lookup(f'topic-{i}', 'miss', 1.0)
+        self.assertLessEqual(len(metrics.keys), 10)
+
+    def test_command(self):
+        save_to_cache('mitosis', {'search': 'Cells divide'})
+        load_from_cache('mitosis')
+        out = StringIO()
+        call_command('ai_cache_stats', '--json', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['metrics']['counts']['hits'], 1)
+        out = StringIO()
+        call_command('ai_cache_stats', stdout=out)
+        self.assertIn('mitosis', out.getvalue())
+        call_command('ai_cache_stats', '--reset', stdout=StringIO())
+        self.assertEqual(snapshot()['counts']['lookups'], 0)
+
+
+class CacheStatusEndpointTests(AITestCase):
+    def test_staff_only(self):
+        response = self.client.get('/ai/status/cache/')
+        self.assertEqual(response.status_code, 302)
+
+    def test_reports_store_and_metrics(self):
+        staff = User.objects.create(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        save_to_cache('mitosis', {'search': 'Cells divide'})
+        load_from_cache('mitosis')
+        data = self.client.get('/ai/status/cache/', {'top': 'x'}).json()
+        self.assertEqual(data['cache']['count'], 1)
+        self.assertEqual(data['metrics']['counts']['hits'], 1)
@@ -0,0 +1,222 @@
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from django.test import SimpleTestCase, override_settings
+
+from ..cache import DjangoCacheStore, FileCacheStore, MemoryLRU, SQLiteCacheStore, TieredCacheStore, get_store
+from .base import reset_singletons, temp_paths
+
+RESULT = {'topic': 'mitosis', 'search': 'Cells divide', 'flashcards': [{'front': 'Q', 'back': 'A'}]}
+
+
+class StoreTestCase(SimpleTestCase):
+    """self.store = make_store() in a temp dir (cache metrics included)"""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory(prefix='smartlearn-store-')
+        self.addCleanup(directory.cleanup)
+        self.dir = Path(directory.name)
+        # Evictions/purges are counted in the cache metrics - keep their snapshots here too
+        overrides = override_settings(**temp_paths(self.dir))
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        reset_singletons()
+        self.addCleanup(reset_singletons)
+        self.store = self.make_store()
+
+
+class StoreContract:
+    """Behaviour every persistent AI cache store shares"""
+
+    def test_round_trip(self):
+        self.store.set('ai_mitosis', RESULT, 60)
+        self.assertEqual(self.store.get('ai_mitosis'), RESULT)
+        self.assertIsNone(self.store.get('ai_meiosis'))
+
+    def test_entry_times(self):
+        self.store.set('ai_mitosis', RESULT, 60, stale_seconds=30)
+        data, created_at, fresh_until, expires_at = self.store.get_entry('ai_mitosis')
+        self.assertEqual(data, RESULT)
+        self.assertAlmostEqual(fresh_until - created_at, 60, delta=1)
+        self.assertAlmostEqual(expires_at - fresh_until, 30, delta=1)
+
+    def test_stale_entry_not_fresh(self):
+        self.store.set('ai_mitosis', RESULT, -1, stale_seconds=60)
+        self.assertIsNone(self.store.get('ai_mitosis'))
+        self.assertEqual(self.store.get_entry('ai_mitosis')[0], RESULT)
+
+    def test_overwrite_delete_clear(self):
+        self.store.set('ai_mitosis', RESULT, 60)
+        self.store.set('ai_mitosis', dict(RESULT, search='Updated'), 60)
+        self.assertEqual(self.store.get('ai_mitosis')['search'], 'Updated')
+        self.store.delete('ai_mitosis')
+        self.assertIsNone(self.store.get_entry('ai_mitosis'))
+        self.store.set('ai_meiosis', RESULT, 60)
+        self.store.clear()
+        self.assertIsNone(self.store.get('ai_meiosis'))
+
+
+class SQLiteCacheStoreTests(StoreContract, StoreTestCase):
+    def make_store(self):
+        return SQLiteCacheStore(self.dir / 'ai_cache.sqlite3')
+
+    def test_wal_mode(self):
+        self.assertEqual(self.store._conn().execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+
+    def test_shared_between_instances(self):
+        self.store.set('ai_mitosis', RESULT, 60)
+        self.assertEqual(self.make_store().get('ai_mitosis'), RESULT)
+
+    def test_stats_kept_by_triggers(self):
+        self.store.set('ai_mitosis', RESULT, 60)
+        self.store.set('ai_meiosis', RESULT, 60)
+        self.store.set('ai_meiosis', dict(RESULT, search='x' * 500), 60)
+        stats = self.store.stats()
+        size = sum(row[0] for row in self.store._conn().execute('SELECT size FROM cache_entries'))
+        self.assertEqual((stats['count'], stats['bytes']), (2, size))
+        self.store.delete('ai_mitosis')
+        self.assertEqual(self.store.stats()['count'], 1)
+
+    def test_compressed(self):
+        self.store.set('ai_mitosis', {'search': 'cell ' * 1000}, 60)
+        self.assertLess(self.store.stats()['bytes'], 500)
+
+    def test_purge_expired(self):
+        self.store.set('ai_old', RESULT, -2, stale_seconds=1)
+        self.store.set('ai_stale', RESULT, -1, stale_seconds=60)
+        self.store.set('ai_fresh', RESULT, 60)
+        self.assertEqual(self.store.purge_expired(), 1)
+        self.assertIsNone(self.store.get_entry('ai_old'))
+        self.assertIsNotNone(self.store.get_entry('ai_stale'))
+
+    def test_purges_every_n_writes(self):
+        store = SQLiteCacheStore(self.dir / 'purge.sqlite3', purge_every=2)
+        store.set('ai_old', RESULT, -2, stale_seconds=1)
+        store.set('ai_fresh', RESULT, 60)
+        self.assertEqual(store.stats()['count'], 1)
+
+    def test_upgrades_store_without_soft_ttl(self):
+        path = self.dir / 'old.sqlite3'
+        conn = sqlite3.connect(path)
+        conn.execute('CREATE TABLE cache_entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+                     'created_at REAL NOT NULL, expires_at REAL NOT NULL, size INTEGER NOT NULL)')
+        value = self.store.encode(RESULT)
+        conn.execute('INSERT INTO cache_entries VALUES (?, ?, 0, 9999999999, ?)', ('ai_mitosis', value, len(value)))
+        conn.commit()
+        conn.close()
+        self.assertEqual(SQLiteCacheStore(path).get('ai_mitosis'), RESULT)
+
+
+class FileCacheStoreTests(StoreContract, StoreTestCase):
+    def make_store(self):
+        return FileCacheStore(self.dir)
+
+    def test_deletes_files_past_hard_ttl(self):
+        self.store.set('ai_mitosis', RESULT, -2, stale_seconds=1)
+        self.assertIsNone(self.store.get('ai_mitosis'))
+        self.assertFalse((self.dir / 'ai_mitosis.json').exists())
+
+    def test_stats(self):
+        self.store.set('ai_mitosis', RESULT, 60)
+        self.assertEqual(self.store.stats()['count'], 1)
+
+
+class MemoryLRUTests(StoreTestCase):
+    def make_store(self):
+        return MemoryLRU(max_bytes=100)
+
+    def put(self, key, size, data=None):
+        now = time.time()
+        self.store.set(key, data or key, now, now + 60, now + 120, size)
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        for key in ('a', 'b', 'c'):
+            self.put(key, 40)
+        self.assertIsNone(self.store.get_entry('a'))
+        self.assertEqual((len(self.store), self.store.bytes), (2, 80))
+
+    def test_get_refreshes_recency(self):
+        self.put('a', 40)
+        self.put('b', 40)
+        self.store.get_entry('a')
+        self.put('c', 40)
+        self.assertIsNotNone(self.store.get_entry('a'))
+        self.assertIsNone(self.store.get_entry('b'))
+
+    def test_oversized_entry_not_kept(self):
+        self.put('big', 101)
+        self.assertEqual((len(self.store), self.store.bytes), (0, 0))
+
+    def test_replacing_updates_bytes(self):
+        self.put('a', 40)
+        self.put('a', 10)
+        self.assertEqual(self.store.bytes, 10)
+
+    def test_expired_entries_dropped(self):
+        now = time.time()
+        self.store.set('a', 'a', now - 10, now - 5, now - 1, 10)
+        self.assertIsNone(self.store.get_entry('a'))
+        self.assertEqual(self.store.bytes, 0)
+
+
+class TieredCacheStoreTests(StoreContract, StoreTestCase):
+    def make_store(self):
+        return TieredCacheStore(SQLiteCacheStore(self.dir / 'ai_cache.sqlite3'), max_bytes=10_000)
+
+    def test_second_read_served_from_memory(self):
+        self.store.set('ai_mitosis', RESULT, 60)
+        self.store.memory.clear()
+        self.store.get('ai_mitosis')
+        self.store.get('ai_mitosis')
+        tiers = self.store.tier_stats()
+        self.assertEqual((tiers['store']['hits'], tiers['memory']['hits']), (1, 1))
+
+    def test_memory_copy_capped_by_memory_ttl(self):
+        self.store.memory_ttl_seconds = 5
+        self.store.set('ai_mitosis', RESULT, 3600)
+        self.assertLess(self.store.memory.get_entry('ai_mitosis')[3], time.time() + 6)
+
+    def test_fresher_copy_from_another_worker_wins(self):
+        self.store.set('ai_mitosis', RESULT, -1, stale_seconds=60)
+        other_worker = SQLiteCacheStore(self.dir / 'ai_cache.sqlite3')
+        other_worker.set('ai_mitosis', dict(RESULT, search='Refreshed'), 60)
+        self.assertEqual(self.store.get('ai_mitosis')['search'], 'Refreshed')
+
+    def test_misses_counted(self):
+        self.assertIsNone(self.store.get('ai_meiosis'))
+        self.assertEqual(self.store.stats()['tiers']['misses'], 1)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+    'ai': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'ai-tests'},
+})
+class DjangoCacheStoreTests(StoreContract, StoreTestCase):
+    def make_store(self):
+        return DjangoCacheStore('ai')
+
+    def test_keys_hashed_and_stable(self):
+        key = self.store.make_key('ai_' + 'very long topic ' * 50)
+        self.assertRegex(key, r'^ai_cache:v1:[0-9a-f]{40}$')
+        self.assertEqual(key, DjangoCacheStore('ai').make_key('ai_' + 'very long topic ' * 50))
+
+    def test_shared_between_instances(self):
+        self.store.set('ai_mitosis', RESULT, 60)
+        self.assertEqual(DjangoCacheStore('ai').get('ai_mitosis'), RESULT)
+
+    def test_hash_collision_rejected(self):
+        self.store.cache.set(self.store.make_key('ai_mitosis'), {'key': 'ai_other', 'data': RESULT,
+                                                                  'created_at': 0, 'expires_at': 9e9})
+        self.assertIsNone(self.store.get_entry('ai_mitosis'))
+
+    def test_stats(self):
+        self.store.set('ai_mitosis', RESULT, 60)
+        self.assertEqual(self.store.stats(), {'backend': 'django:ai', 'count': 1, 'bytes': 0})
+
+    def test_selected_by_settings(self):
+        with self.settings(AI_CACHE={'backend': 'django', 'django_alias': 'ai'}):
+            reset_singletons()
+            self.assertIsInstance(get_store(), DjangoCacheStore)
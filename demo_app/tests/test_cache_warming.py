@@ -0,0 +1,84 @@
+import json
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.utils import timezone
+
+from .. import Smart_api, cache_warming
+from ..cache import get_cache_key, load_from_cache, save_to_cache
+from ..models import SearchHistory
+from .base import AITestCase
+
+
+class CacheWarmingTests(AITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create(username='student')
+        self.checkpoint = self.tmp / 'warm_checkpoint.json'
+
+    def search(self, query, times=1, days_ago=0):
+        for _ in range(times):
+            row = SearchHistory.objects.create(user=self.user, query=query)
+            if days_ago:
+                SearchHistory.objects.filter(id=row.id).update(timestamp=timezone.now() - timedelta(days=days_ago))
+
+    def warm(self, **options):
+        return cache_warming.warm(**dict({'max_wait': 0, 'checkpoint_path': self.checkpoint}, **options))
+
+    def test_popularity_counted_per_normalized_topic(self):
+        self.search('Photosynthesis', 3)
+        self.search('what is photosynthesis?', 1)
+        self.search('mitosis', 3)
+        self.search('meiosis', 10, days_ago=30)
+        self.assertEqual(cache_warming.popular_topics(top=5, days=7), [('Photosynthesis', 4), ('mitosis', 3)])
+
+    def test_dry_run_skips_fresh_topics(self):
+        self.search('mitosis', 2)
+        self.search('meiosis')
+        save_to_cache(get_cache_key('mitosis'), {'search': 'cached'})
+        summary = self.warm(dry_run=True)
+        self.assertEqual((summary['fresh'], summary['topics']), (1, ['meiosis']))
+        self.assertFalse(self.checkpoint.exists())
+
+    def test_warm_caches_topics(self):
+        self.search('mitosis', 2)
+        self.search('meiosis')
+        summary = self.warm(workers=2)
+        self.assertEqual((summary['warmed'], summary['failed'], summary['remaining']), (2, 0, 0))
+        self.assertIsNotNone(load_from_cache(get_cache_key('meiosis')))
+        # A finished run leaves no checkpoint behind
+        self.assertFalse(self.checkpoint.exists())
+
+    def test_resumes_from_checkpoint(self):
+        self.search('mitosis', 2)
+        self.search('meiosis')
+        params = {'top': 50, 'days': 7, 'include_story': True, 'min_fresh_hours': 0}
+        self.checkpoint.write_text(json.dumps({'params': params, 'plan': ['mitosis', 'meiosis'],
+                                               'done': ['mitosis'], 'failed': []}))
+        summary = self.warm()
+        self.assertTrue(summary['resumed'])
+        self.assertEqual(summary['warmed'], 1)
+        self.assertIsNone(load_from_cache(get_cache_key('mitosis')))
+
+    def test_limit_defers_the_rest(self):
+        for topic in ('mitosis', 'meiosis', 'osmosis'):
+            self.search(topic)
+        summary = self.warm(max_topics=1)
+        self.assertEqual((summary['warmed'], summary['remaining']), (1, 2))
+
+    def test_stops_without_usable_keys(self):
+        self.search('mitosis')
+        for index in range(len(Smart_api.key_pool)):
+            Smart_api.key_pool.mark_invalid(index)
+        summary = self.warm()
+        self.assertEqual((summary['stopped'], summary['warmed']), ('no usable API keys', 0))
+        # The checkpoint is kept so the next run resumes
+        self.assertEqual(json.loads(self.checkpoint.read_text())['plan'], ['mitosis'])
+
+    def test_command_dry_run(self):
+        self.search('mitosis')
+        out = StringIO()
+        call_command('warm_ai_cache', '--dry-run', '--checkpoint', str(self.checkpoint), stdout=out)
+        self.assertIn('• mitosis', out.getvalue())
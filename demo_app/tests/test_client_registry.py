@@ -0,0 +1,68 @@
+import asyncio
+import importlib.util
+import unittest
+
+from django.test import SimpleTestCase
+
+from ..ai_providers import ClientRegistry, GeminiProvider, _read_usage, _request_options
+
+HAS_GENAI = importlib.util.find_spec('google.generativeai') is not None
+
+
+@unittest.skipUnless(HAS_GENAI, 'needs google-generativeai')
+class ClientRegistryTests(SimpleTestCase):
+    """Building clients makes no network call - only their use does"""
+
+    def setUp(self):
+        self.registry = ClientRegistry()
+
+    def test_model_reused_per_key_and_config(self):
+        model = self.registry.model('gemini-2.5-flash', 'key-1', 2000, 0.7)
+        self.assertIs(self.registry.model('gemini-2.5-flash', 'key-1', 2000, 0.7), model)
+        self.assertIsNot(self.registry.model('gemini-2.5-flash', 'key-1', 500, 0.7), model)
+        self.assertIsNot(self.registry.model('gemini-2.5-flash', 'key-2', 2000, 0.7), model)
+
+    def test_one_channel_per_key(self):
+        flash = self.registry.model('gemini-2.5-flash', 'key-1', 2000, 0.7)
+        pro = self.registry.model('gemini-pro', 'key-1', 2000, 0.7)
+        other_key = self.registry.model('gemini-pro', 'key-2', 2000, 0.7)
+        self.assertIs(flash._client, pro._client)
+        self.assertIsNot(pro._client, other_key._client)
+        self.assertEqual(self.registry.stats()['service_clients'], 2)
+
+    def test_nothing_rebuilt_on_the_hot_path(self):
+        for _ in range(10):
+            self.registry.model('gemini-2.5-flash', 'key-1', 2000, 0.7)
+        self.assertEqual(self.registry.stats()['objects_built'], 2)  # one service client + one model
+
+    def test_async_models_per_event_loop(self):
+        async def build():
+            return self.registry.async_model('gemini-2.5-flash', 'key-1', 2000, 0.7)
+
+        async def build_twice():
+            return await build(), await build()
+
+        first, again = asyncio.run(build_twice())
+        self.assertIs(first, again)
+        self.assertIsNot(asyncio.run(build()), first)
+
+    def test_provider_owns_a_registry(self):
+        self.assertIsInstance(GeminiProvider().registry, ClientRegistry)
+
+
+class HelperTests(SimpleTestCase):
+    def test_request_options(self):
+        self.assertIsNone(_request_options(None))
+        self.assertEqual(_request_options(5), {'timeout': 5})
+
+    def test_read_usage(self):
+        class Metadata:
+            prompt_token_count = 12
+            candidates_token_count = 34
+
+        class Response:
+            usage_metadata = Metadata()
+
+        usage = {}
+        _read_usage(Response(), usage)
+        self.assertEqual(usage, {'prompt_tokens': 12, 'output_tokens': 34})
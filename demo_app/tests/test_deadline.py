@@ -0,0 +1,132 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from django.http import StreamingHttpResponse
+from django.test import SimpleTestCase, override_settings
+
+from .. import Smart_api, deadline
+from .base import AITestCase
+
+DEADLINES = {'enabled': True, 'call_timeout': 60, 'min_attempt_seconds': 2, 'endpoints': {'ai': 7}}
+
+
+@override_settings(AI_DEADLINES=DEADLINES)
+class DeadlineTests(SimpleTestCase):
+    def test_no_deadline(self):
+        self.assertIsNone(deadline.remaining())
+        self.assertEqual(deadline.budget(30), 30)
+        self.assertEqual(deadline.call_timeout(), 60)
+        self.assertTrue(deadline.can_attempt())
+
+    def test_budget_and_timeout_capped(self):
+        with deadline.deadline(10):
+            self.assertLessEqual(deadline.budget(30), 10)
+            self.assertLessEqual(deadline.call_timeout(), 10)
+            self.assertTrue(deadline.can_attempt(after=5))
+            self.assertFalse(deadline.can_attempt(after=9))
+        self.assertIsNone(deadline.remaining())
+
+    def test_outer_deadline_wins(self):
+        with deadline.deadline(5):
+            with deadline.deadline(100):
+                self.assertLessEqual(deadline.remaining(), 5)
+
+    def test_expired(self):
+        with deadline.deadline(0):
+            self.assertTrue(deadline.expired())
+        self.assertFalse(deadline.expired())
+
+    def test_submit_carries_deadline_into_pool(self):
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            self.assertIsNone(executor.submit(deadline.remaining).result())
+            with deadline.deadline(10):
+                left = deadline.submit(executor, deadline.remaining).result()
+        self.assertIsNotNone(left)
+        self.assertLessEqual(left, 10)
+
+    def test_decorator_sets_deadline(self):
+        seen = []
+
+        @deadline.with_deadline('ai')
+        def view(request):
+            seen.append(deadline.remaining())
+
+        view(None)
+        self.assertTrue(0 < seen[0] <= 7)
+        self.assertIsNone(deadline.remaining())
+
+    def test_async_decorator_sets_deadline(self):
+        seen = []
+
+        @deadline.with_deadline('ai')
+        async def view(request):
+            seen.append(deadline.remaining())
+
+        async_to_sync(view)(None)
+        self.assertTrue(0 < seen[0] <= 7)
+
+    def test_unknown_endpoint_or_disabled(self):
+        seen = []
+
+        @deadline.with_deadline('other')
+        def view(request):
+            seen.append(deadline.remaining())
+
+        view(None)
+        with override_settings(AI_DEADLINES=dict(DEADLINES, enabled=False, endpoints={'other': 5})):
+            view(None)
+        self.assertEqual(seen, [None, None])
+
+    def test_streamed_body_keeps_deadline(self):
+        """A stream is produced after the view has returned - each chunk still sees the deadline"""
+
+        def chunks():
+            yield str(deadline.remaining())
+            yield str(deadline.remaining())
+
+        @deadline.with_deadline('ai')
+        def view(request):
+            return StreamingHttpResponse(chunks())
+
+        response = view(None)
+        self.assertIsNone(deadline.remaining())
+        seen = [float(chunk) for chunk in response.streaming_content]
+        self.assertTrue(all(0 < left <= 7 for left in seen))
+        self.assertIsNone(deadline.remaining())
+
+    def test_async_streamed_body_keeps_deadline(self):
+        async def chunks():
+            yield str(deadline.remaining())
+
+        @deadline.with_deadline('ai')
+        async def view(request):
+            return StreamingHttpResponse(chunks())
+
+        async def consume():
+            response = await view(None)
+            return [float(chunk) async for chunk in response.streaming_content]
+
+        self.assertTrue(0 < async_to_sync(consume)()[0] <= 7)
+
+
+@override_settings(AI_DEADLINES=DEADLINES)
+class DeadlineCallTests(AITestCase):
+    """call_ai_with_retry gives up instead of starting work it can't finish"""
+
+    def test_call_abandoned_without_time_left(self):
+        calls = Smart_api.ai_provider.calls
+        with deadline.deadline(1):
+            self.assertEqual(Smart_api.call_ai_with_retry('Explain mitosis'), deadline.DEADLINE_ERROR)
+        self.assertEqual(Smart_api.ai_provider.calls, calls)
+
+    def test_async_call_abandoned_without_time_left(self):
+        async def call():
+            with deadline.deadline(1):
+                return await Smart_api.acall_ai_with_retry('Explain mitosis')
+        self.assertEqual(async_to_sync(call)(), deadline.DEADLINE_ERROR)
+
+    def test_provider_timeout_capped(self):
+        self.fake(latency={'distribution': 'fixed', 'mean': 3.0})
+        with override_settings(AI_DEADLINES=dict(DEADLINES, min_attempt_seconds=0.1)), deadline.deadline(0.3):
+            result = Smart_api.call_ai_with_retry('Explain mitosis')
+        self.assertTrue(result.startswith('Error'))
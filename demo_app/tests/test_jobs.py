@@ -0,0 +1,108 @@
+import json
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import AsyncRequestFactory, RequestFactory, override_settings
+from django.utils import timezone
+
+from .. import job_queue, views, views_async
+from ..models import GenerationJob
+from .base import AITestCase
+
+
+class JobQueueTests(AITestCase):
+    def test_enqueue_joins_active_job_for_same_key(self):
+        job = job_queue.enqueue_job('Mitosis')
+        self.assertEqual(job_queue.enqueue_job('what is mitosis?').id, job.id)
+        self.assertNotEqual(job_queue.enqueue_job('mitosis', content='notes').id, job.id)
+
+    def test_claim_oldest_once(self):
+        first = job_queue.enqueue_job('mitosis')
+        second = job_queue.enqueue_job('meiosis')
+        claimed = job_queue.claim_next_job('worker-1')
+        self.assertEqual(claimed.id, first.id)
+        self.assertEqual((claimed.status, claimed.worker, claimed.attempts), (GenerationJob.RUNNING, 'worker-1', 1))
+        self.assertEqual(job_queue.claim_next_job('worker-2').id, second.id)
+        self.assertIsNone(job_queue.claim_next_job('worker-3'))
+
+    def test_stale_running_job_requeued(self):
+        job_queue.enqueue_job('mitosis')
+        job = job_queue.claim_next_job('worker-1')
+        GenerationJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(job_queue.requeue_stale_jobs(), 1)
+        self.assertEqual(job_queue.claim_next_job('worker-2').attempts, 2)
+
+    @override_settings(AI_JOBS={'max_attempts': 1, 'stale_after_seconds': 300})
+    def test_stale_job_fails_after_max_attempts(self):
+        job_queue.enqueue_job('mitosis')
+        job = job_queue.claim_next_job('worker-1')
+        GenerationJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        job_queue.requeue_stale_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (GenerationJob.FAILED, 'Worker stopped responding'))
+
+    def test_run_job(self):
+        job_queue.enqueue_job('mitosis')
+        job = job_queue.claim_next_job('worker-1')
+        self.assertTrue(job_queue.run_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.DONE)
+        self.assertEqual(len(job.result['flashcards']), 5)
+        self.assertGreater(job.version, 2)
+
+    def test_failed_run_keeps_partial(self):
+        def broken(*args):
+            yield 'explanation', 'Cells divide'
+            raise RuntimeError('provider down')
+
+        job_queue.enqueue_job('mitosis')
+        job = job_queue.claim_next_job('worker-1')
+        with mock.patch.object(job_queue, 'stream_all_content', broken):
+            self.assertFalse(job_queue.run_job(job))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error, job.partial['search']),
+                         (GenerationJob.FAILED, 'provider down', 'Cells divide'))
+
+
+class JobViewTests(AITestCase):
+    def search(self, **params):
+        return views.search_all_in_one(RequestFactory().get('/ai/search-all/', dict(params, mode='job')))
+
+    def status(self, job_id, view=views.ai_job_status, factory=RequestFactory, **params):
+        return view(factory().get(f'/ai/jobs/{job_id}/', params), job_id=job_id)
+
+    def test_accepted_with_location(self):
+        response = self.search(topic='mitosis')
+        self.assertEqual(response.status_code, 202)
+        data = json.loads(response.content)
+        self.assertEqual(response['Location'], data['status_url'])
+        self.assertEqual(data['status'], GenerationJob.QUEUED)
+
+    def test_status_while_active_has_retry_after(self):
+        job_id = json.loads(self.search(topic='mitosis').content)['job_id']
+        response = self.status(job_id)
+        self.assertEqual(response['Retry-After'], '2')
+        self.assertEqual(json.loads(response.content)['position'], 0)
+
+    def test_status_when_done(self):
+        job_id = json.loads(self.search(topic='mitosis').content)['job_id']
+        job_queue.run_job(job_queue.claim_next_job('worker-1'))
+        response = self.status(job_id)
+        self.assertFalse(response.has_header('Retry-After'))
+        self.assertEqual(json.loads(response.content)['status'], GenerationJob.DONE)
+        # The worker cached the result, so the next search answers right away
+        self.assertEqual(self.search(topic='mitosis').status_code, 200)
+
+    def test_unknown_job(self):
+        self.assertEqual(self.status('00000000-0000-0000-0000-000000000000').status_code, 404)
+
+    def test_async_status_answers_at_once_without_wait(self):
+        job_id = json.loads(self.search(topic='mitosis').content)['job_id']
+        response = self.status(job_id, async_to_sync(views_async.ai_job_status), AsyncRequestFactory, version=-1)
+        self.assertEqual(json.loads(response.content)['status'], GenerationJob.QUEUED)
+
+    def test_topic_validated_before_queueing(self):
+        self.assertEqual(self.search(topic='x' * 300).status_code, 400)
+        self.assertEqual(self.search(topic='').status_code, 400)
+        self.assertFalse(GenerationJob.objects.exists())
@@ -0,0 +1,92 @@
+import time
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+
+from ..key_pool import COOLDOWN, HEALTHY, INVALID, APIKeyPool
+
+
+class KeyPoolTests(SimpleTestCase):
+    def setUp(self):
+        limits = [{'rpm': 100, 'tpm': 100000}] * 3
+        self.pool = APIKeyPool(['key-aaaaaaaa-1', 'key-bbbbbbbb-2', 'key-cccccccc-3'], limits,
+                               cooldown_seconds=10, max_cooldown_seconds=25, failure_threshold=2)
+
+    def states(self):
+        now = time.time()
+        return [s.state(now) for s in self.pool.states]
+
+    def test_starts_healthy(self):
+        self.assertEqual(self.states(), [HEALTHY] * 3)
+
+    def test_rate_limit_cools_down_and_doubles(self):
+        self.assertEqual(self.pool.mark_rate_limited(0), 10)
+        self.assertEqual(self.states()[0], COOLDOWN)
+        self.assertEqual(self.pool.mark_rate_limited(0), 20)
+        self.assertEqual(self.pool.mark_rate_limited(0), 25)  # capped at max_cooldown_seconds
+
+    def test_retry_after_overrides_backoff(self):
+        self.assertEqual(self.pool.mark_rate_limited(1, retry_after=3), 3)
+
+    def test_success_clears_strikes(self):
+        self.pool.mark_rate_limited(0)
+        self.pool.mark_success(0)
+        self.pool.reset(0)
+        self.assertEqual(self.pool.mark_rate_limited(0), 10)
+
+    def test_failures_open_circuit_at_threshold(self):
+        self.assertEqual(self.pool.mark_failure(2, 'boom'), 0)
+        self.assertEqual(self.states()[2], HEALTHY)
+        self.assertEqual(self.pool.mark_failure(2, 'boom'), 10)
+        self.assertEqual(self.states()[2], COOLDOWN)
+
+    def test_success_resets_failure_count(self):
+        self.pool.mark_failure(2, 'boom')
+        self.pool.mark_success(2)
+        self.assertEqual(self.pool.mark_failure(2, 'boom'), 0)
+
+    def test_invalid_until_reset(self):
+        self.pool.mark_invalid(1, '401')
+        self.assertEqual(self.states()[1], INVALID)
+        self.assertEqual(self.pool.invalid_indexes(), {1})
+        self.pool.reset()
+        self.assertEqual(self.states(), [HEALTHY] * 3)
+
+    def test_acquire_skips_unusable_keys(self):
+        self.pool.mark_invalid(0)
+        self.pool.mark_rate_limited(1)
+        for _ in range(3):
+            self.assertEqual(self.pool.try_acquire(), (2, 'key-cccccccc-3', 0.0))
+
+    def test_acquire_reports_wait(self):
+        self.pool.mark_invalid(0)
+        self.pool.mark_rate_limited(1)
+        index, key, wait = self.pool.try_acquire(exclude={2})
+        self.assertIsNone(index)
+        self.assertTrue(0 < wait <= 10)
+
+    def test_all_invalid_waits_forever(self):
+        for index in range(3):
+            self.pool.mark_invalid(index)
+        self.assertEqual(self.pool.try_acquire(), (None, None, float('inf')))
+
+    def test_blocking_acquire_fails_fast_on_long_cooldown(self):
+        for index in range(3):
+            self.pool.mark_rate_limited(index)
+        started = time.monotonic()
+        index, key, wait = self.pool.acquire(max_wait=5)
+        self.assertIsNone(index)
+        self.assertGreater(wait, 5)
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_async_acquire(self):
+        index, key, wait = async_to_sync(self.pool.aacquire)()
+        self.assertIsNotNone(index)
+
+    def test_status_masks_keys(self):
+        self.pool.mark_invalid(0)
+        self.pool.mark_rate_limited(1)
+        status = self.pool.status()
+        self.assertEqual((status['healthy'], status['cooldown'], status['invalid']), (1, 1, 1))
+        self.assertEqual(status['keys'][0]['masked'], 'key-aaaa...aa-1')
+        self.assertNotIn('key-aaaaaaaa-1', str(status))
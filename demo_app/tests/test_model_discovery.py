@@ -0,0 +1,83 @@
+import json
+import threading
+import time
+
+from django.test import override_settings
+
+from .. import Smart_api, model_discovery
+from .base import AITestCase
+
+
+class ModelDiscoveryTests(AITestCase):
+    def setUp(self):
+        super().setUp()
+        self.calls = 0
+
+    def fetch(self):
+        self.calls += 1
+        return ['model-a', 'model-b']
+
+    def cache_file(self):
+        return model_discovery._cache_file()
+
+    def test_cache_file_under_temp_dir(self):
+        self.assertEqual(self.cache_file(), self.tmp / 'models.json')
+
+    def test_cold_start_fetches_once_and_writes_file(self):
+        self.assertEqual(model_discovery.get_available_models(self.fetch, 'fake'), ['model-a', 'model-b'])
+        self.assertEqual(model_discovery.get_available_models(self.fetch, 'fake'), ['model-a', 'model-b'])
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(json.loads(self.cache_file().read_text())['models'], ['model-a', 'model-b'])
+
+    def test_fresh_file_means_no_network(self):
+        model_discovery._write_cache_file('fake', ['cached'], time.time())
+        self.assertEqual(model_discovery.get_available_models(self.fetch, 'fake'), ['cached'])
+        self.assertEqual(self.calls, 0)
+
+    def test_other_providers_file_ignored(self):
+        model_discovery._write_cache_file('gemini', ['cached'], time.time())
+        self.assertEqual(model_discovery.get_available_models(self.fetch, 'fake'), ['model-a', 'model-b'])
+
+    def test_stale_file_served_while_refreshing(self):
+        model_discovery._write_cache_file('fake', ['cached'], time.time() - 2 * 24 * 3600)
+        refreshed = threading.Event()
+
+        def fetch():
+            refreshed.set()
+            return ['fresh']
+
+        self.assertEqual(model_discovery.get_available_models(fetch, 'fake'), ['cached'])
+        self.assertTrue(refreshed.wait(2))
+        for _ in range(100):
+            if model_discovery.get_available_models(fetch, 'fake') == ['fresh']:
+                break
+            time.sleep(0.01)
+        self.assertEqual(model_discovery.get_available_models(fetch, 'fake'), ['fresh'])
+
+    def test_failed_discovery_writes_nothing(self):
+        self.assertEqual(model_discovery.get_available_models(lambda: [], 'fake'), [])
+        self.assertFalse(self.cache_file().exists())
+
+    def test_concurrent_cold_start_fetches_once(self):
+        started = threading.Event()
+
+        def slow_fetch():
+            started.set()
+            time.sleep(0.05)
+            return self.fetch()
+
+        threads = [threading.Thread(target=model_discovery.get_available_models, args=(slow_fetch, 'fake'))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+
+    def test_smart_api_uses_discovered_models(self):
+        self.assertEqual(Smart_api.get_available_models(), Smart_api.ai_provider.list_models())
+        self.assertTrue(self.cache_file().exists())
+
+    @override_settings(AI_MODEL_CACHE={'ttl_hours': 0})
+    def test_ttl_from_settings(self):
+        self.assertEqual(model_discovery._ttl_seconds(), 0)
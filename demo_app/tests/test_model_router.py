@@ -0,0 +1,131 @@
+from django.test import SimpleTestCase, override_settings
+
+from .. import Smart_api
+from ..model_router import ModelRouter, price, resolve
+from .base import AITestCase
+
+AVAILABLE = ['fast', 'slow', 'cheap', 'gemini-1.5-flash-001']
+
+ROUTING = {
+    'enabled': True,
+    'ewma_alpha': 0.5,
+    'latency_tolerance': 0.2,
+    'failure_threshold': 3,
+    'min_samples': 5,
+    'max_error_rate': 0.5,
+    'cooldown_seconds': 60,
+    'aliases': {'gemini-1.5-flash': ['gemini-1.5-flash-001']},
+    'costs': {'fast': [1.0, 4.0], 'cheap': [0.1, 0.4], 'slow': [1.0, 4.0]},
+    'tasks': {
+        'story': {'strategy': 'ordered', 'models': ['gemini-2.5-flash', 'gemini-1.5-flash']},
+        'explanation': {'strategy': 'ordered', 'models': ['slow', 'fast']},
+        'flashcards': {'strategy': 'fastest', 'models': ['slow', 'fast', 'cheap']},
+    },
+}
+
+
+@override_settings(AI_MODEL_ROUTING=ROUTING)
+class ModelRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ModelRouter()
+
+    def measure(self, task, latencies):
+        for model, seconds in latencies.items():
+            self.router.record(model, task, seconds, ok=True)
+
+    def test_resolve_exact_or_alias_only(self):
+        available = ['gemini-2.5-flash-lite', 'gemini-1.5-flash-001']
+        self.assertIsNone(resolve('gemini-2.5-flash', available))
+        self.assertEqual(resolve('gemini-1.5-flash', available), 'gemini-1.5-flash-001')
+        self.assertEqual(resolve('gemini-2.5-flash-lite', available), 'gemini-2.5-flash-lite')
+
+    def test_route_skips_unavailable(self):
+        self.assertEqual(self.router.route('story', AVAILABLE, 'fallback'), ['gemini-1.5-flash-001'])
+        self.assertEqual(self.router.route('unknown', AVAILABLE, 'fallback'), ['fallback'])
+
+    def test_ordered_keeps_config_order(self):
+        self.measure('explanation', {'slow': 5.0, 'fast': 0.5})
+        self.assertEqual(self.router.route('explanation', AVAILABLE), ['slow', 'fast'])
+
+    def test_fastest_tries_unmeasured_first(self):
+        self.measure('flashcards', {'slow': 5.0})
+        self.assertEqual(self.router.route('flashcards', AVAILABLE), ['fast', 'cheap', 'slow'])
+
+    def test_fastest_by_latency(self):
+        self.measure('flashcards', {'slow': 5.0, 'fast': 0.5, 'cheap': 2.0})
+        self.assertEqual(self.router.route('flashcards', AVAILABLE), ['fast', 'cheap', 'slow'])
+
+    def test_near_tie_goes_to_cheaper(self):
+        self.measure('flashcards', {'slow': 5.0, 'fast': 1.0, 'cheap': 1.1})
+        self.assertEqual(self.router.route('flashcards', AVAILABLE)[0], 'cheap')
+
+    def test_latency_is_per_task(self):
+        self.measure('explanation', {'cheap': 0.1})
+        self.measure('flashcards', {'slow': 1.0, 'fast': 2.0, 'cheap': 3.0})
+        self.assertEqual(self.router.route('flashcards', AVAILABLE)[0], 'slow')
+
+    def test_consecutive_failures_cool_down(self):
+        for _ in range(3):
+            self.router.record('slow', 'explanation', 1.0, ok=False, error='500')
+        self.assertEqual(self.router.route('explanation', AVAILABLE), ['fast', 'slow'])
+        self.assertGreater(self.router.stats()['slow']['cooldown_remaining'], 0)
+
+    def test_success_resets_failure_streak(self):
+        for ok in (False, False, True, False):
+            self.router.record('slow', 'explanation', 1.0, ok=ok)
+        self.assertEqual(self.router.route('explanation', AVAILABLE)[0], 'slow')
+
+    def test_error_rate_cools_down_after_min_samples(self):
+        for ok in (True, False, True, False, False, True, False):
+            self.router.record('slow', 'explanation', 1.0, ok=ok)
+        self.assertEqual(self.router.route('explanation', AVAILABLE)[0], 'fast')
+
+    def test_excluded_models_last(self):
+        self.assertEqual(self.router.route('explanation', AVAILABLE, exclude={'slow'}), ['fast', 'slow'])
+
+    def test_pool_ignores_health(self):
+        for _ in range(3):
+            self.router.record('slow', 'explanation', 1.0, ok=False)
+        self.assertEqual(self.router.pool('explanation', AVAILABLE), ['slow', 'fast'])
+        self.assertEqual(self.router.pool('unknown', AVAILABLE, 'default'), ['default'])
+
+    def test_disabled_uses_default(self):
+        with override_settings(AI_MODEL_ROUTING=dict(ROUTING, enabled=False)):
+            self.assertEqual(self.router.route('flashcards', AVAILABLE, 'default'), ['default'])
+            self.assertEqual(self.router.pool('flashcards', AVAILABLE, 'default'), ['default'])
+
+    def test_cost_from_tokens(self):
+        self.router.record('cheap', 'flashcards', 1.0, ok=True, prompt_tokens=1_000_000, output_tokens=1_000_000)
+        self.assertAlmostEqual(self.router.stats()['cheap']['cost_usd'], 0.5)
+
+    def test_price_longest_prefix(self):
+        with override_settings(AI_MODEL_ROUTING={'costs': {'gemini-2.5-flash': [0.3, 2.5],
+                                                           'gemini-2.5-flash-lite': [0.1, 0.4]}}):
+            self.assertEqual(price('gemini-2.5-flash-lite-001'), (0.1, 0.4))
+            self.assertEqual(price('gemini-2.5-flash'), (0.3, 2.5))
+            self.assertEqual(price('unknown'), (0.0, 0.0))
+
+    def test_table(self):
+        table = self.router.table(AVAILABLE)
+        self.assertEqual(table['flashcards']['strategy'], 'fastest')
+        self.assertEqual(table['story']['candidates'], ['gemini-1.5-flash-001'])
+
+
+class RoutedCallTests(AITestCase):
+    """call_ai_with_retry goes to the task's model and feeds the router's stats"""
+
+    def test_task_routed_and_recorded(self):
+        task = 'flashcards'
+        Smart_api.call_ai_with_retry('Explain mitosis', task=task)
+        stats = Smart_api.model_router.stats()
+        self.assertEqual(sum(model['calls'] for model in stats.values()), 1)
+        model = next(name for name, model in stats.items() if model['calls'])
+        self.assertIn(model, Smart_api.task_models(task))
+        self.assertIn(task, stats[model]['latency_ewma'])
+
+    def test_failed_model_routed_around(self):
+        available = Smart_api.get_available_models()
+        first = Smart_api.model_router.route('explanation', available, Smart_api.AI_MODEL)[0]
+        for _ in range(3):
+            Smart_api.model_router.record(first, 'explanation', 1.0, ok=False)
+        self.assertNotEqual(Smart_api.model_router.route('explanation', available, Smart_api.AI_MODEL)[0], first)
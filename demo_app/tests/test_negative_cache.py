@@ -0,0 +1,86 @@
+from django.test import override_settings
+
+from .. import Smart_api, batch_api, cache, deadline
+from ..cache import get_cache_key
+from .base import AITestCase
+
+BROKEN_BATCH2 = [{'match': 'Create educational materials for', 'text': 'Sorry, no JSON today'}]
+
+
+class FailureTTLTests(AITestCase):
+    def test_classification(self):
+        examples = {
+            'Error: Rate limit exceeded - retry in 12s': 'rate_limit',
+            'Error: No valid API keys available': 'auth',
+            'Error: No API keys configured': 'config',
+            'Error: Request deadline exceeded': 'deadline',
+            'Error: Request timed out': 'timeout',
+            'Error: Could not parse JSON': 'parse',
+            'Error: Empty response': 'empty',
+            'Error: something else': 'error',
+        }
+        for error, error_class in examples.items():
+            self.assertEqual(cache.classify_failure(error), error_class, error)
+
+    def test_default_ttls(self):
+        for error_class, ttl in cache.FAILURE_TTLS.items():
+            self.assertEqual(cache.failure_ttl(error_class), ttl, error_class)
+        self.assertEqual(cache.failure_ttl('deadline'), 0)
+
+    def test_rate_limit_capped_by_retry_hint(self):
+        self.assertEqual(cache.failure_ttl('rate_limit', 'Retry in 7s'), 7)
+        self.assertEqual(cache.failure_ttl('rate_limit', 'Retry in 900s'), cache.FAILURE_TTLS['rate_limit'])
+
+    @override_settings(AI_NEGATIVE_CACHE={'enabled': True, 'ttl_seconds': {'parse': 5}})
+    def test_settings_override(self):
+        self.assertEqual(cache.failure_ttl('parse'), 5)
+
+    @override_settings(AI_NEGATIVE_CACHE={'enabled': False})
+    def test_disabled(self):
+        self.assertEqual(cache.failure_ttl('auth'), 0)
+
+    def test_deadline_failures_not_remembered(self):
+        self.assertIsNone(cache.save_failure('mitosis', deadline.DEADLINE_ERROR))
+        self.assertIsNone(cache.load_failure('mitosis'))
+
+    def test_failure_round_trip(self):
+        saved = cache.save_failure('mitosis', 'Error: Empty response')
+        self.assertEqual(saved['retry_after'], cache.FAILURE_TTLS['empty'])
+        loaded = cache.load_failure('mitosis')
+        self.assertEqual(loaded['error_class'], 'empty')
+        self.assertTrue(0 < loaded['retry_after'] <= cache.FAILURE_TTLS['empty'])
+
+
+class FailedGenerationTests(AITestCase):
+    def calls(self):
+        return Smart_api.ai_provider.calls
+
+    def test_total_failure_remembered(self):
+        self.fake(error_rates={'401': 1.0})
+        first = batch_api.generate_all_content('mitosis')
+        self.assertGreater(first['retry_after'], 0)
+        calls = self.calls()
+        again = batch_api.generate_all_content('mitosis')
+        self.assertEqual(self.calls(), calls)
+        self.assertTrue(again['errors'][0].startswith('Recent failure'))
+
+    def test_partial_result_cached_with_missing_parts(self):
+        self.fake(responses=BROKEN_BATCH2)
+        results = batch_api.generate_all_content('mitosis')
+        self.assertTrue(results['search'])
+        self.assertEqual(results['missing'], ['flashcards', 'mcqs', 'keywords'])
+        # Served from cache until the parse failure's TTL runs out
+        calls = self.calls()
+        self.assertEqual(batch_api.generate_all_content('mitosis')['search'], results['search'])
+        self.assertEqual(self.calls(), calls)
+
+    def test_regeneration_only_retries_missing_parts(self):
+        self.fake(responses=BROKEN_BATCH2)
+        first = batch_api.generate_all_content('mitosis')
+        self.fake(responses=[])
+        calls = self.calls()
+        results = batch_api._regenerate('mitosis', None, True, get_cache_key('mitosis'))
+        self.assertEqual(self.calls(), calls + 1)
+        self.assertEqual(results['search'], first['search'])
+        self.assertEqual(len(results['flashcards']), 5)
+        self.assertNotIn('missing', results)
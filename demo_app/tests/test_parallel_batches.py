@@ -0,0 +1,46 @@
+import time
+
+from asgiref.sync import async_to_sync
+
+from .. import batch_api
+from .base import AITestCase
+
+LATENCY = 0.5
+
+
+class ParallelBatchTests(AITestCase):
+    """BATCH 2 overlaps BATCH 1: total time ~ one call, not two"""
+
+    def setUp(self):
+        super().setUp()
+        self.fake(latency={'distribution': 'fixed', 'mean': LATENCY})
+
+    def timed(self, generate, *args):
+        started = time.monotonic()
+        results = generate(*args)
+        elapsed = time.monotonic() - started
+        self.assertFalse(results['errors'])
+        self.assertTrue(results['search'])
+        self.assertEqual(len(results['flashcards']), 5)
+        return elapsed
+
+    def test_sync_with_content(self):
+        self.assertLess(self.timed(batch_api.generate_all_content, 'mitosis', 'Cells divide.'), 1.7 * LATENCY)
+
+    def test_sync_streams_batch1(self):
+        self.assertLess(self.timed(batch_api.generate_all_content, 'mitosis'), 1.7 * LATENCY)
+
+    def test_async_with_content(self):
+        elapsed = self.timed(async_to_sync(batch_api.agenerate_all_content), 'mitosis', 'Cells divide.')
+        self.assertLess(elapsed, 1.7 * LATENCY)
+
+    def test_async_streams_batch1(self):
+        self.assertLess(self.timed(async_to_sync(batch_api.agenerate_all_content), 'mitosis'), 1.7 * LATENCY)
+
+    def test_sync_and_async_agree(self):
+        self.fake(latency={'distribution': 'fixed', 'mean': 0.0})
+        results = batch_api.generate_all_content('mitosis')
+        batch_api.get_store().clear()
+        async_results = async_to_sync(batch_api.agenerate_all_content)('mitosis')
+        for part in batch_api.BATCH1_PARTS + batch_api.BATCH2_PARTS:
+            self.assertEqual(async_results[part], results[part])
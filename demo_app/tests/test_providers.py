@@ -0,0 +1,108 @@
+import json
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+
+from .. import Smart_api
+from ..ai_providers import (FakeProvider, InvalidKeyError, ProviderTimeoutError, RateLimitError,
+                            error_kind, extract_topic)
+from .base import AITestCase
+
+
+class FakeProviderTests(SimpleTestCase):
+    def test_same_prompt_same_reply(self):
+        prompt = 'Explain photosynthesis'
+        self.assertEqual(FakeProvider().generate(prompt, 'gemini-2.5-flash'),
+                         FakeProvider().generate(prompt, 'gemini-2.5-flash'))
+
+    def test_recognises_batch_prompts(self):
+        reply = FakeProvider().render('Create educational materials for: mitosis\n"flashcards" ... "mcqs"')
+        data = json.loads(reply)
+        self.assertEqual([len(data[part]) for part in ('flashcards', 'mcqs', 'keywords')], [5, 5, 5])
+
+    def test_explanation_sections(self):
+        reply = FakeProvider().render('Generate TWO outputs for: mitosis\n---EXPLANATION---')
+        self.assertIn('---STORY---', reply)
+        self.assertTrue(reply.rstrip().endswith('---END---'))
+
+    def test_malformed_json(self):
+        provider = FakeProvider({'malformed_json_rate': 1.0})
+        with self.assertRaises(ValueError):
+            json.loads(provider.generate('Create educational materials for: mitosis "flashcards" "mcqs"', 'm'))
+
+    def test_injected_errors(self):
+        for kind, error in (('429', RateLimitError), ('401', InvalidKeyError), ('timeout', ProviderTimeoutError)):
+            with self.assertRaises(error):
+                FakeProvider({'error_rates': {kind: 1.0}}).generate('Explain mitosis', 'm')
+
+    def test_timeout_shorter_than_latency(self):
+        provider = FakeProvider({'latency': {'distribution': 'fixed', 'mean': 5.0}})
+        with self.assertRaises(ProviderTimeoutError):
+            provider.generate('Explain mitosis', 'm', timeout=0.01)
+
+    def test_usage_reported(self):
+        usage = {}
+        FakeProvider().generate('Explain mitosis', 'm', usage=usage)
+        self.assertGreater(usage['output_tokens'], 0)
+
+    def test_stream_joins_to_reply(self):
+        provider = FakeProvider({'chunk_chars': 50})
+        chunks = list(provider.stream('Explain mitosis', 'm'))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(''.join(chunks), provider.render('Explain mitosis'))
+
+    def test_fake_keys_and_models(self):
+        provider = FakeProvider({'keys': 2})
+        self.assertEqual(len(set(provider.fake_keys())), 2)
+        self.assertIn('gemini-2.5-flash', provider.list_models())
+
+    def test_extract_topic(self):
+        self.assertEqual(extract_topic('Generate TWO outputs for: black holes'), 'black holes')
+        self.assertEqual(extract_topic('Extract 6 key terms about: DNA'), 'DNA')
+
+
+class ErrorKindTests(SimpleTestCase):
+    def test_types(self):
+        self.assertEqual(error_kind(RateLimitError('slow down')), 'rate_limit')
+        self.assertEqual(error_kind(InvalidKeyError('bad key')), 'invalid_key')
+
+    def test_status_codes(self):
+        self.assertEqual(error_kind(Exception('429 Resource has been exhausted')), 'rate_limit')
+        self.assertEqual(error_kind(Exception('400 API key not valid')), 'invalid_key')
+
+    def test_words_containing_rate_are_errors(self):
+        self.assertEqual(error_kind(Exception('Failed to generate content')), 'error')
+        self.assertEqual(error_kind(Exception('Response blocked by moderate filter')), 'error')
+        self.assertEqual(error_kind(Exception('Timeout after 4290ms')), 'error')
+
+
+class RetryTests(AITestCase):
+    """call_ai_with_retry / acall_ai_with_retry against the fake provider"""
+
+    def rate_limited(self):
+        return [state.rate_limited for state in Smart_api.key_pool.states]
+
+    def test_success(self):
+        result = Smart_api.call_ai_with_retry('Explain mitosis')
+        self.assertFalse(result.startswith('Error:'))
+
+    def test_async_success(self):
+        result = async_to_sync(Smart_api.acall_ai_with_retry)('Explain mitosis')
+        self.assertEqual(result, Smart_api.call_ai_with_retry('Explain mitosis'))
+
+    def test_rate_limits_rotate_keys(self):
+        self.fake(error_rates={'429': 1.0})
+        result = Smart_api.call_ai_with_retry('Explain mitosis', max_retries=len(Smart_api.key_pool))
+        self.assertTrue(result.startswith('Error:'))
+        # One 429 per key - every retry went to a key that hadn't failed yet
+        self.assertEqual(self.rate_limited(), [1] * len(Smart_api.key_pool))
+
+    def test_invalid_keys_never_reused(self):
+        self.fake(error_rates={'401': 1.0})
+        Smart_api.call_ai_with_retry('Explain mitosis', max_retries=len(Smart_api.key_pool))
+        self.assertEqual(Smart_api.key_pool.invalid_indexes(), set(range(len(Smart_api.key_pool))))
+        self.assertEqual(Smart_api.call_ai_with_retry('Explain mitosis'), 'Error: No valid API keys available')
+
+    def test_stream_matches_call(self):
+        chunks = list(Smart_api.stream_ai_with_retry('Explain mitosis'))
+        self.assertEqual(''.join(chunks), Smart_api.call_ai_with_retry('Explain mitosis'))
@@ -0,0 +1,129 @@
+import datetime
+from unittest import mock
+
+from django.db.models import Sum
+from django.test import TestCase
+
+from .. import Smart_api, quota
+from ..models import QuotaUsage
+from ..quota import QuotaLedger, key_id
+from .base import AITestCase
+
+
+class QuotaLedgerTests(TestCase):
+    def ledger(self, limits=(10, 5), **kwargs):
+        ledger = QuotaLedger([f'key-{i}' for i in range(len(limits))], limits, read_cache_seconds=0, **kwargs)
+        self.addCleanup(ledger.stop)
+        return ledger
+
+    def test_key_id_never_the_key(self):
+        self.assertNotIn('secret', key_id('secret-key'))
+        self.assertEqual(key_id('secret-key'), key_id('secret-key'))
+
+    def test_record_buffers_until_flush(self):
+        ledger = self.ledger(flush_seconds=60)
+        ledger.record(0, 'm', prompt_tokens=10, output_tokens=20)
+        self.assertFalse(QuotaUsage.objects.exists())
+        # Unflushed counts already show up for readers
+        self.assertEqual(ledger.quota_info()['calls_made'], 1)
+        ledger.flush()
+        row = QuotaUsage.objects.get()
+        self.assertEqual((row.key_id, row.model, row.calls, row.prompt_tokens, row.output_tokens),
+                         (key_id('key-0'), 'm', 1, 10, 20))
+
+    def test_flush_increments(self):
+        ledger = self.ledger(flush_seconds=60)
+        for _ in range(2):
+            ledger.record(0, 'm')
+            ledger.flush()
+        self.assertEqual(QuotaUsage.objects.get().calls, 2)
+
+    def test_shared_rows(self):
+        """Two workers' ledgers add up to one total"""
+        first, second = self.ledger(flush_seconds=60), self.ledger(flush_seconds=60)
+        first.record(0, 'm')
+        second.record(0, 'm')
+        first.flush()
+        second.flush()
+        self.assertEqual(QuotaUsage.objects.get().calls, 2)
+        self.assertEqual(first.quota_info()['calls_made'], 2)
+
+    def test_quota_info(self):
+        ledger = self.ledger()
+        for _ in range(3):
+            ledger.record(0, 'm')
+        ledger.record(1, 'm', calls=0, rate_limited=1)
+        info = ledger.quota_info()
+        self.assertEqual((info['calls_made'], info['quota_limit'], info['remaining']), (3, 15, 12))
+        self.assertEqual(info['usage_percent'], 20.0)
+        self.assertEqual(ledger.quota_info(unusable={1})['quota_limit'], 10)
+
+    def test_key_remaining(self):
+        ledger = self.ledger(limits=(2, 5))
+        for _ in range(3):
+            ledger.record(0, 'm')
+        self.assertEqual(ledger.key_remaining(), [0, 5])
+        self.assertEqual(ledger.key_remaining(unusable={1}), [0, 0])
+
+    def test_status_breakdown(self):
+        ledger = self.ledger()
+        ledger.record(0, 'a')
+        ledger.record(1, 'b', errors=1)
+        status = ledger.status()
+        self.assertEqual([key['calls'] for key in status['keys']], [1, 1])
+        self.assertEqual(status['models']['b']['errors'], 1)
+
+    def test_new_day_starts_fresh(self):
+        ledger = self.ledger()
+        today = quota.quota_day()
+        with mock.patch.object(quota, 'quota_day', return_value=today - datetime.timedelta(days=1)):
+            ledger.record(0, 'm')
+            ledger.flush()
+        self.assertEqual(ledger.quota_info()['calls_made'], 0)
+        self.assertEqual(ledger.key_remaining(), [10, 5])
+
+    def test_failed_write_kept(self):
+        ledger = self.ledger(flush_seconds=60)
+        ledger.record(0, 'm')
+        with mock.patch.object(ledger, '_apply', side_effect=Exception('database is locked')), mock.patch('builtins.print'):
+            ledger.flush()
+        self.assertFalse(QuotaUsage.objects.exists())
+        ledger.flush()
+        self.assertEqual(QuotaUsage.objects.get().calls, 1)
+
+    def test_flush_thread(self):
+        ledger = self.ledger(flush_seconds=0.01)
+        ledger.record(0, 'm')
+        thread = ledger._thread
+        self.assertTrue(thread.is_alive())
+        ledger.stop()
+        self.assertFalse(thread.is_alive())
+        self.assertIsNone(ledger._thread)
+        self.assertEqual(QuotaUsage.objects.get().calls, 1)
+
+    def test_stop_flushes_and_restarts(self):
+        ledger = self.ledger(flush_seconds=60)
+        ledger.record(0, 'm')
+        ledger.stop()
+        self.assertEqual(QuotaUsage.objects.get().calls, 1)
+        ledger.record(0, 'm')
+        self.assertTrue(ledger._thread.is_alive())
+        ledger.stop()
+        self.assertEqual(QuotaUsage.objects.get().calls, 2)
+
+
+class QuotaRecordingTests(AITestCase):
+    """Smart_api records every provider call in the ledger"""
+
+    def test_calls_recorded(self):
+        before = Smart_api.get_quota_info()['calls_made']
+        Smart_api.call_ai_with_retry('Explain mitosis')
+        info = Smart_api.get_quota_info()
+        self.assertEqual(info['calls_made'], before + 1)
+        self.assertGreater(info['output_tokens'], 0)
+
+    def test_rate_limits_recorded(self):
+        self.fake(error_rates={'429': 1.0})
+        Smart_api.call_ai_with_retry('Explain mitosis', max_retries=1)
+        Smart_api.quota_ledger.stop()
+        self.assertEqual(QuotaUsage.objects.aggregate(total=Sum('rate_limited'))['total'], 1)
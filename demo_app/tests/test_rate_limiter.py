@@ -0,0 +1,83 @@
+import time
+
+from django.test import SimpleTestCase
+
+from ..rate_limiter import KeyRateLimiter, TokenBucket, estimate_tokens
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_starts_full(self):
+        bucket = TokenBucket(rate=1, capacity=5)
+        self.assertEqual(bucket.wait_time(5, time.monotonic()), 0.0)
+
+    def test_wait_for_refill(self):
+        bucket = TokenBucket(rate=2, capacity=5)
+        bucket.take(5)
+        self.assertAlmostEqual(bucket.wait_time(1, bucket.updated), 0.5)
+
+    def test_refill_capped_at_capacity(self):
+        bucket = TokenBucket(rate=100, capacity=5)
+        bucket.take(5)
+        bucket.wait_time(1, bucket.updated + 60)
+        self.assertEqual(bucket.tokens, 5)
+
+    def test_oversized_request_waits_for_a_full_bucket(self):
+        bucket = TokenBucket(rate=1, capacity=5)
+        self.assertEqual(bucket.wait_time(50, time.monotonic()), 0.0)
+
+    def test_zero_rate_never_refills(self):
+        bucket = TokenBucket(rate=0, capacity=1)
+        bucket.take(1)
+        self.assertEqual(bucket.wait_time(1, time.monotonic()), float('inf'))
+
+
+class KeyRateLimiterTests(SimpleTestCase):
+    def limiter(self, rpm=2, tpm=1000, keys=2):
+        return KeyRateLimiter([{'rpm': rpm, 'tpm': tpm}] * keys)
+
+    def test_round_robin(self):
+        limiter = self.limiter()
+        self.assertEqual([limiter.try_acquire()[0] for _ in range(4)], [0, 1, 0, 1])
+
+    def test_rpm_exhausted_reports_wait(self):
+        limiter = self.limiter(rpm=1, keys=1)
+        self.assertEqual(limiter.try_acquire(), (0, 0.0))
+        index, wait = limiter.try_acquire()
+        self.assertIsNone(index)
+        self.assertAlmostEqual(wait, 60, delta=0.1)
+
+    def test_tpm_limits_big_prompts(self):
+        limiter = self.limiter(rpm=100, tpm=1000, keys=1)
+        self.assertEqual(limiter.try_acquire(tokens=800)[0], 0)
+        self.assertIsNone(limiter.try_acquire(tokens=800)[0])
+        self.assertEqual(limiter.try_acquire(tokens=100)[0], 0)
+
+    def test_exclude(self):
+        limiter = self.limiter(keys=3)
+        self.assertEqual({limiter.try_acquire(exclude={1})[0] for _ in range(4)}, {0, 2})
+
+    def test_settle_refunds_unused_tokens(self):
+        limiter = self.limiter(rpm=100, tpm=1000, keys=1)
+        limiter.try_acquire(tokens=900)
+        limiter.settle(0, reserved_tokens=900, used_tokens=100)
+        self.assertEqual(limiter.try_acquire(tokens=800)[0], 0)
+
+    def test_capacity_reserves_nothing(self):
+        limiter = self.limiter(rpm=3, keys=2)
+        self.assertEqual(limiter.capacity(), (6, 0.0))
+        self.assertEqual(limiter.capacity(indexes=[1]), (3, 0.0))
+        self.assertEqual(limiter.capacity(), (6, 0.0))
+
+    def test_acquire_times_out(self):
+        limiter = self.limiter(rpm=1, keys=1)
+        limiter.try_acquire()
+        self.assertIsNone(limiter.acquire(timeout=0.05))
+
+    def test_status(self):
+        status = self.limiter(rpm=5, tpm=100, keys=1).status()
+        self.assertEqual(status, [{'key': 1, 'rpm_limit': 5, 'tpm_limit': 100,
+                                   'requests_available': 5, 'tokens_available': 100}])
+
+    def test_estimate_tokens(self):
+        self.assertEqual(estimate_tokens(''), 1)
+        self.assertEqual(estimate_tokens('x' * 400), 101)
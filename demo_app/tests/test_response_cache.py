@@ -0,0 +1,85 @@
+import json
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.test import AsyncRequestFactory, RequestFactory, override_settings
+
+from .. import Smart_api, views, views_async
+from ..response_cache import response_key
+from .base import AITestCase
+
+
+class ResponseCacheTests(AITestCase):
+    """@cache_ai_response on /ai/ and /story/"""
+
+    def calls(self):
+        return Smart_api.ai_provider.calls
+
+    def get(self, params, view=views.get_ai_response, path='/ai/', **headers):
+        return view(RequestFactory().get(path, params, **headers))
+
+    def test_miss_then_hit(self):
+        first = self.get({'prompt': 'mitosis'})
+        calls = self.calls()
+        second = self.get({'prompt': 'mitosis'})
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(json.loads(second.content), json.loads(first.content))
+        self.assertEqual(self.calls(), calls)
+
+    def test_normalized_prompt_shares_entry(self):
+        self.get({'prompt': 'Photosynthesis'})
+        self.assertEqual(self.get({'prompt': '  photosynthesis '})['X-Cache'], 'HIT')
+
+    def test_if_none_match(self):
+        etag = self.get({'prompt': 'mitosis'})['ETag']
+        response = self.get({'prompt': 'mitosis'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(self.get({'prompt': 'mitosis'}, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_cache_control(self):
+        with override_settings(AI_RESPONSE_CACHE={'max_age': 60, 'stale_while_revalidate': 120}):
+            cache_control = self.get({'prompt': 'mitosis'})['Cache-Control']
+        for directive in ('public', 'max-age=60', 'stale-while-revalidate=120'):
+            self.assertIn(directive, cache_control)
+
+    def test_errors_not_cached(self):
+        self.fake(error_rates={'401': 1.0})
+        response = self.get({'prompt': 'mitosis'})
+        self.assertIn('no-store', response['Cache-Control'])
+        self.assertNotIn('ETag', response)
+        self.fake(error_rates={})
+        self.assertNotEqual(self.get({'prompt': 'mitosis'}).get('X-Cache'), 'HIT')
+
+    def test_empty_prompt_bypasses(self):
+        response = self.get({'prompt': ''})
+        self.assertNotIn('X-Cache', response)
+
+    def test_params_in_key(self):
+        story = views.generate_story
+        self.get({'concept': 'gravity'}, view=story, path='/story/')
+        self.assertEqual(self.get({'concept': 'gravity', 'tone': 'simple'}, view=story, path='/story/')['X-Cache'], 'HIT')
+        self.assertEqual(self.get({'concept': 'gravity', 'tone': 'funny'}, view=story, path='/story/')['X-Cache'], 'MISS')
+
+    def test_key_includes_task_models(self):
+        self.assertNotEqual(response_key('ai_view', 1, 'mitosis', {}, 'gemini-2.5-flash'),
+                            response_key('ai_view', 1, 'mitosis', {}, 'gemini-2.0-flash'))
+        self.get({'prompt': 'mitosis'})
+        routing = dict(settings.AI_MODEL_ROUTING, tasks={'explanation': {'strategy': 'ordered', 'models': ['gemini-2.0-flash']}})
+        with override_settings(AI_MODEL_ROUTING=routing):
+            self.assertEqual(self.get({'prompt': 'mitosis'})['X-Cache'], 'MISS')
+
+    def test_disabled(self):
+        with override_settings(AI_RESPONSE_CACHE={'enabled': False}):
+            self.get({'prompt': 'mitosis'})
+            calls = self.calls()
+            response = self.get({'prompt': 'mitosis'})
+        self.assertNotIn('X-Cache', response)
+        self.assertGreater(self.calls(), calls)
+
+    def test_async_view_shares_entries(self):
+        first = async_to_sync(views_async.get_ai_response)(AsyncRequestFactory().get('/ai/', {'prompt': 'mitosis'}))
+        self.assertEqual(first['X-Cache'], 'MISS')
+        second = self.get({'prompt': 'mitosis'})
+        self.assertEqual((second['X-Cache'], second['ETag']), ('HIT', first['ETag']))
@@ -0,0 +1,142 @@
+import asyncio
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from ..single_flight import SingleFlight, fcntl
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        self.lock_dir = Path(tempfile.mkdtemp(prefix='smartlearn-locks-'))
+        self.addCleanup(shutil.rmtree, self.lock_dir, ignore_errors=True)
+        self.flight = SingleFlight(lock_dir=self.lock_dir, wait_timeout=5)
+        self.calls = 0
+
+    def slow(self, result='generated', seconds=0.1):
+        def fn():
+            self.calls += 1
+            time.sleep(seconds)
+            return result
+        return fn
+
+    def run_threads(self, count, target):
+        results = [None] * count
+
+        def run(i):
+            results[i] = target()
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def hold_lock(self, key):
+        """Take the key's lock file like another gunicorn worker would"""
+        self.lock_dir.mkdir(parents=True, exist_ok=True)
+        handle = open(self.flight._lock_path(key), 'a')
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return handle
+
+    def test_concurrent_calls_share_one_generation(self):
+        results = self.run_threads(8, lambda: self.flight.do('mitosis', self.slow()))
+        self.assertEqual(results, ['generated'] * 8)
+        self.assertEqual(self.calls, 1)
+        stats = self.flight.stats()
+        self.assertEqual((stats['leaders'], stats['followers'], stats['in_flight']), (1, 7, 0))
+
+    def test_different_keys_do_not_wait_on_each_other(self):
+        keys = iter(['a', 'b', 'c', 'd'])
+        lock = threading.Lock()
+
+        def run():
+            with lock:
+                key = next(keys)
+            return self.flight.do(key, self.slow(key, 0.2))
+
+        started = time.monotonic()
+        self.assertEqual(sorted(self.run_threads(4, run)), ['a', 'b', 'c', 'd'])
+        self.assertLess(time.monotonic() - started, 0.6)
+
+    def test_followers_get_the_leaders_error(self):
+        def fail():
+            time.sleep(0.1)
+            raise ValueError('boom')
+
+        def run():
+            try:
+                self.flight.do('mitosis', fail)
+            except ValueError as e:
+                return str(e)
+
+        self.assertEqual(self.run_threads(4, run), ['boom'] * 4)
+
+    def test_recheck_skips_generation(self):
+        self.assertEqual(self.flight.do('mitosis', self.slow(), recheck=lambda: 'cached'), 'cached')
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(self.flight.stats()['worker_hits'], 1)
+
+    def test_lock_files_deleted(self):
+        self.run_threads(4, lambda: self.flight.do('mitosis', self.slow()))
+        self.flight.do('photosynthesis', self.slow(seconds=0))
+        self.assertEqual(list(self.lock_dir.iterdir()), [])
+
+    @unittest.skipIf(fcntl is None, 'host-wide locks need fcntl')
+    def test_waits_for_another_worker_then_reads_its_result(self):
+        handle = self.hold_lock('mitosis')
+        finished = []
+
+        def other_worker():
+            time.sleep(0.2)
+            finished.append('from other worker')
+            handle.close()
+
+        threading.Thread(target=other_worker).start()
+        result = self.flight.do('mitosis', self.slow(), recheck=lambda: finished[0] if finished else None)
+        self.assertEqual(result, 'from other worker')
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(list(self.lock_dir.iterdir()), [])
+
+    @unittest.skipIf(fcntl is None, 'host-wide locks need fcntl')
+    def test_gives_up_waiting_after_timeout(self):
+        handle = self.hold_lock('mitosis')
+        self.addCleanup(handle.close)
+        flight = SingleFlight(lock_dir=self.lock_dir, wait_timeout=0.2)
+        self.assertEqual(flight.do('mitosis', self.slow(seconds=0)), 'generated')
+        self.assertEqual(flight.stats()['timeouts'], 1)
+
+    def test_disabled(self):
+        flight = SingleFlight(lock_dir=self.lock_dir, enabled=False)
+        self.run_threads(3, lambda: flight.do('mitosis', self.slow()))
+        self.assertEqual(self.calls, 3)
+
+    def test_async_callers_share_one_generation(self):
+        async def generate():
+            self.calls += 1
+            await asyncio.sleep(0.1)
+            return 'generated'
+
+        async def run():
+            return await asyncio.gather(*(self.flight.ado('mitosis', generate) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(run()), ['generated'] * 5)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(list(self.lock_dir.iterdir()), [])
+
+    def test_async_recheck(self):
+        async def recheck():
+            return 'cached'
+
+        async def generate():
+            self.calls += 1
+            return 'generated'
+
+        self.assertEqual(asyncio.run(self.flight.ado('mitosis', generate, recheck)), 'cached')
+        self.assertEqual(self.calls, 0)
@@ -0,0 +1,76 @@
+import threading
+
+from asgiref.sync import async_to_sync
+
+from .. import cache
+from ..cache import load_from_cache, load_or_revalidate, save_to_cache, schedule_refresh
+from .base import AITestCase
+
+RESULT = {'topic': 'mitosis', 'search': 'Cells divide'}
+
+
+class StaleWhileRevalidateTests(AITestCase):
+    def setUp(self):
+        super().setUp()
+        self.refreshed = threading.Event()
+        self.refreshes = 0
+
+    def refresh(self):
+        self.refreshes += 1
+        save_to_cache('ai_mitosis', dict(RESULT, search='Refreshed'))
+        self.refreshed.set()
+
+    def save_stale(self):
+        save_to_cache('ai_mitosis', RESULT, ttl_hours=-0.001, stale_hours=1)
+
+    def test_fresh_entry_not_refreshed(self):
+        save_to_cache('ai_mitosis', RESULT)
+        self.assertEqual(load_or_revalidate('ai_mitosis', self.refresh), RESULT)
+        self.assertFalse(self.refreshed.wait(0.1))
+
+    def test_stale_entry_served_and_refreshed_in_background(self):
+        self.save_stale()
+        self.assertIsNone(load_from_cache('ai_mitosis'))
+        self.assertEqual(load_or_revalidate('ai_mitosis', self.refresh), RESULT)
+        self.assertTrue(self.refreshed.wait(5))
+        self.assertEqual(load_from_cache('ai_mitosis')['search'], 'Refreshed')
+
+    def test_async_lookup(self):
+        self.save_stale()
+        self.assertEqual(async_to_sync(cache.aload_or_revalidate)('ai_mitosis', self.refresh), RESULT)
+        self.assertTrue(self.refreshed.wait(5))
+
+    def test_one_refresh_per_key(self):
+        release = threading.Event()
+
+        def slow_refresh():
+            release.wait(5)
+            self.refresh()
+
+        self.save_stale()
+        for _ in range(5):
+            load_or_revalidate('ai_mitosis', slow_refresh)
+        release.set()
+        self.assertTrue(self.refreshed.wait(5))
+        self.assertEqual(self.refreshes, 1)
+
+    def test_failed_refresh_can_be_retried(self):
+        failed = threading.Event()
+
+        def broken():
+            failed.set()
+            raise RuntimeError('provider down')
+
+        self.assertTrue(schedule_refresh('ai_mitosis', broken))
+        self.assertTrue(failed.wait(5))
+        # The key is released once the refresh ends, even when it failed
+        for _ in range(50):
+            if schedule_refresh('ai_mitosis', self.refresh):
+                break
+            self.refreshed.wait(0.01)
+        self.assertTrue(self.refreshed.wait(5))
+
+    def test_past_hard_ttl_is_a_miss(self):
+        save_to_cache('ai_mitosis', RESULT, ttl_hours=-0.002, stale_hours=0.001)
+        self.assertIsNone(load_or_revalidate('ai_mitosis', self.refresh))
+        self.assertFalse(self.refreshed.wait(0.1))
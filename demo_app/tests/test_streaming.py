@@ -0,0 +1,96 @@
+import json
+
+from asgiref.sync import async_to_sync
+from django.test import AsyncRequestFactory, RequestFactory
+
+from .. import views, views_async
+from .base import AITestCase
+
+
+def parse_events(body):
+    """[(event, data)] from an SSE body"""
+    events = []
+    for frame in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in frame.splitlines())
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def read(response):
+    if response.is_async:
+        async def collect():
+            return [chunk async for chunk in response.streaming_content]
+        chunks = async_to_sync(collect)()
+    else:
+        chunks = list(response.streaming_content)
+    return parse_events(b''.join(chunks).decode())
+
+
+class StreamAIResponseTests(AITestCase):
+    def stream(self, params, view=views.stream_ai_response, factory=RequestFactory):
+        response = view(factory().get('/ai/stream/', params))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        return read(response)
+
+    def astream(self, params):
+        return self.stream(params, async_to_sync(views_async.stream_ai_response), AsyncRequestFactory)
+
+    def test_chunks_then_done(self):
+        self.fake(chunk_chars=100)
+        events = self.stream({'prompt': 'mitosis'})
+        names = [name for name, _ in events]
+        self.assertGreater(names.count('chunk'), 1)
+        self.assertEqual(names[-1], 'done')
+        self.assertEqual(''.join(data['text'] for name, data in events if name == 'chunk'), events[-1][1]['response'])
+
+    def test_async_stream_from_async_generator(self):
+        self.fake(chunk_chars=100)
+        response = async_to_sync(views_async.stream_ai_response)(AsyncRequestFactory().get('/ai/stream/', {'prompt': 'mitosis'}))
+        self.assertTrue(response.is_async)
+        self.assertEqual(read(response)[-1], self.stream({'prompt': 'mitosis'})[-1])
+
+    def test_shares_the_ai_cache_entry(self):
+        streamed = self.stream({'prompt': 'mitosis'})[-1][1]['response']
+        self.fake(error_rates={'429': 1.0})  # anything not served from the cache fails now
+        response = views.get_ai_response(RequestFactory().get('/ai/', {'prompt': 'What is mitosis?'}))
+        self.assertEqual(json.loads(response.content)['response'], streamed)
+        self.assertEqual(self.astream({'prompt': 'mitosis'})[-1][1]['response'], streamed)
+
+    def test_empty_prompt(self):
+        self.assertEqual(self.stream({}), [('done', {'response': 'Please enter something.'})])
+        self.assertEqual(self.astream({}), [('done', {'response': 'Please enter something.'})])
+
+    def test_provider_failure_is_an_error_event(self):
+        self.fake(error_rates={'429': 1.0})
+        self.assertEqual(self.stream({'prompt': 'mitosis'})[-1][0], 'error')
+        self.assertEqual(self.astream({'prompt': 'mitosis'})[-1][0], 'error')
+
+
+class StreamSearchAllTests(AITestCase):
+    def stream(self, params, view=views.stream_search_all, factory=RequestFactory):
+        return read(view(factory().get('/ai/search-all/stream/', params)))
+
+    def test_event_order(self):
+        events = self.stream({'topic': 'mitosis'})
+        names = [name for name, _ in events]
+        self.assertEqual(names[-2:], ['materials', 'done'])
+        self.assertLess(names.index('explanation'), names.index('materials'))
+        done = events[-1][1]['data']
+        self.assertEqual(len(done['flashcards']), 5)
+        self.assertEqual(''.join(data['text'] for name, data in events if name == 'explanation').strip(), done['search'])
+
+    def test_async_matches_sync(self):
+        sync_done = self.stream({'topic': 'mitosis', 'content': 'notes'})[-1]
+        async_done = self.stream({'topic': 'mitosis', 'content': 'notes'},
+                                 async_to_sync(views_async.stream_search_all), AsyncRequestFactory)[-1]
+        self.assertEqual(async_done, sync_done)
+
+    def test_cached_search_is_one_done_event(self):
+        self.stream({'topic': 'mitosis'})
+        events = self.stream({'topic': 'mitosis'})
+        self.assertEqual([name for name, _ in events], ['done'])
+
+    def test_bad_topic_is_rejected_before_streaming(self):
+        response = views.stream_search_all(RequestFactory().get('/ai/search-all/stream/', {'topic': 'x' * 300}))
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,76 @@
+from django.test import SimpleTestCase
+
+from .. import cache, topic_index
+from ..topic_index import fold_plural, normalize_topic
+from .base import AITestCase
+
+
+class NormalizationTests(SimpleTestCase):
+    def test_question_forms(self):
+        for topic in ('What is Photosynthesis?', 'photosynthesis', 'Explain photosynthesis',
+                      '  PHOTOSYNTHESIS!! '):
+            self.assertEqual(normalize_topic(topic), 'photosynthesis', topic)
+
+    def test_trailing_filler(self):
+        self.assertEqual(normalize_topic('cell division process'), 'cell division')
+        self.assertEqual(normalize_topic('Theory of evolution explained in detail'), 'theory evolution')
+        self.assertEqual(normalize_topic('process scheduling'), 'process scheduling')
+
+    def test_plurals(self):
+        self.assertEqual(normalize_topic('Black Holes'), 'black hole')
+        self.assertEqual(fold_plural('cells'), 'cell')
+        self.assertEqual(fold_plural('theories'), 'theory')
+        self.assertEqual(fold_plural('species'), 'species')
+        self.assertEqual(fold_plural('physics'), 'physics')
+        self.assertEqual(fold_plural('classes'), 'class')
+        self.assertEqual(fold_plural('taxes'), 'tax')
+
+    def test_irregular_plurals(self):
+        self.assertEqual(normalize_topic('axes'), normalize_topic('axis'))
+        self.assertEqual(normalize_topic('Hypotheses'), 'hypothesis')
+
+    def test_symbols_kept(self):
+        self.assertNotEqual(normalize_topic('C++'), normalize_topic('C#'))
+
+    def test_opposite_prefixes(self):
+        self.assertTrue(topic_index.opposite_prefixes('organic chemistry', 'inorganic chemistry'))
+        self.assertTrue(topic_index.opposite_prefixes('hyperthyroidism', 'hypothyroidism'))
+        self.assertTrue(topic_index.opposite_prefixes('supervised learning', 'unsupervised learning'))
+        self.assertFalse(topic_index.opposite_prefixes('cell division', 'cell membrane'))
+
+
+class CollisionTests(SimpleTestCase):
+    """Distinct topics must never normalize to the same key"""
+
+    PAIRS = [
+        ('Work and Power', 'Power'),
+        ('Work energy theorem', 'energy theorem'),
+        ('IT security', 'security'),
+        ('Gaussian process', 'Gaussian'),
+        ('Markov process', 'Markov'),
+        ('Poisson process', 'Poisson'),
+        ('works of Shakespeare', 'Shakespeare'),
+        ('axes', 'ax'),
+    ]
+
+    def test_pairs_keep_their_own_key(self):
+        for a, b in self.PAIRS:
+            self.assertNotEqual(normalize_topic(a), normalize_topic(b), (a, b))
+
+    def test_filler_alone_is_kept(self):
+        self.assertEqual(normalize_topic('the process'), 'process')
+        self.assertEqual(normalize_topic('Examples'), 'example')
+
+
+class CacheKeyTests(AITestCase):
+    def test_variants_share_a_key(self):
+        self.assertEqual(cache.get_cache_key('What is Photosynthesis?'), 'photosynthesis')
+        self.assertEqual(cache.get_cache_key('photosynthesis'), cache.get_cache_key('Photosynthesis.'))
+
+    def test_near_duplicates_keep_their_own_key(self):
+        cache.remember_topic('supervised learning')
+        self.assertNotEqual(cache.get_cache_key('unsupervised learning'), cache.get_cache_key('supervised learning'))
+
+    def test_content_hash_suffix(self):
+        content_hash = cache.get_content_hash('some notes')
+        self.assertEqual(cache.get_cache_key('Mitosis', content_hash), f"mitosis_{content_hash}")
@@ -0,0 +1,395 @@
+"""
+Topic normalization + near-duplicate lookup for cache keys
+"Photosynthesis", "photosynthesis." and "What is photosynthesis?" should
+all hit the same cache entry (and "cell division process" the same one as
+"cell division").
+
+1. normalize_topic(): lowercase, strip punctuation, question prefixes,
+   stopwords and trailing filler words, fold plurals, collapse whitespace.
+   Only words that carry no meaning are dropped: "IT security", "Work and
+   Power" and "Gaussian process" keep their own keys.
+2. TopicIndex: MinHash signatures of character 3-grams, banded into an LSH
+   table. A lookup returns the already-known topic most similar to the
+   query when the estimated Jaccard similarity is above the threshold.
+   Topics that differ by a prefix like un-/in-/non-/hyper-/hypo- never match
+   ("supervised learning" vs "unsupervised learning").
+
+Cache keys only use (1) unless AI_TOPIC_INDEX['fuzzy'] is on - trigram
+similarity can't tell "organic chemistry" from "inorganic chemistry".
+The index itself is always kept for the admission ladder's related topics.
+
+Topics are registered once their result has been cached, and appended to
+ai_cache/meta/topics.tsv (at most max_topics lines), so every worker on the
+host sees the same spellings (new lines are picked up lazily).
+"""
+
+import os
+import random
+import re
+import threading
+import unicodedata
+import zlib
+from array import array
+from pathlib import Path
+
+from django.conf import settings
+
+DEFAULT_TOPICS_FILE = Path(__file__).parent / 'ai_cache' / 'meta' / 'topics.tsv'
+
+# ============================================
+# Normalization
+# ============================================
+QUESTION_PREFIXES = [
+    'what is the', 'what is a', 'what is an', 'what is', 'what are the', 'what are', "what's",
+    'who is', 'who was', 'how does', 'how do', 'how is', 'how are', 'why is', 'why do',
+    'explain the', 'explain', 'define', 'definition of', 'meaning of', 'describe',
+    'tell me about', 'teach me about', 'teach me', 'learn about', 'introduction to', 'intro to',
+    'overview of', 'basics of', 'what do you mean by', 'what is meant by',
+]
+# Sorted longest first so "what is the" wins over "what is"
+QUESTION_PREFIXES.sort(key=len, reverse=True)
+
+STOPWORDS = {
+    'a', 'an', 'the', 'of', 'in', 'on', 'to', 'for', 'and', 'with', 'about', 'is', 'are',
+    'please', 'me', 'my', 'its', 'this', 'that',
+}
+
+# Dropped only at the END of a topic and only when two words remain
+# ("cell division process" -> "cell division"; "process scheduling" and
+# "Markov process" keep their meaning)
+TRAILING_FILLER = {
+    'process', 'concept', 'concepts', 'definition', 'meaning', 'overview', 'basics',
+    'explained', 'explanation', 'introduction', 'example', 'examples', 'topic', 'in detail',
+}
+
+# Words ending in "s" that are not plurals
+NOT_PLURAL = ('ss', 'us', 'is', 'ics', 'os', 'as')
+SINGULAR_WORDS = {'species', 'series', 'diabetes', 'news', 'lens', 'means', 'aids', 'rabies', 'herpes'}
+# Plurals the suffix rules get wrong (axes -> "ax", analyses -> "analyse")
+IRREGULAR_PLURALS = {
+    'axes': 'axis', 'analyses': 'analysis', 'hypotheses': 'hypothesis', 'theses': 'thesis',
+    'crises': 'crisis', 'diagnoses': 'diagnosis', 'syntheses': 'synthesis', 'parentheses': 'parenthesis',
+    'matrices': 'matrix', 'vertices': 'vertex', 'indices': 'index',
+}
+
+_PUNCTUATION = re.compile(r"[^\w\s+#]")  # keep + and # for C++ / C#
+
+
+def fold_plural(word):
+    """Crude English plural folding (cells -> cell, species stays, theories -> theory)"""
+    if word in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[word]
+    if len(word) <= 3 or not word.isalpha() or word in SINGULAR_WORDS:
+        return word
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    if word.endswith(('sses', 'shes', 'ches', 'xes', 'zes')):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith(NOT_PLURAL):
+        return word[:-1]
+    return word
+
+
+def _trailing_filler(words):
+    """How many words at the end are filler (2 for "in detail")"""
+    if len(words) >= 2 and ' '.join(words[-2:]) in TRAILING_FILLER:
+        return 2
+    return 1 if words and words[-1] in TRAILING_FILLER else 0
+
+
+def normalize_topic(topic):
+    """Canonical form of a topic used for cache keys"""
+    text = unicodedata.normalize('NFKC', topic).lower().replace('’', "'")
+    text = text.replace("what's", 'what is').replace("'s ", ' ')
+    text = _PUNCTUATION.sub(' ', text)
+    text = ' '.join(text.split())
+
+    for prefix in QUESTION_PREFIXES:
+        if text.startswith(prefix + ' '):
+            text = text[len(prefix) + 1:]
+            break
+
+    words = text.split()
+    filler = _trailing_filler(words)
+    # "Markov process" is a topic of its own - strip only if two real words are left
+    while filler and len([w for w in words[:-filler] if w not in STOPWORDS]) >= 2:
+        words = words[:-filler]
+        filler = _trailing_filler(words)
+
+    kept = [w for w in words if w not in STOPWORDS]
+    words = kept or words  # never normalize a topic away entirely
+    return ' '.join(fold_plural(w) for w in words)
+
+
+# ============================================
+# MinHash / LSH index
+# ============================================
+
+def shingles(text, n=3):
+    padded = f" {text} "
+    if len(padded) <= n:
+        return {padded}
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def _digits(text):
+    return re.findall(r'\d+', text)
+
+
+# Longest first: "hyper" before "hy..." prefixes, "non" before "no"-like ones
+NEGATING_PREFIXES = ('hyper', 'hypo', 'anti', 'non', 'dis', 'un', 'in', 'im', 'il', 'ir')
+
+
+def _stem(word):
+    for prefix in NEGATING_PREFIXES:
+        if word.startswith(prefix) and len(word) - len(prefix) >= 4:
+            return word[len(prefix):]
+    return word
+
+
+def opposite_prefixes(a, b):
+    """Whether a and b differ only by a word prefix ("organic"/"inorganic", "hyper-"/"hypo-")"""
+    words_a, words_b = set(a.split()), set(b.split())
+    return any(_stem(x) == _stem(y) for x in words_a - words_b for y in words_b - words_a)
+
+
+class TopicIndex:
+    """
+    Near-duplicate lookup over known topics, one namespace per cache-key suffix
+    (content hash, "search_only", ...), so variants only match within the same kind.
+
+    MinHash: each shingle is hashed once (crc32); permutation i is h ^ mask_i.
+    LSH: the bands*rows signature is cut into `bands` groups of `rows`; a pair
+    with Jaccard s shares a bucket with probability 1 - (1 - s^rows)^bands.
+    Candidates are then verified with the exact trigram Jaccard.
+    """
+
+    def __init__(self, threshold=0.92, bands=12, rows=5, seed=1):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        rng = random.Random(seed)
+        self._masks = [rng.getrandbits(32) for _ in range(bands * rows)]
+        self._lock = threading.Lock()
+        self._topics = []            # id -> (namespace, topic)
+        self._exact = {}             # (namespace, topic) -> id
+        self._buckets = [dict() for _ in range(bands)]
+        self._words = {}             # (namespace, word) -> ids, candidates far below the LSH threshold
+
+    def __len__(self):
+        return len(self._topics)
+
+    @property
+    def params(self):
+        """Identifies how band hashes were computed (stored alongside them)"""
+        return f"b{self.bands}r{self.rows}"
+
+    def band_hashes(self, topic):
+        hashes = [zlib.crc32(s.encode()) for s in shingles(topic)]
+        signature = [min([h ^ mask for h in hashes]) for mask in self._masks]
+        rows = self.rows
+        return [zlib.crc32(array('I', signature[band * rows:(band + 1) * rows]).tobytes())
+                for band in range(self.bands)]
+
+    def add(self, namespace, topic, band_hashes=None):
+        """Register a topic; returns its band hashes (None if it was already known)"""
+        with self._lock:
+            if (namespace, topic) in self._exact:
+                return None
+        if band_hashes is None:
+            band_hashes = self.band_hashes(topic)
+        with self._lock:
+            if (namespace, topic) in self._exact:
+                return None
+            topic_id = len(self._topics)
+            self._topics.append((namespace, topic))
+            self._exact[(namespace, topic)] = topic_id
+            for band, key in enumerate(band_hashes):
+                self._buckets[band].setdefault(key, []).append(topic_id)
+            for word in set(topic.split()):
+                self._words.setdefault((namespace, word), []).append(topic_id)
+        return band_hashes
+
+    def lookup(self, namespace, topic):
+        """(known_topic, similarity) for the closest match >= threshold, else (None, 0.0)"""
+        with self._lock:
+            if (namespace, topic) in self._exact:
+                return topic, 1.0
+            if not self._topics:
+                return None, 0.0
+        matches = self.similar(namespace, topic, self.threshold)
+        return matches[0] if matches else (None, 0.0)
+
+    def similar(self, namespace, topic, threshold, scan_limit=0):
+        """
+        [(known_topic, similarity)] of LSH candidates >= threshold, best first.
+        scan_limit > 0 also compares up to that many topics sharing a word with
+        `topic`, rarest words and newest topics first (for thresholds well below
+        the one the bands were tuned for).
+        """
+        with self._lock:
+            if not self._topics:
+                return []
+
+        band_hashes = self.band_hashes(topic)
+        candidates = set()
+        with self._lock:
+            for band, key in enumerate(band_hashes):
+                candidates.update(self._buckets[band].get(key, ()))
+            postings = sorted((self._words.get((namespace, word), []) for word in set(topic.split())), key=len)
+            budget = scan_limit
+            for ids in postings:
+                if budget <= 0:
+                    break
+                candidates.update(ids[-budget:])
+                budget -= min(len(ids), budget)
+            entries = [self._topics[i] for i in candidates]
+
+        matches = []
+        shingle_set = shingles(topic)
+        digits = _digits(topic)
+        for cand_namespace, cand_topic in entries:
+            # "world war 1" must never match "world war 2", nor "organic" "inorganic"
+            if cand_namespace != namespace or _digits(cand_topic) != digits:
+                continue
+            if opposite_prefixes(topic, cand_topic):
+                continue
+            score = jaccard(shingle_set, shingles(cand_topic))
+            if score >= threshold:
+                matches.append((cand_topic, score))
+        return sorted(matches, key=lambda match: -match[1])
+
+
+# ============================================
+# Shared, file-backed index
+# ============================================
+class SharedTopicIndex:
+    """
+    TopicIndex kept in sync with an append-only TSV file:
+        namespace <TAB> topic <TAB> params <TAB> band hashes (hex, comma separated)
+    Storing the band hashes means loading 1e5 topics doesn't recompute signatures.
+    Once the file holds max_topics lines, new topics are no longer registered.
+    """
+
+    def __init__(self, path, max_topics=50000, **index_options):
+        self.path = Path(path)
+        self.max_topics = max_topics
+        self.index = TopicIndex(**index_options)
+        self._offset = 0
+        self._sync_lock = threading.Lock()
+        self.counts = {'exact': 0, 'near': 0, 'new': 0, 'registered': 0, 'capped': 0}
+
+    def _parse(self, line):
+        fields = line.split('\t')
+        if len(fields) < 2 or not fields[1]:
+            return None
+        namespace, topic = fields[0], fields[1]
+        band_hashes = None
+        if len(fields) == 4 and fields[2] == self.index.params:
+            band_hashes = [int(h, 16) for h in fields[3].split(',')]
+        return namespace, topic, band_hashes
+
+    def _sync(self):
+        """Load lines appended by any worker since the last sync"""
+        try:
+            size = self.path.stat().st_size
+        except OSError:
+            return
+        if size <= self._offset:
+            return
+        with self._sync_lock:
+            with open(self.path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read()
+            complete = data.rfind(b'\n') + 1  # ignore a half-written last line
+            for line in data[:complete].decode('utf-8', 'replace').splitlines():
+                parsed = self._parse(line)
+                if parsed:
+                    self.index.add(*parsed)
+            self._offset += complete
+
+    def _append(self, namespace, topic, band_hashes):
+        hashes = ','.join(f"{h:x}" for h in band_hashes)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # One short O_APPEND write per line, so concurrent workers never interleave
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, f"{namespace}\t{topic}\t{self.index.params}\t{hashes}\n".encode())
+            finally:
+                os.close(fd)
+        except OSError as e:
+            print(f"⚠️ Topic index write error: {e}")
+
+    def canonical(self, namespace, topic):
+        """The known topic to use for `topic` - itself when nothing close is known (nothing is registered)"""
+        topic = topic.replace('\t', ' ').replace('\n', ' ')
+        self._sync()
+        match, score = self.index.lookup(namespace, topic)
+        if match is not None:
+            self.counts['exact' if score == 1.0 else 'near'] += 1
+            if match != topic:
+                print(f"🔗 Near-duplicate topic: '{topic}' -> '{match}' ({score:.2f})")
+            return match
+        self.counts['new'] += 1
+        return topic
+
+    def register(self, namespace, topic):
+        """Remember a topic whose result is now cached (False when full or already known)"""
+        topic = topic.replace('\t', ' ').replace('\n', ' ')
+        self._sync()
+        if len(self.index) >= self.max_topics:
+            self.counts['capped'] += 1
+            return False
+        band_hashes = self.index.add(namespace, topic)
+        if band_hashes is None:
+            return False
+        self._append(namespace, topic, band_hashes)
+        self.counts['registered'] += 1
+        return True
+
+    def similar(self, namespace, topic, threshold, scan_limit=500):
+        """
+        Known topics resembling `topic` (>= threshold, itself excluded) - nothing is registered.
+        LSH misses many pairs far below its threshold, so up to scan_limit topics sharing
+        a word are checked too - a bounded cost however many topics are known.
+        """
+        self._sync()
+        matches = self.index.similar(namespace, topic, threshold, scan_limit=scan_limit)
+        return [known for known, _ in matches if known != topic]
+
+    def stats(self):
+        return dict(self.counts, topics=len(self.index), max_topics=self.max_topics,
+                    threshold=self.index.threshold, fuzzy=fuzzy_keys())
+
+
+_shared_index = None
+_init_lock = threading.Lock()
+
+
+def fuzzy_keys():
+    """Whether cache keys fold near-duplicate topics together (off by default)"""
+    return getattr(settings, 'AI_TOPIC_INDEX', {}).get('fuzzy', False)
+
+
+def get_topic_index():
+    """Process-wide index configured by settings.AI_TOPIC_INDEX (None when disabled)"""
+    global _shared_index
+    config = getattr(settings, 'AI_TOPIC_INDEX', {})
+    if not config.get('enabled', True):
+        return None
+    if _shared_index is None:
+        with _init_lock:
+            if _shared_index is None:
+                _shared_index = SharedTopicIndex(
+                    config.get('path') or DEFAULT_TOPICS_FILE,
+                    max_topics=config.get('max_topics', 50000),
+                    threshold=config.get('threshold', 0.92),
+                    bands=config.get('bands', 12),
+                    rows=config.get('rows', 5),
+                )
+    return _shared_index
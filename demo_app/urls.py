@@ -1,10 +1,15 @@
+from django.conf import settings
 from django.urls import path
 from . import views  # ✅ import your app views
+from . import views_async
+
+# ⚡ AI endpoints run as async views under ASGI when AI_ASYNC_VIEWS is on
+ai_views = views_async if settings.AI_ASYNC_VIEWS else views
 
 urlpatterns = [
     path('', views.home, name="home"),  # root URL
-    path("ai/", views.get_ai_response, name="ai_response"),
-    path('story/', views.generate_story, name='generate_story'),
+    path("ai/", ai_views.get_ai_response, name="ai_response"),
+    path('story/', ai_views.generate_story, name='generate_story'),
 
     # ✅ Authentication URLs
     path('auth/signup/', views.signup_view, name='signup'),
@@ -19,10 +24,22 @@ urlpatterns = [
     path('history/clear/', views.clear_all_history, name='clear_history'),
     
     # ✨ AI Generation Endpoints
-    path('ai/generate-flashcards/', views.generate_flashcards_endpoint, name='generate_flashcards'),
-    path('ai/generate-mcqs/', views.generate_mcqs_endpoint, name='generate_mcqs'),
-    path('ai/extract-keywords/', views.extract_keywords_endpoint, name='extract_keywords'),
+    path('ai/generate-flashcards/', ai_views.generate_flashcards_endpoint, name='generate_flashcards'),
+    path('ai/generate-mcqs/', ai_views.generate_mcqs_endpoint, name='generate_mcqs'),
+    path('ai/extract-keywords/', ai_views.extract_keywords_endpoint, name='extract_keywords'),
     
     # 🚀 NEW: Unified Batch Endpoint (All results in one call!)
-    path('ai/search-all/', views.search_all_in_one, name='search_all_in_one'),
+    path('ai/search-all/', ai_views.search_all_in_one, name='search_all_in_one'),
+
+    # ⚙️ Job mode: /ai/search-all/?mode=job returns 202 + job id, poll here (Retry-After; async views also take ?wait=20&version=N)
+    path('ai/jobs/<uuid:job_id>/', ai_views.ai_job_status, name='ai_job_status'),
+
+    # 📡 Streaming (Server-Sent Events) - first chunk arrives long before the full answer
+    path('ai/stream/', ai_views.stream_ai_response, name='stream_ai_response'),
+    path('ai/search-all/stream/', ai_views.stream_search_all, name='stream_search_all'),
+
+    # 📊 AI Monitoring (staff only)
+    path('ai/status/keys/', views.key_pool_status, name='key_pool_status'),
+    path('ai/status/cache/', views.ai_cache_status, name='ai_cache_status'),
+    path('ai/status/models/', views.model_routing_status, name='model_routing_status'),
 ]
\ No newline at end of file
@@ -15,6 +15,9 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from .Smart_api import generate_flashcards_ai, generate_mcqs_ai, extract_keywords_ai
 from .batch_api import generate_all_content, generate_search_only
+from .response_cache import cache_ai_response
+from .deadline import with_deadline
+from .admission import Overloaded, admit, allows, degraded_text_response, materials_fallback, overloaded_response
 import json
 import traceback
 
@@ -30,6 +33,7 @@ def home(request):
 # UNIFIED BATCH ENDPOINT - All Results in One Call
 # ============================================
 @csrf_exempt
+@with_deadline('search_all')
 def search_all_in_one(request):
     """
     Generate EVERYTHING in one call:
@@ -43,14 +47,19 @@ def search_all_in_one(request):
     - topic: The search topic (required)
     - content: Optional content for context (optional)
     - include_story: Include story? (default: true)
+    - mode: "job" to return 202 + job id and generate in the background
     """
     try:
         topic = request.GET.get("topic", "").strip()
         content = request.GET.get("content", "").strip()
         include_story = request.GET.get("include_story", "true").lower() == "true"
         
-        if not topic:
-            return JsonResponse({"error": "Please enter a topic"}, status=400)
+        error = _topic_error(topic)
+        if error:
+            return error
+        
+        if request.GET.get("mode") == "job":
+            return _search_job_response(topic, content, include_story)
         
         print(f"🚀 All-in-one search: {topic}")
         
@@ -62,6 +71,8 @@ def search_all_in_one(request):
             "data": results
         })
         
+    except Overloaded as e:
+        return _overloaded_search(topic, content, include_story, e)
     except Exception as e:
         print(f"❌ All-in-one error: {e}")
         import traceback
@@ -72,6 +83,14 @@ def search_all_in_one(request):
 # ============================================
 # Search AI endpoint - FIXED VERSION
 # ============================================
+# Shared with /ai/stream/ and the async views, so every path reads and fills one entry
+AI_VIEW_CACHE = {'name': 'ai_view', 'topic_param': 'prompt', 'version': 1, 'task': 'explanation'}
+
+def _explain_prompt(prompt):
+    return f"Explain '{prompt}' in detail. Provide a comprehensive explanation with key concepts, examples, and practical applications."
+
+@cache_ai_response(**AI_VIEW_CACHE)
+@with_deadline('ai')
 def get_ai_response(request):
     """Main search endpoint that returns AI explanation"""
     try:
@@ -82,10 +101,12 @@ def get_ai_response(request):
         
         print(f"🔵 Searching for: {prompt}")
         
-        # Call AI with better prompt
-        enhanced_prompt = f"Explain '{prompt}' in detail. Provide a comprehensive explanation with key concepts, examples, and practical applications."
+        admission = admit('explain')
+        if not admission:
+            return degraded_text_response('response', 'explanation', prompt, admission)
         
-        result = ask_ai(enhanced_prompt)
+        # Call AI with better prompt
+        result = ask_ai(_explain_prompt(prompt))
         
         if not result or result.strip() == "":
             print("⚠️ Empty AI response")
@@ -103,6 +124,8 @@ def get_ai_response(request):
 # ============================================
 # Concept ➜ Story endpoint
 # ============================================
+@cache_ai_response('story_view', topic_param='concept', params={'tone': 'simple'}, version=1, task='story')
+@with_deadline('story')
 def generate_story(request):
     concept = request.GET.get("concept", "")
     tone = request.GET.get("tone", "simple")
@@ -113,10 +136,205 @@ def generate_story(request):
     # Modify prompt for story generation
     prompt = f"Write a {tone} story explaining the concept: {concept}"
 
-    story_result = ask_ai(prompt)
+    admission = admit('explain')
+    if not admission:
+        return degraded_text_response('story', 'story', concept, admission)
+
+    story_result = ask_ai(prompt, task='story')
     return JsonResponse({"story": story_result})
 
 
+# ============================================
+# STREAMING ENDPOINTS (Server-Sent Events)
+# ============================================
+from django.http import StreamingHttpResponse
+from .Smart_api import stream_ai_with_retry, AIStreamError
+from .batch_api import stream_all_content
+from .cache import get_cache_key, get_content_hash, load_or_revalidate
+from .response_cache import cached_view_response, store_view_response
+
+def _sse(event, data):
+    """One Server-Sent Event frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _sse_response(events):
+    """events: a generator, or an async generator for the ASGI views (sync ones get buffered there)"""
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let nginx/Render proxies buffer the stream
+    return response
+
+def _degraded_events(degraded):
+    """SSE frames for a degraded_text_response body"""
+    if 'response' in degraded:
+        return [_sse('chunk', {'text': degraded['response']}), _sse('done', degraded)]
+    return [_sse('error', degraded)]
+
+def _search_event(event, payload):
+    """SSE frame for one (event, payload) of stream_all_content"""
+    if event in ('explanation', 'story'):
+        return _sse(event, {'text': payload})
+    if event == 'done':
+        return _sse('done', {'data': payload})
+    return _sse(event, payload)
+
+@with_deadline('ai_stream')
+def stream_ai_response(request):
+    """
+    Streaming version of /ai/ - sends the explanation chunk by chunk.
+    Events: chunk {text}, done {response}, error {error}
+    """
+    prompt = request.GET.get("prompt", "").strip()
+    
+    def events():
+        if not prompt:
+            yield _sse('done', {'response': "Please enter something."})
+            return
+        
+        # Same entry as /ai/ (see AI_VIEW_CACHE)
+        cached = cached_view_response(request, **AI_VIEW_CACHE)
+        if cached:
+            yield _sse('chunk', {'text': cached['response']})
+            yield _sse('done', cached)
+            return
+        
+        admission = admit('explain')
+        if not admission:
+            yield from _degraded_events(json.loads(degraded_text_response('response', 'explanation', prompt, admission).content))
+            return
+        
+        print(f"🔵 Streaming search for: {prompt}")
+        
+        chunks = []
+        try:
+            for chunk in stream_ai_with_retry(_explain_prompt(prompt), task='explanation'):
+                chunks.append(chunk)
+                yield _sse('chunk', {'text': chunk})
+        except AIStreamError as e:
+            yield _sse('error', {'error': str(e)})
+            return
+        except Exception as e:
+            print(f"❌ Stream error: {e}")
+            traceback.print_exc()
+            yield _sse('error', {'error': f"Error: {str(e)}"})
+            return
+        
+        result = ''.join(chunks)
+        store_view_response(request, {'response': result}, **AI_VIEW_CACHE)
+        yield _sse('done', {'response': result})
+    
+    return _sse_response(events())
+
+@csrf_exempt
+@with_deadline('search_all_stream')
+def stream_search_all(request):
+    """
+    Streaming version of /ai/search-all/.
+    Events: explanation {text}, story {text}, materials {flashcards, mcqs, keywords},
+            done {data}, error {error}
+    """
+    topic = request.GET.get("topic", "").strip()
+    content = request.GET.get("content", "").strip()
+    include_story = request.GET.get("include_story", "true").lower() == "true"
+    
+    error = _topic_error(topic)
+    if error:
+        return error
+    
+    def events():
+        try:
+            for event, payload in stream_all_content(topic, content, include_story, request_class='search'):
+                yield _search_event(event, payload)
+        except Overloaded as e:
+            yield _sse('error', {'error': str(e), 'retry_after': e.retry_after})
+        except Exception as e:
+            print(f"❌ Streaming all-in-one error: {e}")
+            traceback.print_exc()
+            yield _sse('error', {'error': str(e)})
+    
+    print(f"🚀 Streaming all-in-one search: {topic}")
+    return _sse_response(events())
+
+
+# ============================================
+# JOB MODE - generate in background workers, poll for results
+# ============================================
+from django.conf import settings
+from django.urls import reverse
+from .job_queue import enqueue_job, job_status
+from .models import GenerationJob
+
+def _search_job_response(topic, content, include_story):
+    """Cached -> 200 with data (stale data is refreshed by a job), otherwise 202 + job id (see job_queue.py)"""
+    cache_key = get_cache_key(topic, get_content_hash(content) if content else "")
+    cached = load_or_revalidate(cache_key, lambda: enqueue_job(topic, content, include_story))
+    if cached:
+        return JsonResponse({"success": True, "data": cached})
+    
+    job = enqueue_job(topic, content, include_story)
+    status_url = reverse('ai_job_status', args=[job.id])
+    response = JsonResponse({
+        "success": True,
+        "job_id": str(job.id),
+        "status": job.status,
+        "status_url": status_url,
+    }, status=202)
+    response['Location'] = status_url
+    return response
+
+def _overloaded_search(topic, content, include_story, overloaded):
+    """No key capacity for an all-in-one search: queue it as a job (202) or reject fast (503)"""
+    if allows('search', 'queue'):
+        print(f"🚦 Queueing instead of generating: {topic}")
+        return _search_job_response(topic, content, include_story)
+    return overloaded_response(overloaded.retry_after, overloaded.reason)
+
+# Jobs store the topic in a CharField - longer topics are rejected before anything is queued
+MAX_TOPIC_LENGTH = GenerationJob._meta.get_field('topic').max_length
+
+def _topic_error(topic):
+    """400 response for an unusable topic, else None"""
+    if not topic:
+        return JsonResponse({"error": "Please enter a topic"}, status=400)
+    if len(topic) > MAX_TOPIC_LENGTH:
+        return JsonResponse({"error": f"Topic is too long (max {MAX_TOPIC_LENGTH} characters)"}, status=400)
+    return None
+
+def _long_poll_args(request):
+    """(wait_seconds, seen_version) from ?wait=&version="""
+    max_wait = getattr(settings, 'AI_JOBS', {}).get('long_poll_seconds', 20)
+    try:
+        wait = min(max(float(request.GET.get("wait", 0)), 0), max_wait)
+        seen_version = int(request.GET.get("version", -1))
+    except ValueError:
+        wait, seen_version = 0, -1
+    return wait, seen_version
+
+def _job_status_response(job):
+    """Status JSON - with Retry-After while the job is still queued/running"""
+    data = job_status(job)
+    active = job.status in (GenerationJob.QUEUED, GenerationJob.RUNNING)
+    retry_after = getattr(settings, 'AI_JOBS', {}).get('poll_after_seconds', 2)
+    if active:
+        data['retry_after'] = retry_after
+    response = JsonResponse(data)
+    if active:
+        response['Retry-After'] = str(retry_after)
+    return response
+
+def ai_job_status(request, job_id):
+    """
+    Job status + partial/final results - answers right away, with Retry-After
+    while the job is active. Long-polling (?wait=&version=) is done by the async
+    view (AI_ASYNC_VIEWS) only: here it would hold a worker thread for the whole wait.
+    """
+    try:
+        job = GenerationJob.objects.get(id=job_id)
+    except GenerationJob.DoesNotExist:
+        return JsonResponse({"error": "Job not found"}, status=404)
+    return _job_status_response(job)
+
+
 # ============================================
 # AUTHENTICATION VIEWS
 # ============================================
@@ -436,6 +654,7 @@ def check_auth(request):
 # ============================================
 
 @csrf_exempt
+@with_deadline('materials')
 def generate_flashcards_endpoint(request):
     """AI-powered flashcard generation - BULLETPROOF VERSION"""
     if request.method == 'POST':
@@ -483,6 +702,8 @@ def generate_flashcards_endpoint(request):
         except json.JSONDecodeError as e:
             print(f"❌ Request JSON decode error: {e}")
             return JsonResponse({'error': 'Invalid JSON in request'}, status=400)
+        except Overloaded as e:
+            return materials_fallback('flashcards', topic, content, e)
         except Exception as e:
             print(f"❌ Flashcard endpoint error: {e}")
             traceback.print_exc()
@@ -492,6 +713,7 @@ def generate_flashcards_endpoint(request):
 
 
 @csrf_exempt
+@with_deadline('materials')
 def generate_mcqs_endpoint(request):
     """AI-powered MCQ generation - BULLETPROOF VERSION"""
     if request.method == 'POST':
@@ -553,6 +775,8 @@ def generate_mcqs_endpoint(request):
         except json.JSONDecodeError as e:
             print(f"❌ Request JSON decode error: {e}")
             return JsonResponse({'error': 'Invalid JSON in request'}, status=400)
+        except Overloaded as e:
+            return materials_fallback('mcqs', topic, content, e)
         except Exception as e:
             print(f"❌ MCQ endpoint error: {e}")
             traceback.print_exc()
@@ -562,6 +786,7 @@ def generate_mcqs_endpoint(request):
 
 
 @csrf_exempt
+@with_deadline('materials')
 def extract_keywords_endpoint(request):
     """AI-powered keyword extraction - BULLETPROOF VERSION"""
     if request.method == 'POST':
@@ -609,9 +834,44 @@ def extract_keywords_endpoint(request):
         except json.JSONDecodeError as e:
             print(f"❌ Request JSON decode error: {e}")
             return JsonResponse({'error': 'Invalid JSON in request'}, status=400)
+        except Overloaded as e:
+            return materials_fallback('keywords', topic, content, e)
         except Exception as e:
             print(f"❌ Keyword endpoint error: {e}")
             traceback.print_exc()
             return JsonResponse({'error': str(e)}, status=500)
     
-    return JsonResponse({'error': 'POST method required'}, status=400)
\ No newline at end of file
+    return JsonResponse({'error': 'POST method required'}, status=400)
+
+# ============================================
+# AI MONITORING ENDPOINTS (staff only)
+# ============================================
+from django.contrib.admin.views.decorators import staff_member_required
+from .Smart_api import get_key_pool_status, get_quota_status, get_model_routing_status
+
+@staff_member_required
+def key_pool_status(request):
+    """Health, cooldowns and remaining capacity (per minute and for today) of every API key"""
+    from .admission import stats
+    from . import bulkhead
+    return JsonResponse({'success': True, 'key_pool': get_key_pool_status(), 'quota': get_quota_status(),
+                         'admission': stats(), 'bulkheads': bulkhead.stats()})
+
+@staff_member_required
+def ai_cache_status(request):
+    """
+    Cache size plus hit/miss/latency metrics of every worker on this host.
+    ?top=N limits the hottest/largest key listings (default 20).
+    """
+    from .cache import cache_stats
+    from .cache_metrics import snapshot
+    try:
+        top = min(max(int(request.GET.get('top', 20)), 1), 200)
+    except ValueError:
+        top = 20
+    return JsonResponse({'success': True, 'cache': cache_stats(), 'metrics': snapshot(top)})
+
+@staff_member_required
+def model_routing_status(request):
+    """Current route of every task plus each model's EWMA latency, error rate and cost (this worker)"""
+    return JsonResponse({'success': True, 'routing': get_model_routing_status()})
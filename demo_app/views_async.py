@@ -0,0 +1,335 @@
+"""
+Async versions of the AI views (served when settings.AI_ASYNC_VIEWS is on)
+Under ASGI each in-flight LLM call is just a suspended coroutine, so one
+process holds hundreds of requests instead of one per sync worker.
+Responses are identical to the sync views in views.py.
+"""
+
+import asyncio
+import json
+import time
+import traceback
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from .Smart_api import aask_ai, agenerate_flashcards_ai, agenerate_mcqs_ai, aextract_keywords_ai
+from .Smart_api import astream_ai_with_retry, AIStreamError
+from .batch_api import agenerate_all_content, stream_all_content
+from .response_cache import cache_ai_response, acached_view_response, astore_view_response
+from .deadline import with_deadline
+from .admission import Overloaded, aadmit, degraded_text_response, materials_fallback
+from .job_queue import is_settled
+from .models import GenerationJob
+from .views import (
+    AI_VIEW_CACHE, _explain_prompt, _topic_error, _search_job_response, _long_poll_args, _job_status_response,
+    _overloaded_search,
+    _sse, _sse_response, _degraded_events, _search_event,
+)
+
+
+# ============================================
+# UNIFIED BATCH ENDPOINT (async)
+# ============================================
+@csrf_exempt
+@with_deadline('search_all')
+async def search_all_in_one(request):
+    """Async version of views.search_all_in_one"""
+    try:
+        topic = request.GET.get("topic", "").strip()
+        content = request.GET.get("content", "").strip()
+        include_story = request.GET.get("include_story", "true").lower() == "true"
+
+        error = _topic_error(topic)
+        if error:
+            return error
+
+        if request.GET.get("mode") == "job":
+            return await sync_to_async(_search_job_response)(topic, content, include_story)
+
+        print(f"🚀 All-in-one search (async): {topic}")
+
+        results = await agenerate_all_content(topic, content, include_story)
+
+        return JsonResponse({
+            "success": True,
+            "data": results
+        })
+
+    except Overloaded as e:
+        return await sync_to_async(_overloaded_search)(topic, content, include_story, e)
+    except Exception as e:
+        print(f"❌ All-in-one error: {e}")
+        traceback.print_exc()
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+# ============================================
+# Job status (async long-poll)
+# ============================================
+async def ai_job_status(request, job_id):
+    """
+    Async version of views.ai_job_status - long-polls without holding a thread.
+    Query params:
+    - wait: long-poll up to this many seconds for progress (capped by AI_JOBS['long_poll_seconds'])
+    - version: last version the client has seen (answer as soon as a newer one exists)
+    """
+    wait, seen_version = _long_poll_args(request)
+    deadline = time.monotonic() + wait
+
+    while True:
+        try:
+            job = await GenerationJob.objects.aget(id=job_id)
+        except GenerationJob.DoesNotExist:
+            return JsonResponse({"error": "Job not found"}, status=404)
+        if is_settled(job, seen_version) or time.monotonic() >= deadline:
+            return await sync_to_async(_job_status_response)(job)
+        await asyncio.sleep(0.5)
+
+
+# ============================================
+# Search AI endpoint (async)
+# ============================================
+@cache_ai_response(**AI_VIEW_CACHE)
+@with_deadline('ai')
+async def get_ai_response(request):
+    """Async version of views.get_ai_response"""
+    try:
+        prompt = request.GET.get("prompt", "").strip()
+
+        if not prompt:
+            return JsonResponse({"response": "Please enter something."})
+
+        print(f"🔵 Searching for (async): {prompt}")
+
+        admission = await aadmit('explain')
+        if not admission:
+            return await sync_to_async(degraded_text_response)('response', 'explanation', prompt, admission)
+
+        result = await aask_ai(_explain_prompt(prompt))
+
+        if not result or result.strip() == "":
+            print("⚠️ Empty AI response")
+            return JsonResponse({"response": "I couldn't generate a response. Please try rephrasing your query."})
+
+        print(f"✅ AI Response length: {len(result)} chars")
+        return JsonResponse({"response": result})
+
+    except Exception as e:
+        print(f"❌ Search error: {e}")
+        traceback.print_exc()
+        return JsonResponse({"response": f"Error: {str(e)}"}, status=500)
+
+
+# ============================================
+# Concept ➜ Story endpoint (async)
+# ============================================
+@cache_ai_response('story_view', topic_param='concept', params={'tone': 'simple'}, version=1, task='story')
+@with_deadline('story')
+async def generate_story(request):
+    """Async version of views.generate_story"""
+    concept = request.GET.get("concept", "")
+    tone = request.GET.get("tone", "simple")
+
+    if not concept:
+        return JsonResponse({"story": "Please enter a concept."})
+
+    prompt = f"Write a {tone} story explaining the concept: {concept}"
+
+    admission = await aadmit('explain')
+    if not admission:
+        return await sync_to_async(degraded_text_response)('story', 'story', concept, admission)
+
+    story_result = await aask_ai(prompt, task='story')
+    return JsonResponse({"story": story_result})
+
+
+# ============================================
+# STREAMING ENDPOINTS (async Server-Sent Events)
+# ============================================
+# Under ASGI a StreamingHttpResponse over a sync generator is consumed in full
+# before the first byte goes out - these stream from async generators instead.
+
+async def _in_thread(iterator):
+    """Async generator over a blocking one - each step runs via sync_to_async"""
+    done = object()
+    try:
+        while True:
+            item = await sync_to_async(next)(iterator, done)
+            if item is done:
+                return
+            yield item
+    finally:
+        await sync_to_async(iterator.close)()
+
+
+@with_deadline('ai_stream')
+async def stream_ai_response(request):
+    """Async version of views.stream_ai_response"""
+    prompt = request.GET.get("prompt", "").strip()
+
+    async def events():
+        if not prompt:
+            yield _sse('done', {'response': "Please enter something."})
+            return
+
+        cached = await acached_view_response(request, **AI_VIEW_CACHE)
+        if cached:
+            yield _sse('chunk', {'text': cached['response']})
+            yield _sse('done', cached)
+            return
+
+        admission = await aadmit('explain')
+        if not admission:
+            degraded = await sync_to_async(degraded_text_response)('response', 'explanation', prompt, admission)
+            for frame in _degraded_events(json.loads(degraded.content)):
+                yield frame
+            return
+
+        print(f"🔵 Streaming search for (async): {prompt}")
+
+        chunks = []
+        try:
+            async for chunk in astream_ai_with_retry(_explain_prompt(prompt), task='explanation'):
+                chunks.append(chunk)
+                yield _sse('chunk', {'text': chunk})
+        except AIStreamError as e:
+            yield _sse('error', {'error': str(e)})
+            return
+        except Exception as e:
+            print(f"❌ Stream error: {e}")
+            traceback.print_exc()
+            yield _sse('error', {'error': f"Error: {str(e)}"})
+            return
+
+        result = ''.join(chunks)
+        await astore_view_response(request, {'response': result}, **AI_VIEW_CACHE)
+        yield _sse('done', {'response': result})
+
+    return _sse_response(events())
+
+
+@csrf_exempt
+@with_deadline('search_all_stream')
+async def stream_search_all(request):
+    """
+    Async version of views.stream_search_all - the batch pipeline itself stays
+    threaded (stream_all_content), each step is awaited so the event loop is free
+    """
+    topic = request.GET.get("topic", "").strip()
+    content = request.GET.get("content", "").strip()
+    include_story = request.GET.get("include_story", "true").lower() == "true"
+
+    error = _topic_error(topic)
+    if error:
+        return error
+
+    async def events():
+        try:
+            async for event, payload in _in_thread(stream_all_content(topic, content, include_story, request_class='search')):
+                yield _search_event(event, payload)
+        except Overloaded as e:
+            yield _sse('error', {'error': str(e), 'retry_after': e.retry_after})
+        except Exception as e:
+            print(f"❌ Streaming all-in-one error: {e}")
+            traceback.print_exc()
+            yield _sse('error', {'error': str(e)})
+
+    print(f"🚀 Streaming all-in-one search (async): {topic}")
+    return _sse_response(events())
+
+
+# ============================================
+# AI-POWERED GENERATION ENDPOINTS (async)
+# ============================================
+
+def _read_topic_and_content(request, label):
+    """(topic, content, None) or (None, None, error JsonResponse)"""
+    data = json.loads(request.body)
+    topic = request.GET.get('topic', '').strip()
+    content = data.get('content', '').strip()
+
+    print(f"🔵 {label} request (async) - Topic: '{topic}', Content length: {len(content)}")
+
+    if not topic:
+        print("❌ Missing topic")
+        return None, None, JsonResponse({'error': 'Missing topic'}, status=400)
+
+    if not content:
+        print("❌ Missing content")
+        return None, None, JsonResponse({'error': 'Missing content'}, status=400)
+
+    return topic, content, None
+
+
+async def _artifact_endpoint(request, label, field, generator, failure, validate=None):
+    """Shared body of the flashcard / MCQ / keyword endpoints"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST method required'}, status=400)
+
+    try:
+        topic, content, error = _read_topic_and_content(request, label)
+        if error:
+            return error
+
+        artifact_json = await generator(topic, content)
+
+        if not artifact_json:
+            print(f"❌ AI returned None")
+            return JsonResponse({'error': failure}, status=500)
+
+        try:
+            items = json.loads(artifact_json)
+        except json.JSONDecodeError as e:
+            print(f"❌ JSON validation failed: {e}")
+            return JsonResponse({'error': 'Invalid JSON from AI'}, status=500)
+
+        if validate:
+            problem = validate(items)
+            if problem:
+                print(f"⚠️ {problem}")
+                return JsonResponse({'error': problem}, status=500)
+
+        print(f"✅ Generated {len(items)} {field}")
+        return JsonResponse({'success': True, field: artifact_json})
+
+    except json.JSONDecodeError as e:
+        print(f"❌ Request JSON decode error: {e}")
+        return JsonResponse({'error': 'Invalid JSON in request'}, status=400)
+    except Overloaded as e:
+        return materials_fallback(field, topic, content, e)
+    except Exception as e:
+        print(f"❌ {label} endpoint error: {e}")
+        traceback.print_exc()
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+def _validate_mcqs(mcqs_list):
+    """Same structure checks as views.generate_mcqs_endpoint"""
+    for mcq in mcqs_list:
+        if not all(k in mcq for k in ['q', 'opts', 'ans']):
+            return 'Invalid MCQ structure'
+        if len(mcq['opts']) != 4:
+            return 'MCQ must have 4 options'
+        if not (0 <= mcq['ans'] <= 3):
+            return 'Invalid answer index'
+    return None
+
+
+@csrf_exempt
+@with_deadline('materials')
+async def generate_flashcards_endpoint(request):
+    return await _artifact_endpoint(request, 'Flashcard', 'flashcards', agenerate_flashcards_ai, 'Flashcard generation failed')
+
+
+@csrf_exempt
+@with_deadline('materials')
+async def generate_mcqs_endpoint(request):
+    return await _artifact_endpoint(request, 'MCQ', 'mcqs', agenerate_mcqs_ai, 'MCQ generation failed', validate=_validate_mcqs)
+
+
+@csrf_exempt
+@with_deadline('materials')
+async def extract_keywords_endpoint(request):
+    return await _artifact_endpoint(request, 'Keyword', 'keywords', aextract_keywords_ai, 'Keyword extraction failed')
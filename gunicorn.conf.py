@@ -0,0 +1,13 @@
+"""
+Gunicorn settings - loaded automatically from the project root (Procfile runs plain `gunicorn`)
+Threaded workers, so one worker can serve /auth/ and /history/ while other
+threads wait on LLM calls. The AI_BULKHEADS pools in settings.py cap how
+many of those threads AI endpoints may hold; keep their
+max_concurrent + max_queue below workers x threads.
+"""
+
+import os
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
@@ -93,7 +93,11 @@ print("🤖 [4/5] Checking Smart_api initialization...")
 print("-"*70)
 
 try:
-    from demo_app.Smart_api import AI_MODEL, API_KEYS, AVAILABLE_MODELS
+    from demo_app.Smart_api import API_KEYS, get_available_models, find_working_model
+    
+    # Model discovery is lazy (cached in demo_app/ai_cache/meta/models.json)
+    AVAILABLE_MODELS = get_available_models()
+    AI_MODEL = find_working_model()
     
     if len(API_KEYS) > 0:
         print(f"✅ API Keys loaded: {len(API_KEYS)} keys")